@@ -0,0 +1,137 @@
+# benchmarks/bench_align.py
+"""
+人头对齐 warp 基准: 整张画布 warpAffine vs 只 warp 人头包围盒 (src.alignment.warp_head).
+
+roi 使用抠头时得到的包围盒 (与流水线一致); 不给包围盒时 warp_head 即为整图 warp.
+
+人头由内置图片 + stub 解析掩码 (benchmarks/stub_services.py) 抠出, 变换矩阵把人头缩放/旋转到模板中央
+(不需要 dlib). 每种插值方式下比较两者的耗时与输出差异 (最大绝对差与不同像素占比; 本机 warpAffine 走通用
+定点实现的插值方式, 如 Lanczos, 应逐像素一致, 否则以错误退出),
+"edge" 变体把原图从头顶处裁掉, 使人头越出原图上边缘以覆盖边界处理.
+用法: python benchmarks/bench_align.py [--resolutions 1024 2048 4000] [--interpolations linear cubic lanczos]
+                                     [--border constant] [--repeat 20] [--output result.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.bench_pipeline import make_inputs
+from benchmarks.stub_services import STUB_MASK
+from src.alignment import BORDER_MODES, INTERPOLATIONS, _exact_remap_supported, warp_head
+from src.image_io import open_image
+from src.image_utils import matte_head
+
+
+def make_heads(paths, edge):
+    """抠出的人头 (RGBA, 包围盒); edge=True 时先把原图从人头顶部 1/4 处裁掉."""
+    heads = []
+    for path in paths:
+        original_image, _ = open_image(path, mode="RGB")
+        original = np.asarray(original_image)
+        mask = np.array(STUB_MASK.resize(original_image.size, resample=Image.NEAREST))
+        if edge:
+            _, y, _, h = cv2.boundingRect(np.where(mask > 0, 255, 0).astype(np.uint8))
+            original, mask = original[y + h // 4:], mask[y + h // 4:]
+        heads.append(matte_head(original, mask, return_bbox=True))
+    return heads
+
+
+def head_transform(bbox, size, rng):
+    """把人头包围盒缩放到模板宽度的 45%, 随机旋转 ±8 度, 中心放到模板 (0.5, 0.42) 处."""
+    x, y, w, h = bbox
+    M = cv2.getRotationMatrix2D((x + w / 2, y + h / 2), float(rng.uniform(-8, 8)), 0.45 * size[0] / w)
+    M[:, 2] += np.array([size[0] * 0.5, size[1] * 0.42]) - (x + w / 2, y + h / 2)
+    return M
+
+
+def median_ms(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1000
+
+
+def bench(heads, size, args, rng):
+    border_mode = BORDER_MODES[args.border]
+    canvas = np.empty((size[1], size[0], 4), np.uint8)
+    rows = []
+    for name in args.interpolations:
+        interpolation = INTERPOLATIONS[name]
+        full_ms, roi_ms, max_diff, differing, roi_fraction = [], [], 0, 0.0, []
+        for head, bbox in heads:
+            M = head_transform(bbox, size, rng)
+            full = lambda: cv2.warpAffine(head, M, size, flags=interpolation, borderMode=border_mode, borderValue=0)
+            roi = lambda: warp_head(head, M, size, interpolation, border_mode, out=canvas, bbox=bbox)
+            full_ms.append(median_ms(full, args.repeat))
+            roi_ms.append(median_ms(roi, args.repeat))
+
+            expected, actual = full(), roi()
+            diff = np.abs(expected.astype(np.int16) - actual)
+            max_diff = max(max_diff, int(diff.max()))
+            differing = max(differing, float((diff > 0).any(axis=2).mean()))
+            roi_fraction.append(float((actual[..., 3] > 0).mean()))
+        row = {"interpolation": name, "full_ms": round(float(np.mean(full_ms)), 3),
+               "roi_ms": round(float(np.mean(roi_ms)), 3), "exact_remap": _exact_remap_supported(interpolation),
+               "max_abs_diff": max_diff,
+               "max_differing_pixel_fraction": round(differing, 6),
+               "head_canvas_fraction": round(float(np.mean(roi_fraction)), 3)}
+        row["speedup"] = round(row["full_ms"] / row["roi_ms"], 2)
+        rows.append(row)
+        print(f"    {name:<8s} full {row['full_ms']:7.3f} ms   roi {row['roi_ms']:7.3f} ms ({row['speedup']}x)   "
+              f"{'exact remap' if row['exact_remap'] else 'cropped warp'}   "
+              f"max |diff| {max_diff}, differing pixels {differing:.4%}")
+    return rows
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    template = Image.open(f"assets/templates/{args.template}/template.png")
+    size = template.size
+    results = {"template": args.template, "size": list(size), "border": args.border, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = make_inputs(tmp_dir, args.resolutions, args.max_images)
+        for long_side, paths in inputs.items():
+            for edge in (False, True):
+                label = f"{long_side}px{' edge' if edge else ''}"
+                print(f"\n[{label}] {len(paths)} head(s) -> {size[0]}x{size[1]} canvas")
+                results["runs"].append({"resolution": long_side, "edge": edge,
+                                        "interpolations": bench(make_heads(paths, edge), size, args, rng)})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+    if any(row["exact_remap"] and row["max_abs_diff"] for run in results["runs"] if not run["edge"]
+           for row in run["interpolations"]):
+        sys.exit("[!!!] Exact-remap head warp differs from the full-canvas warpAffine.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark head-only warps against full-canvas warpAffine.")
+    parser.add_argument('--template', type=str, default="001", help="Template ID under assets/templates.")
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[1024, 2048, 4000],
+                        help="Long side of the generated inputs, in pixels.")
+    parser.add_argument('--max-images', type=int, default=2, help="Bundled images used per resolution.")
+    parser.add_argument('--interpolations', type=str, nargs='+', default=list(INTERPOLATIONS),
+                        choices=list(INTERPOLATIONS))
+    parser.add_argument('--border', type=str, default="constant", choices=list(BORDER_MODES))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    run(parser.parse_args())
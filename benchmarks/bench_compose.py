@@ -0,0 +1,151 @@
+# benchmarks/bench_compose.py
+"""
+Inpainting 素材生成 (待修复图 + 修复区域掩码) 基准与逐像素一致性校验.
+
+- reference: 原先的 PIL 实现 (白底 RGBA 画布, 两次带 alpha 的 paste, Image.point 二值化, int16 相减/阈值/膨胀)
+- one-shot:  src.image_utils.compose_inpainting_assets (每次新建 InpaintingCompositor)
+- reused:    同一 InpaintingCompositor + 预分配的输出缓冲区 (服务中的用法)
+
+一致性: 在各模板上对 outputs/2_aligned_head.png (若尺寸匹配) 与随机生成的软边人头比较三种实现的输出,
+并对 blend_div255 与 PIL paste 做 (底色, 前景, alpha) 全部 256^3 种组合的穷举比较.
+用法: python benchmarks/bench_compose.py [--templates 001 002] [--heads 8] [--repeat 50] [--output result.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+os.chdir(project_root)
+
+from src.image_utils import InpaintingCompositor, blend_div255, compose_inpainting_assets
+
+
+def reference_assets(aligned_head_np, template_no_head_np, long_neck_mask_np):
+    """原先的 PIL 实现 (作为基准与一致性参照)."""
+    aligned_head = Image.fromarray(aligned_head_np, "RGBA")
+    template_no_head = Image.fromarray(template_no_head_np, "RGBA")
+    long_neck_mask = Image.fromarray(long_neck_mask_np, "L").point(lambda p: 255 if p > 128 else 0, 'L')
+
+    to_inpaint_image = Image.new("RGBA", template_no_head.size, (255, 255, 255, 255))
+    to_inpaint_image.paste(template_no_head, (0, 0), template_no_head)
+    to_inpaint_image.paste(aligned_head, (0, 0), aligned_head)
+
+    long_neck_np = np.array(long_neck_mask)
+    head_alpha = np.array(aligned_head.split()[-1])
+    inpaint_mask_np = np.clip(long_neck_np.astype(np.int16) - head_alpha.astype(np.int16), 0, 255).astype(np.uint8)
+    _, inpaint_mask_np = cv2.threshold(inpaint_mask_np, 127, 255, cv2.THRESH_BINARY)
+    dilated_mask_np = cv2.dilate(inpaint_mask_np, np.ones((5, 5), np.uint8), iterations=1)
+    return np.array(to_inpaint_image.convert("RGB")), dilated_mask_np
+
+
+def random_head(shape, rng):
+    """随机颜色 + 椭圆软边 alpha (含 0/255 与全部中间值) 的人头, 模拟对齐后的 RGBA."""
+    height, width = shape
+    alpha = np.zeros(shape, np.uint8)
+    center = (int(rng.integers(width // 4, 3 * width // 4)), int(rng.integers(height // 4, 3 * height // 4)))
+    axes = (int(rng.integers(width // 10, width // 4)), int(rng.integers(height // 8, height // 3)))
+    cv2.ellipse(alpha, center, axes, float(rng.uniform(0, 180)), 0, 360, 255, -1)
+    alpha = cv2.GaussianBlur(alpha, (0, 0), float(rng.uniform(1, 8)))
+    rgb = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    rgb[alpha == 0] = 0
+    return np.dstack([rgb, alpha])
+
+
+def check_blend_exhaustive():
+    """blend_div255 与 PIL paste 在全部 (dst, src, alpha) 组合上逐值一致."""
+    values = np.arange(256, dtype=np.uint8)
+    dst = np.repeat(values, 256)[None, :, None].repeat(256, axis=0).repeat(3, axis=2)   # (alpha, dst*src, 3)
+    src = np.tile(values, 256)[None, :, None].repeat(256, axis=0).repeat(3, axis=2)
+    alpha = values[:, None, None].repeat(256 * 256, axis=1)
+
+    canvas = Image.fromarray(np.dstack([dst, np.full(alpha.shape, 255, np.uint8)]), "RGBA")
+    foreground = Image.fromarray(np.dstack([src, alpha]), "RGBA")
+    canvas.paste(foreground, (0, 0), foreground)
+    expected = np.array(canvas)[..., :3]
+
+    buffers = [np.empty(dst.shape, np.uint16), np.empty(dst.shape, np.uint16), np.empty(alpha.shape, np.uint16)]
+    blend_div255(dst, src, alpha, *buffers)
+    return bool(np.array_equal(dst, expected))
+
+
+def median_ms(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(float(np.median(samples)) * 1000, 3)
+
+
+def bench_template(template_id, args, rng):
+    template_dir = f"assets/templates/{template_id}"
+    template_no_head = np.array(Image.open(f"{template_dir}/template_no_head.png").convert("RGBA"))
+    long_neck_mask = np.array(Image.open(f"{template_dir}/long_neck_mask.png").convert("L"))
+    shape = template_no_head.shape[:2]
+
+    heads = [random_head(shape, rng) for _ in range(args.heads)]
+    if os.path.exists("outputs/2_aligned_head.png"):
+        aligned = np.array(Image.open("outputs/2_aligned_head.png").convert("RGBA"))
+        if aligned.shape[:2] == shape:
+            heads.insert(0, aligned)
+
+    compositor = InpaintingCompositor(template_no_head, long_neck_mask)
+    out = (np.empty(shape + (3,), np.uint8), np.empty(shape, np.uint8))
+    exact = True
+    for head in heads:
+        expected = reference_assets(head, template_no_head, long_neck_mask)
+        for actual in (compose_inpainting_assets(head, template_no_head, long_neck_mask), compositor.compose(head, out)):
+            exact &= all(np.array_equal(a, b) for a, b in zip(expected, actual))
+
+    head = heads[0]
+    row = {
+        "template": template_id,
+        "size": list(shape[::-1]),
+        "heads": len(heads),
+        "exact": exact,
+        "reference_ms": median_ms(lambda: reference_assets(head, template_no_head, long_neck_mask), args.repeat),
+        "one_shot_ms": median_ms(lambda: compose_inpainting_assets(head, template_no_head, long_neck_mask), args.repeat),
+        "reused_ms": median_ms(lambda: compositor.compose(head, out), args.repeat),
+    }
+    row["speedup_reused"] = round(row["reference_ms"] / row["reused_ms"], 1)
+    print(f"[{template_id}] {row['size'][0]}x{row['size'][1]}, {len(heads)} heads, exact: {exact}")
+    print(f"    reference {row['reference_ms']:8.3f} ms   one-shot {row['one_shot_ms']:8.3f} ms   "
+          f"reused {row['reused_ms']:8.3f} ms   ({row['speedup_reused']}x)")
+    return row
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    blend_exact = check_blend_exhaustive()
+    print(f"[*] blend_div255 vs PIL paste, all 256^3 (dst, src, alpha) combinations: "
+          f"{'exact' if blend_exact else 'MISMATCH'}")
+    results = {"blend_exhaustive_exact": blend_exact,
+               "templates": [bench_template(template_id, args, rng) for template_id in args.templates]}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+    if not blend_exact or not all(row["exact"] for row in results["templates"]):
+        sys.exit("[!!!] Fused compositing differs from the PIL reference.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and exactness check for the inpainting asset compositing.")
+    parser.add_argument('--templates', type=str, nargs='+', default=["001", "002"])
+    parser.add_argument('--heads', type=int, default=8, help="Random soft-edged heads per template.")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    run(parser.parse_args())
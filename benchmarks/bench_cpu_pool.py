@@ -0,0 +1,192 @@
+# benchmarks/bench_cpu_pool.py
+"""
+CPU 阶段 (抠头 / 对齐 / Inpainting 素材, 即 src.cpu_pool.run_head_stages) 的多核扩展基准.
+
+对 1..N 个工作进程分别测量吞吐 (任务/秒), 并与以下方式比较:
+- inline:  在本进程中串行执行
+- threads: 同样数量的线程并发执行 (受 GIL 限制)
+- pool:    CpuStagePool, 图像经共享内存传递
+- pickle:  同一进程池, 参数与结果改为 pickle 传递
+另外测量单个数组在两种传递方式下往返一次 (np.copy) 的开销, 并校验进程池结果与串行结果逐像素一致.
+模板包校验: 临时目录中编译的模板包被篡改 (与 manifest 不符) 后, 工作进程同样不使用它 (回退到 PNG).
+
+解析掩码使用 benchmarks/stub_services.py 中的确定性掩码, 不需要任何服务.
+用法: python benchmarks/bench_cpu_pool.py [--workers 1 2 4 8] [--resolutions 1024 2048 4000]
+                                        [--tasks 16] [--template 001] [--output result.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import prepare_template
+from benchmarks.bench_pipeline import git_commit, make_inputs, peak_rss_mb, quiet
+from benchmarks.stub_services import STUB_MASK
+from src.alignment import DETECTION_SIZE, face_models
+from src.cpu_pool import CpuStagePool, run_head_stages
+from src.image_io import open_image, read_gray
+from src.template_bundle import BUNDLE_NAME, get_bundle, load_bundles
+
+
+def load_tasks(paths, template_dir):
+    """每张输入解码一次: (原图, 解析掩码, 检测用灰度图, scale, 模板目录)."""
+    tasks = []
+    for path in paths:
+        original_image, _ = open_image(path, mode="RGB")
+        gray_user, scale = read_gray(path, reduce_to=DETECTION_SIZE)
+        mask_np = np.array(STUB_MASK.resize(original_image.size, resample=Image.NEAREST))
+        tasks.append((np.asarray(original_image), mask_np, gray_user, scale, template_dir))
+    return tasks
+
+
+def throughput(call, tasks, num_tasks, concurrency):
+    """以 concurrency 个并发调用方执行 num_tasks 个任务, 返回 任务/秒."""
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda i: call(*tasks[i % len(tasks)]), range(num_tasks)))
+    return num_tasks / (time.perf_counter() - t0)
+
+
+def bench_handoff(tasks, repeat):
+    """单个原图数组经进程池往返一次 (np.copy) 的耗时: 共享内存 vs pickle."""
+    array = tasks[0][0]
+    row = {"megabytes": round(array.nbytes / 2**20, 1)}
+    for mode, shared in (("shared_memory", True), ("pickle", False)):
+        with CpuStagePool(1, shared=shared) as pool:
+            pool.start()
+            pool.run(np.copy, array)
+            samples = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                pool.run(np.copy, array)
+                samples.append(time.perf_counter() - t0)
+        row[f"{mode}_ms"] = round(float(np.median(samples)) * 1000, 2)
+    return row
+
+
+def check_parity(pool, tasks):
+    """进程池结果与本进程串行结果逐像素一致."""
+    for task in tasks:
+        expected = run_head_stages(*task)
+        actual = pool.run(run_head_stages, *task)
+        if not all(np.array_equal(a, b) for a, b in zip(expected, actual)):
+            return False
+    return True
+
+
+def bundle_in_use(template_dir):
+    """(在工作进程中执行) 该模板目录的模板包是否会被使用."""
+    return get_bundle(template_dir) is not None
+
+
+def check_rejected_bundle(args, tmp_dir):
+    """篡改临时目录中编译的模板包后, 主进程与工作进程都应拒绝它 (启动校验结果经 initializer 传入)."""
+    templates_root = os.path.join(tmp_dir, "templates")
+    template_dir = os.path.normpath(os.path.join(templates_root, args.template))
+    shutil.copytree(f"assets/templates/{args.template}", template_dir)
+    compile_args = argparse.Namespace(template_id=None, templates_dir=templates_root, workers=1, force=True,
+                                      reuse_landmarks=True)
+    with quiet(args):
+        if prepare_template.main(compile_args) != 0:
+            sys.exit("[!!!] Template compilation failed.")
+    with open(os.path.join(template_dir, BUNDLE_NAME), "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))  # mtime 仍新于源文件, 只有 sha256 校验能发现
+    with quiet(args):
+        load_bundles(templates_root)
+        with CpuStagePool(1) as pool:
+            in_worker = pool.start().run(bundle_in_use, template_dir)
+    return {"main_process": bundle_in_use(template_dir), "worker": in_worker}
+
+
+def bench_resolution(tasks, args):
+    num_tasks = args.tasks
+    with quiet(args):
+        run_head_stages(*tasks[0])  # 预热本进程 (模板缓存)
+        inline = throughput(run_head_stages, tasks, num_tasks, 1)
+    print(f"    inline            {inline:7.2f} tasks/s")
+    rows, parity = [], None
+    for workers in args.workers:
+        row = {"workers": workers}
+        with quiet(args):
+            row["threads"] = throughput(run_head_stages, tasks, num_tasks, workers)
+        for mode, shared in (("pool", True), ("pickle", False)):
+            with quiet(args), CpuStagePool(workers, shared=shared) as pool:
+                t0 = time.perf_counter()
+                pool.start()
+                row[f"{mode}_startup_s"] = round(time.perf_counter() - t0, 2)
+                throughput(pool.run, [(run_head_stages,) + task for task in tasks], workers, workers)  # 预热模板缓存
+                row[mode] = throughput(pool.run, [(run_head_stages,) + task for task in tasks], num_tasks, workers)
+                if shared and parity is None:
+                    parity = check_parity(pool, tasks)
+        for key in ("threads", "pool", "pickle"):
+            row[key] = round(row[key], 3)
+        rows.append(row)
+        print(f"    {workers:>2d} worker(s)     threads {row['threads']:7.2f}  pool {row['pool']:7.2f}  "
+              f"pickle {row['pickle']:7.2f} tasks/s  (pool startup {row['pool_startup_s']:.1f}s)")
+
+    base = rows[0]["pool"] / rows[0]["workers"] if rows else 0
+    for row in rows:
+        row["pool_speedup_vs_inline"] = round(row["pool"] / inline, 2)
+        row["pool_efficiency"] = round(row["pool"] / (base * row["workers"]), 2) if base else None
+    return {"inline": round(inline, 3), "parity": parity, "scaling": rows}
+
+
+def run(args):
+    template_dir = f"assets/templates/{args.template}"
+    results = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+               "cpu_count": os.cpu_count(), "template": args.template, "tasks": args.tasks, "resolutions": []}
+    with quiet(args):
+        face_models.warm_up()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results["tampered_bundle_used"] = check_rejected_bundle(args, tmp_dir)
+        print(f"[*] Tampered template bundle used: main process {results['tampered_bundle_used']['main_process']}, "
+              f"worker {results['tampered_bundle_used']['worker']}")
+        inputs = make_inputs(tmp_dir, args.resolutions, args.max_images)
+        for long_side, paths in inputs.items():
+            print(f"\n[{long_side}px] {len(paths)} input(s), {args.tasks} tasks per measurement")
+            tasks = load_tasks(paths, template_dir)
+            handoff = bench_handoff(tasks, args.repeat)
+            print(f"    handoff ({handoff['megabytes']} MB round trip): shared memory "
+                  f"{handoff['shared_memory_ms']:.1f} ms, pickle {handoff['pickle_ms']:.1f} ms")
+            row = {"resolution": long_side, "handoff": handoff, **bench_resolution(tasks, args)}
+            print(f"    parity with inline: {'OK' if row['parity'] else 'MISMATCH'}")
+            results["resolutions"].append(row)
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+    if any(results["tampered_bundle_used"].values()):
+        sys.exit("[!!!] A template bundle rejected at startup is still used.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the CPU stage process pool.")
+    parser.add_argument('--workers', type=int, nargs='+', default=list(range(1, (os.cpu_count() or 1) + 1)),
+                        help="Pool sizes to measure (default 1..cpu_count).")
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[1024, 2048, 4000],
+                        help="Long side of the generated inputs, in pixels.")
+    parser.add_argument('--max-images', type=int, default=2, help="Bundled images used per resolution.")
+    parser.add_argument('--tasks', type=int, default=16, help="Tasks per throughput measurement.")
+    parser.add_argument('--repeat', type=int, default=10, help="Repeats for the handoff measurement.")
+    parser.add_argument('--template', type=str, default="001", help="Template ID under assets/templates.")
+    parser.add_argument('--verbose', action='store_true', help="Show the stages' own logs.")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    run(parser.parse_args())
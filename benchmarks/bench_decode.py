@@ -0,0 +1,97 @@
+# benchmarks/bench_decode.py
+"""
+大图解码基准: 全分辨率解码 vs. JPEG DCT 域缩放解码 (src.image_io.open_image).
+
+用法: python benchmarks/bench_decode.py [--sizes 12 24 48] [--repeat 5] [--output result.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.image_io import open_image, read_gray
+
+# 百万像素 -> (宽, 高), 均为常见手机/相机 4:3 分辨率
+MEGAPIXEL_SIZES = {
+    12: (4000, 3000),
+    24: (5664, 4248),
+    48: (8000, 6000),
+}
+
+
+def make_jpeg(size, orientation=6, quality=92):
+    """生成带 EXIF 方向标记的合成 JPEG (平滑渐变 + 噪声, 压缩率接近真实照片)."""
+    w, h = size
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (h // 64 + 1, w // 64 + 1, 3), dtype=np.uint8)
+    image = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-8, 8, (h, w, 1), dtype=np.int16)
+    image = np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+    pil_image = Image.fromarray(image)
+    exif = pil_image.getexif()
+    exif[0x0112] = orientation
+    buffered = BytesIO()
+    pil_image.save(buffered, format="JPEG", quality=quality, exif=exif)
+    return buffered.getvalue()
+
+
+def timeit(fn, repeat):
+    fn()  # 预热
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples))
+
+
+def run(args):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mp in args.sizes:
+            data = make_jpeg(MEGAPIXEL_SIZES[mp])
+            path = os.path.join(tmp_dir, f"{mp}mp.jpg")
+            with open(path, "wb") as f:
+                f.write(data)
+
+            cases = {
+                # 改造前的路径
+                "pil_full_rgb": lambda: Image.open(BytesIO(data)).convert("RGB"),
+                "cv2_full_bgr": lambda: cv2.imread(path),
+                # 解析服务: 缩小到不小于 512x512
+                "draft_rgb_512": lambda: open_image(data, reduce_to=(512, 512)),
+                # 对齐: 灰度缩小到不小于检测尺寸
+                "draft_gray_800": lambda: read_gray(path, reduce_to=(800, 800)),
+                # 最终抠图仍需全分辨率 (含 EXIF 摆正)
+                "full_rgba_oriented": lambda: open_image(path, mode="RGBA"),
+            }
+            for name, fn in cases.items():
+                seconds = timeit(fn, args.repeat)
+                results.append({"megapixels": mp, "case": name, "median_ms": round(seconds * 1000, 2)})
+                print(f"[{mp:>2d} MP] {name:<20s} {seconds * 1000:9.2f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full vs. DCT-scaled JPEG decoding.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[12, 24, 48], choices=sorted(MEGAPIXEL_SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    run(parser.parse_args())
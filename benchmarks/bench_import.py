@@ -0,0 +1,83 @@
+# benchmarks/bench_import.py
+"""
+导入耗时基准: 每个模块在全新的 Python 进程中导入, 取多次的中位数 (含模型加载等导入期副作用).
+
+用于比较懒加载前后的启动开销; --compare 指定上一次的 JSON 时输出变化.
+缺少依赖 (如 dlib / diffusers) 或模型文件的模块记为 error, 不影响其他模块.
+
+用法: python benchmarks/bench_import.py [--modules src.pipeline main services.face_parsing_server]
+                                      [--repeat 5] [--output result.json] [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+
+DEFAULT_MODULES = [
+    "src.alignment",
+    "src.pipeline",
+    "main",
+    "prepare_template",
+    "services.face_parsing_server",
+    "services.inpainting_server",
+]
+
+IMPORT_SNIPPET = (
+    "import sys, time; sys.path.insert(0, {root!r}); t0 = time.perf_counter(); import {module}; "
+    "print('IMPORT_SECONDS', time.perf_counter() - t0)"
+)
+
+
+def time_import(module, repeat):
+    """返回 (中位数秒, 错误信息)."""
+    samples = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(root=project_root, module=module)],
+                              cwd=project_root, capture_output=True, text=True)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("IMPORT_SECONDS")]
+        if proc.returncode != 0 or not lines:
+            error = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+            return None, error
+        samples.append(float(lines[-1].split()[1]))
+    return float(np.median(samples)), None
+
+
+def run(args):
+    results = []
+    for module in args.modules:
+        seconds, error = time_import(module, args.repeat)
+        results.append({"module": module, "import_ms": None if seconds is None else round(seconds * 1000, 1),
+                        "error": error})
+        if error:
+            print(f"[!] {module:<32s} error: {error}")
+        else:
+            print(f"[{module:<32s}] {seconds * 1000:9.1f} ms")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {row["module"]: row for row in json.load(f)}
+        print(f"\n--- vs {args.compare} ---")
+        for row in results:
+            old = baseline.get(row["module"], {}).get("import_ms")
+            if old is not None and row["import_ms"] is not None:
+                print(f"[{row['module']:<32s}] {old:9.1f} -> {row['import_ms']:9.1f} ms ({old / row['import_ms']:.1f}x)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark module import time in fresh interpreters.")
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    parser.add_argument('--compare', type=str, default=None, help="Previous JSON result to compare with.")
+    run(parser.parse_args())
@@ -0,0 +1,238 @@
+# benchmarks/bench_pipeline.py
+"""
+证件照流水线端到端基准 (解析 / Inpainting 使用 benchmarks/stub_services.py 中的本地 stub 服务).
+
+1. 分步骤耗时: 在多种分辨率的输入上直接调用 main_pipeline, 统计各步骤 p50/p95/p99;
+2. 并发吞吐: 启动 main.py 的 FastAPI 应用, 以 N 个并发客户端请求 /api/v1/idphoto/generate;
+3. 峰值 RSS (本进程, 含三个 FastAPI 应用).
+
+输入为 inputs/user.jpg 与 face-parsing/assets/images/* 按长边缩放到各目标分辨率后的合成 JPEG.
+结果写入 JSON (含 git commit), --compare 指定上一次的 JSON 时输出各步骤 p50 的变化, 便于跨提交比较.
+
+用法: python benchmarks/bench_pipeline.py [--template 001] [--resolutions 1024 2048 4000] [--repeat 3]
+                                        [--concurrency 1 2 4] [--requests 8] [--output result.json]
+                                        [--compare previous.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+
+import numpy as np
+import requests
+from PIL import Image
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+# main_pipeline 使用相对路径 (assets/, outputs/)
+os.chdir(project_root)
+
+from benchmarks.stub_services import start_server, start_stub_services
+
+BUNDLED_IMAGES = ["inputs/user.jpg"] + sorted(glob("face-parsing/assets/images/*.jpg"))
+PERCENTILES = (50, 95, 99)
+
+
+def peak_rss_mb():
+    """本进程峰值常驻内存 (MB)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def quiet(args):
+    """屏蔽流水线自身的打印 (--verbose 时保留)."""
+    return contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def percentiles(samples):
+    values = np.percentile(samples, PERCENTILES) * 1000
+    return {f"p{p}_ms": round(float(v), 2) for p, v in zip(PERCENTILES, values)}
+
+
+def make_inputs(tmp_dir, resolutions, max_images):
+    """把内置图片按长边缩放到各分辨率 (可放大), 存为 JPEG. 返回 {分辨率: [路径, ...]}."""
+    sources = []
+    for source in BUNDLED_IMAGES:
+        try:
+            sources.append(Image.open(source).convert("RGB"))
+        except (OSError, ValueError) as e:
+            print(f"[!] Skipping unreadable input {source}: {e}")
+    sources = sources[:max_images]
+    if not sources:
+        raise RuntimeError("No readable bundled input images.")
+
+    inputs = {}
+    for long_side in resolutions:
+        inputs[long_side] = []
+        for index, image in enumerate(sources):
+            scale = long_side / max(image.size)
+            resized = image.resize((round(image.width * scale), round(image.height * scale)), Image.BICUBIC)
+            path = os.path.join(tmp_dir, f"{long_side}_{index}.jpg")
+            resized.save(path, quality=92)
+            inputs[long_side].append(path)
+    return inputs
+
+
+def bench_stages(inputs, args):
+    """直接调用 main_pipeline, 收集每个步骤的耗时分布."""
+    from src.pipeline import main_pipeline
+
+    rows = []
+    for long_side, paths in inputs.items():
+        stage_samples, errors = {}, 0
+        for path in paths:
+            for i in range(args.repeat + 1):
+                timings = {}
+                try:
+                    with quiet(args):
+                        main_pipeline(path, args.template, timings=timings)
+                except Exception as e:
+                    errors += 1
+                    print(f"[!] {os.path.basename(path)}: {e}")
+                    break
+                if i == 0:
+                    continue  # 预热 (首次调用包含连接建立与缓存填充)
+                for stage, seconds in timings.items():
+                    stage_samples.setdefault(stage, []).append(seconds)
+
+        row = {"resolution": long_side, "runs": len(stage_samples.get("Total", [])), "errors": errors,
+               "stages": {stage: percentiles(samples) for stage, samples in stage_samples.items()}}
+        rows.append(row)
+        print(f"\n[{long_side}px] {row['runs']} runs, {errors} errors")
+        for stage, stats in row["stages"].items():
+            print(f"    {stage:<28s} " + "  ".join(f"{k[:-3]} {v:8.1f} ms" for k, v in stats.items()))
+    return rows
+
+
+def bench_concurrency(inputs, args):
+    """启动 main.py 应用, 以 N 个并发客户端发送请求, 统计吞吐与延迟."""
+    from main import app
+
+    server, base_url = start_server(app)
+    url = base_url + "/api/v1/idphoto/generate"
+    payloads = []
+    for paths in inputs.values():
+        for path in paths:
+            with open(path, "rb") as f:
+                payloads.append(f.read())
+
+    def send(index):
+        data = {"template_id": args.template, "response_format": "image"}
+        files = {"user_image": (f"bench_{uuid.uuid4().hex}.jpg", payloads[index % len(payloads)], "image/jpeg")}
+        t0 = time.perf_counter()
+        try:
+            ok = requests.post(url, data=data, files=files, timeout=args.timeout).ok
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - t0
+
+    rows = []
+    try:
+        with quiet(args):
+            send(0)  # 预热
+        for clients in args.concurrency:
+            num_requests = max(args.requests, clients)
+            t0 = time.perf_counter()
+            with quiet(args), ThreadPoolExecutor(max_workers=clients) as executor:
+                results = list(executor.map(send, range(num_requests)))
+            elapsed = time.perf_counter() - t0
+
+            latencies = [seconds for ok, seconds in results if ok]
+            row = {"clients": clients, "requests": num_requests, "errors": num_requests - len(latencies),
+                   "throughput_rps": round(len(latencies) / elapsed, 3)}
+            row.update(percentiles(latencies) if latencies else {})
+            rows.append(row)
+            print(f"[{clients:>3d} clients] {row['throughput_rps']:.3f} req/s, errors {row['errors']}, "
+                  + "  ".join(f"{k[:-3]} {row[k]:.0f} ms" for k in row if k.endswith("_ms")))
+    finally:
+        server.should_exit = True
+    return rows
+
+
+def compare(results, baseline_path):
+    """与上一次结果比较各分辨率各步骤的 p50."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n--- p50 vs {baseline_path} (commit {baseline.get('commit')}) ---")
+    old_rows = {row["resolution"]: row for row in baseline.get("stages", [])}
+    for row in results["stages"]:
+        old_row = old_rows.get(row["resolution"])
+        if old_row is None:
+            continue
+        for stage, stats in row["stages"].items():
+            old = old_row["stages"].get(stage)
+            if old and old["p50_ms"] >= 0.1:
+                change = (stats["p50_ms"] - old["p50_ms"]) / max(old["p50_ms"], 1e-9)
+                print(f"[{row['resolution']}px] {stage:<28s} {old['p50_ms']:8.1f} -> {stats['p50_ms']:8.1f} ms "
+                      f"({change:+.1%})")
+
+
+def run(args):
+    servers = start_stub_services()
+    results = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+               "python": platform.python_version(), "cpu_count": os.cpu_count(), "template": args.template}
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inputs = make_inputs(tmp_dir, args.resolutions, args.max_images)
+            print(f"[*] {sum(len(p) for p in inputs.values())} inputs at {args.resolutions} px (long side)")
+            results["stages"] = bench_stages(inputs, args)
+            results["peak_rss_mb_stages"] = round(peak_rss_mb(), 1)
+            if args.concurrency:
+                print("\n--- Concurrency (main.py) ---")
+                results["concurrency"] = bench_concurrency(inputs, args)
+            results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    finally:
+        for server in servers:
+            server.should_exit = True
+    print(f"\n[*] Peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end ID photo pipeline benchmark with stub services.")
+    parser.add_argument('--template', type=str, default="001", help="Template ID under assets/templates.")
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[1024, 2048, 4000],
+                        help="Long side of the generated inputs, in pixels.")
+    parser.add_argument('--max-images', type=int, default=3, help="Bundled images used per resolution.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed pipeline runs per input.")
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 2, 4],
+                        help="Concurrent clients against main.py (empty to skip).")
+    parser.add_argument('--requests', type=int, default=8, help="Requests per concurrency level.")
+    parser.add_argument('--timeout', type=float, default=300, help="Per-request timeout in seconds.")
+    parser.add_argument('--verbose', action='store_true', help="Show the pipeline's own logs.")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    parser.add_argument('--compare', type=str, default=None, help="Previous JSON result to compare p50s with.")
+    run(parser.parse_args())
@@ -0,0 +1,114 @@
+# benchmarks/bench_templates.py
+"""
+模板包基准: 服务加载一个模板的耗时, 解码 PNG vs memory-map 模板包 (src/template_bundle.py), 并校验两者逐像素一致.
+
+- png:    np.load 关键点 + 读取 template.png 尺寸 + 解码 template_no_head.png / long_neck_mask.png + 构造 InpaintingCompositor
+- bundle: 打开并 memory-map template.bundle + InpaintingCompositor.from_bundle
+模板先复制到临时目录, 由 prepare_template.py 编译 (沿用已有关键点, 不需要 dlib), 同时记录编译耗时.
+一致性: 两种方式得到的底板/长脖掩码/关键点/模板 alpha 相同, 且对随机软边人头的 compose 输出均与 PIL 参照实现一致.
+用法: python benchmarks/bench_templates.py [--templates 001 002] [--heads 8] [--repeat 50] [--output result.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+os.chdir(project_root)
+
+import prepare_template
+from benchmarks.bench_compose import median_ms, random_head, reference_assets
+from src.image_utils import InpaintingCompositor
+from src.template_bundle import BUNDLE_NAME, TemplateBundle
+
+
+def load_png(template_dir):
+    target_landmarks = np.load(f"{template_dir}/landmark_template.npy")
+    size = Image.open(f"{template_dir}/template.png").size
+    template_no_head = np.array(Image.open(f"{template_dir}/template_no_head.png").convert("RGBA"))
+    long_neck_mask = np.array(Image.open(f"{template_dir}/long_neck_mask.png").convert("L"))
+    return target_landmarks, size, template_no_head, InpaintingCompositor(template_no_head, long_neck_mask)
+
+
+def load_bundle(template_dir):
+    bundle = TemplateBundle(os.path.join(template_dir, BUNDLE_NAME))
+    return bundle, InpaintingCompositor.from_bundle(bundle)
+
+
+def bench_template(template_dir, template_id, args, rng):
+    target_landmarks, size, template_no_head, png_compositor = load_png(template_dir)
+    bundle, bundle_compositor = load_bundle(template_dir)
+    long_neck_mask = np.array(Image.open(f"{template_dir}/long_neck_mask.png").convert("L"))
+
+    exact = (bundle.size == size and np.array_equal(bundle.landmarks, target_landmarks)
+             and np.array_equal(bundle.alpha, template_no_head[..., 3])
+             and np.array_equal(bundle_compositor.base, png_compositor.base)
+             and np.array_equal(bundle_compositor.neck, png_compositor.neck)
+             and bundle_compositor.inpaint_bounds == png_compositor.inpaint_bounds)
+    for _ in range(args.heads):
+        head = random_head(size[::-1], rng)
+        expected = reference_assets(head, template_no_head, long_neck_mask)
+        for compositor in (png_compositor, bundle_compositor):
+            exact &= all(np.array_equal(a, b) for a, b in zip(expected, compositor.compose(head)))
+
+    row = {
+        "template": template_id,
+        "size": list(size),
+        "exact": bool(exact),
+        "png_kb": round(sum(os.path.getsize(f"{template_dir}/{name}") for name in
+                            ("template.png", "template_no_head.png", "long_neck_mask.png")) / 1024, 1),
+        "bundle_kb": round(os.path.getsize(os.path.join(template_dir, BUNDLE_NAME)) / 1024, 1),
+        "png_load_ms": median_ms(lambda: load_png(template_dir), args.repeat),
+        "bundle_load_ms": median_ms(lambda: load_bundle(template_dir), args.repeat),
+    }
+    row["speedup"] = round(row["png_load_ms"] / row["bundle_load_ms"], 1)
+    print(f"[{template_id}] {size[0]}x{size[1]}, exact: {exact}")
+    print(f"    png {row['png_load_ms']:8.3f} ms ({row['png_kb']} KB)   bundle {row['bundle_load_ms']:8.3f} ms "
+          f"({row['bundle_kb']} KB)   ({row['speedup']}x)")
+    return row
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    results = {"templates": []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for template_id in args.templates:
+            shutil.copytree(f"assets/templates/{template_id}", os.path.join(tmp_dir, template_id))
+        compile_args = SimpleNamespace(template_id=None, templates_dir=tmp_dir, workers=args.workers, force=True,
+                                       reuse_landmarks=True)
+        t0 = time.perf_counter()
+        if prepare_template.main(compile_args) != 0:
+            sys.exit("[!!!] Template compilation failed.")
+        results["compile_seconds"] = round(time.perf_counter() - t0, 3)
+
+        for template_id in args.templates:
+            results["templates"].append(bench_template(os.path.join(tmp_dir, template_id), template_id, args, rng))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+    if not all(row["exact"] for row in results["templates"]):
+        sys.exit("[!!!] Template bundle assets differ from the PNG assets.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark memory-mapped template bundles against decoding PNGs.")
+    parser.add_argument('--templates', type=str, nargs='+', default=["001", "002"])
+    parser.add_argument('--workers', type=int, default=None, help="Compile processes (default: cpu_count).")
+    parser.add_argument('--heads', type=int, default=8, help="Random soft-edged heads per template.")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    run(parser.parse_args())
@@ -0,0 +1,186 @@
+# benchmarks/load_test.py
+"""
+/api/v1/idphoto/generate 压测工具 (异步 httpx 客户端, 闭环并发).
+
+对每个 (模板, 输入尺寸) 组合依次扫描并发数: C 个客户端在 --duration 秒内持续发送请求 (收到响应后立即发下一个),
+记录延迟分布 (p50/p90/p95/p99/max)、错误率 (按状态码/异常类型) 与吞吐, 并输出饱和曲线:
+吞吐随并发数的增长低于 --knee-gain 时视为达到饱和点, 可据此确定 uvicorn worker 数与线程池大小.
+
+默认在本进程内启动 main.py 应用和 stub 解析/Inpainting 服务 (见 benchmarks/stub_services.py);
+压测独立部署的服务时用 --url 指定地址 (服务端需自行指向 stub 或真实后端).
+
+用法: python benchmarks/load_test.py [--url http://127.0.0.1:8080] [--concurrency 1 2 4 8 16]
+                                    [--templates 001 002] [--sizes 1024 2048] [--duration 10] [--output load.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import httpx
+import numpy as np
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.bench_pipeline import git_commit, make_inputs, peak_rss_mb, quiet
+from benchmarks.stub_services import start_server, start_stub_services
+
+GENERATE_PATH = "/api/v1/idphoto/generate"
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+async def closed_loop(client, url, payloads, template_id, clients, duration, args):
+    """C 个客户端在 duration 秒内循环发送请求, 返回 [(成功, 延迟秒, 错误类型)]."""
+    deadline = time.perf_counter() + duration
+    samples = []
+
+    async def worker(worker_id):
+        index = worker_id
+        while time.perf_counter() < deadline:
+            payload = payloads[index % len(payloads)]
+            index += clients
+            data = {"template_id": template_id, "response_format": args.response_format}
+            files = {"user_image": (f"load_{uuid.uuid4().hex}.jpg", payload, "image/jpeg")}
+            t0 = time.perf_counter()
+            try:
+                response = await client.post(url, data=data, files=files)
+                await response.aread()
+                error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            samples.append((error is None, time.perf_counter() - t0, error))
+
+    await asyncio.gather(*(worker(i) for i in range(clients)))
+    return samples
+
+
+def summarize(samples, elapsed):
+    latencies = np.array([seconds for ok, seconds, _ in samples if ok]) * 1000
+    errors = Counter(error for ok, _, error in samples if not ok)
+    row = {
+        "requests": len(samples),
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / max(len(samples), 1), 4),
+        "error_types": dict(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 3),
+    }
+    if latencies.size:
+        values = np.percentile(latencies, LATENCY_PERCENTILES)
+        row.update({f"p{p}_ms": round(float(v), 1) for p, v in zip(LATENCY_PERCENTILES, values)})
+        row["mean_ms"] = round(float(latencies.mean()), 1)
+        row["max_ms"] = round(float(latencies.max()), 1)
+    return row
+
+
+def find_knee(levels, knee_gain):
+    """吞吐增幅首次低于 knee_gain (或错误率上升) 之前的并发数, 即饱和点."""
+    for previous, current in zip(levels, levels[1:]):
+        gain = current["throughput_rps"] / max(previous["throughput_rps"], 1e-9) - 1
+        if gain < knee_gain or current["error_rate"] > previous["error_rate"]:
+            return previous["clients"]
+    return levels[-1]["clients"] if levels else None
+
+
+def print_curve(levels, knee):
+    """终端中的饱和曲线: 吞吐柱状图 + p95 延迟."""
+    peak = max((level["throughput_rps"] for level in levels), default=0) or 1
+    for level in levels:
+        bar = "#" * int(round(40 * level["throughput_rps"] / peak))
+        marker = "  <- saturation" if level["clients"] == knee else ""
+        print(f"    {level['clients']:>4d} clients |{bar:<40s}| {level['throughput_rps']:7.3f} req/s  "
+              f"p95 {level.get('p95_ms', float('nan')):8.0f} ms  errors {level['error_rate']:.1%}{marker}")
+
+
+async def sweep(base_url, inputs, args):
+    url = base_url.rstrip("/") + GENERATE_PATH
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    results = []
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for template_id in args.templates:
+            for long_side, paths in inputs.items():
+                payloads = []
+                for path in paths:
+                    with open(path, "rb") as f:
+                        payloads.append(f.read())
+
+                with quiet(args):  # 预热并建立连接
+                    await client.post(url, data={"template_id": template_id, "response_format": args.response_format},
+                                      files={"user_image": ("warmup.jpg", payloads[0], "image/jpeg")})
+
+                print(f"\n[*] template {template_id}, {long_side}px inputs")
+                levels = []
+                for clients in args.concurrency:
+                    t0 = time.perf_counter()
+                    with quiet(args):
+                        samples = await closed_loop(client, url, payloads, template_id, clients, args.duration, args)
+                    row = {"clients": clients, **summarize(samples, time.perf_counter() - t0)}
+                    levels.append(row)
+                    print(f"    {clients:>4d} clients: {row['throughput_rps']:7.3f} req/s, "
+                          f"error rate {row['error_rate']:.1%}, "
+                          + "  ".join(f"p{p} {row[f'p{p}_ms']:.0f} ms" for p in LATENCY_PERCENTILES
+                                      if f"p{p}_ms" in row))
+
+                knee = find_knee(levels, args.knee_gain)
+                print(f"[+] Saturation curve (template {template_id}, {long_side}px):")
+                print_curve(levels, knee)
+                results.append({"template_id": template_id, "resolution": long_side, "saturation_clients": knee,
+                                "levels": levels})
+    return results
+
+
+def run(args):
+    servers = []
+    if args.url:
+        base_url = args.url
+    else:
+        servers = start_stub_services()
+        from main import app
+
+        server, base_url = start_server(app)
+        servers.append(server)
+        print(f"[*] In-process main.py app at {base_url}")
+
+    report = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "url": args.url,
+              "duration_s": args.duration, "response_format": args.response_format}
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inputs = make_inputs(tmp_dir, args.sizes, args.max_images)
+            report["sweeps"] = asyncio.run(sweep(base_url, inputs, args))
+    finally:
+        for server in servers:
+            server.should_exit = True
+    if not args.url:
+        report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[+] Results saved to: {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency sweep load test for /api/v1/idphoto/generate.")
+    parser.add_argument('--url', type=str, default=None,
+                        help="Base URL of a running API; by default main.py and stub services run in-process.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16], help="Concurrent clients.")
+    parser.add_argument('--templates', type=str, nargs='+', default=["001"], help="Template IDs to sweep.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1024, 2048],
+                        help="Long side of the uploaded images, in pixels.")
+    parser.add_argument('--max-images', type=int, default=3, help="Distinct bundled images per size.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per concurrency level.")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Per-request timeout in seconds.")
+    parser.add_argument('--response-format', type=str, default="image", choices=["json", "image", "multipart"])
+    parser.add_argument('--knee-gain', type=float, default=0.1,
+                        help="Throughput gain below which the next concurrency level counts as saturated.")
+    parser.add_argument('--verbose', action='store_true', help="Show the in-process pipeline's own logs.")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON file for the results.")
+    run(parser.parse_args())
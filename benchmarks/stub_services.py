@@ -0,0 +1,142 @@
+# benchmarks/stub_services.py
+"""
+本地 stub 服务: 与 services/ 中的人像解析、Inpainting 服务接口一致, 但不加载任何模型.
+
+- /parse:   返回确定性的解析掩码 (固定比例的头部/头发/五官椭圆, 按原图尺寸输出)
+- /inpaint: 恒等修复, 原样返回 init_image
+
+用于在无 GPU / 无模型权重的环境下对 main_pipeline 和 main.py 做端到端基准与压测.
+用法: python benchmarks/stub_services.py [--parsing-port 8001] [--inpainting-port 8000]
+"""
+import argparse
+import base64
+import os
+import socket
+import sys
+import threading
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.responses import Response
+from PIL import Image
+
+current_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(current_file_path))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.image_io import open_image
+
+PARSING_SIZE = 512
+
+parsing_app = FastAPI(title="Face parsing stub")
+inpainting_app = FastAPI(title="Inpainting stub")
+
+
+def make_stub_mask(size=PARSING_SIZE):
+    """固定的 512x512 解析结果: 脖子(14) + 头发(17) + 皮肤(1) + 眉/眼/耳/鼻/嘴 (标签同 face-parsing)."""
+    mask = np.zeros((size, size), np.uint8)
+    s = size / 512
+
+    def ellipse(center, axes, label):
+        cv2.ellipse(mask, (int(center[0] * s), int(center[1] * s)), (int(axes[0] * s), int(axes[1] * s)),
+                    0, 0, 360, label, -1)
+
+    cv2.rectangle(mask, (int(200 * s), int(330 * s)), (int(312 * s), size - 1), 14, -1)
+    ellipse((256, 200), (135, 170), 17)
+    ellipse((256, 240), (110, 140), 1)
+    ellipse((140, 250), (18, 35), 7)
+    ellipse((372, 250), (18, 35), 8)
+    ellipse((210, 200), (30, 8), 2)
+    ellipse((302, 200), (30, 8), 3)
+    ellipse((210, 225), (20, 9), 4)
+    ellipse((302, 225), (20, 9), 5)
+    ellipse((256, 275), (16, 30), 10)
+    ellipse((256, 322), (38, 9), 12)
+    ellipse((256, 338), (36, 9), 13)
+    return mask
+
+
+STUB_MASK = Image.fromarray(make_stub_mask())
+
+
+def _image_response(request, png_bytes, base64_key):
+    """与真实服务一致: Accept: image/png 时直接返回 PNG 字节, 否则返回 JSON + base64."""
+    if "image/png" in request.headers.get("accept", ""):
+        return Response(content=png_bytes, media_type="image/png")
+    return {"status": "success", base64_key: base64.b64encode(png_bytes).decode("utf-8")}
+
+
+@parsing_app.post("/parse")
+async def parse_face(request: Request, image: UploadFile = File(...)):
+    img_bytes = await image.read()
+    _, original_size = open_image(img_bytes, reduce_to=(PARSING_SIZE, PARSING_SIZE))
+    buffered = BytesIO()
+    STUB_MASK.resize(original_size, resample=Image.NEAREST).save(buffered, format="PNG")
+    return _image_response(request, buffered.getvalue(), "mask_base64")
+
+
+@inpainting_app.post("/inpaint")
+async def inpaint(request: Request, init_image: UploadFile = File(...), mask_image: UploadFile = File(...)):
+    init_img_bytes = await init_image.read()
+    await mask_image.read()
+    if not init_img_bytes.startswith(b"\x89PNG"):
+        buffered = BytesIO()
+        Image.open(BytesIO(init_img_bytes)).convert("RGB").save(buffered, format="PNG")
+        init_img_bytes = buffered.getvalue()
+    return _image_response(request, init_img_bytes, "image_base64")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port=None, host="127.0.0.1", timeout=30):
+    """在后台线程中启动 uvicorn, 返回 (server, base_url); 结束时设置 server.should_exit = True."""
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + timeout
+    while not server.started:
+        if not thread.is_alive() or time.time() > deadline:
+            raise RuntimeError(f"Server on port {port} failed to start.")
+        time.sleep(0.05)
+    return server, f"http://{host}:{port}"
+
+
+def start_stub_services():
+    """启动两个 stub 服务并把 src.pipeline 使用的服务地址指向它们, 返回 server 列表."""
+    parsing_server, parsing_url = start_server(parsing_app)
+    inpainting_server, inpainting_url = start_server(inpainting_app)
+    os.environ["FACE_PARSING_SERVICE_URL"] = parsing_url + "/parse"
+    os.environ["INPAINTING_SERVICE_URL"] = inpainting_url + "/inpaint"
+    if "src.pipeline" in sys.modules:
+        pipeline = sys.modules["src.pipeline"]
+        pipeline.FACE_PARSING_SERVICE_URL = os.environ["FACE_PARSING_SERVICE_URL"]
+        pipeline.INPAINTING_SERVICE_URL = os.environ["INPAINTING_SERVICE_URL"]
+    print(f"[*] Stub services: parsing {parsing_url}/parse, inpainting {inpainting_url}/inpaint")
+    return [parsing_server, inpainting_server]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run stub face parsing and inpainting services.")
+    parser.add_argument('--parsing-port', type=int, default=8001)
+    parser.add_argument('--inpainting-port', type=int, default=8000)
+    args = parser.parse_args()
+
+    start_server(parsing_app, args.parsing_port, host="0.0.0.0")
+    print(f"[+] Face parsing stub listening on port {args.parsing_port}")
+    start_server(inpainting_app, args.inpainting_port, host="0.0.0.0")
+    print(f"[+] Inpainting stub listening on port {args.inpainting_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,124 @@
+"""
+Samples/sec of CelebAMaskHQ (JPEG + PNG decoded per sample) against CelebAMaskHQShards (memory-mapped uint8 shards).
+
+Without --data-root a synthetic CelebAMask-HQ layout (1024x1024 JPEGs, 512x512 label PNGs) is generated in a
+temporary directory. Samples of both datasets are checked to be identical with the default (deterministic)
+transform before timing.
+
+Usage:
+    python benchmarks/bench_dataset.py --data-root /path/to/CelebAMask-HQ --shards /path/to/shards --num-workers 4
+    python benchmarks/bench_dataset.py --num-samples 256
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+import tempfile
+from typing import Dict, List
+
+import cv2
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.dataset import CelebAMaskHQ, CelebAMaskHQShards  # noqa: E402
+from utils.prepare_shards import prepare_shards  # noqa: E402
+from utils.transform import DefaultTransform, TrainTransform  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+
+def make_synthetic_dataset(root: str, num_samples: int) -> None:
+    """CelebAMask-HQ layout with textured 1024x1024 JPEG faces and 19-class 512x512 label maps."""
+    images_dir, labels_dir = os.path.join(root, "CelebA-HQ-img"), os.path.join(root, "mask")
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(labels_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    for i in range(num_samples):
+        image = cv2.resize(rng.integers(0, 256, (32, 32, 3), dtype=np.uint8), (1024, 1024), interpolation=cv2.INTER_CUBIC)
+        label = np.zeros((512, 512), dtype=np.uint8)
+        for cls in rng.permutation(np.arange(1, 19))[:10]:
+            center = tuple(int(v) for v in rng.integers(64, 448, 2))
+            cv2.ellipse(label, center, tuple(int(v) for v in rng.integers(20, 120, 2)), 0, 0, 360, int(cls), -1)
+        cv2.imwrite(os.path.join(images_dir, f"{i}.jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        cv2.imwrite(os.path.join(labels_dir, f"{i}.png"), label)
+
+
+def samples_per_sec(dataset, params: argparse.Namespace) -> float:
+    loader = DataLoader(
+        dataset,
+        batch_size=params.batch_size,
+        shuffle=True,
+        num_workers=params.num_workers,
+        drop_last=True,
+        persistent_workers=False,
+    )
+    count, start = 0, None
+    for batch_idx, (image, _) in enumerate(loader):
+        if batch_idx == 0:
+            start = time.perf_counter()  # exclude worker start-up
+            continue
+        count += image.shape[0]
+    return count / (time.perf_counter() - start)
+
+
+def run(params: argparse.Namespace) -> List[Dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        data_root = params.data_root
+        if data_root is None:
+            data_root = os.path.join(tmp, "celebamask")
+            logger.info(f"Generating {params.num_samples} synthetic samples")
+            make_synthetic_dataset(data_root, params.num_samples)
+        shards_dir = params.shards
+        if shards_dir is None or not os.path.exists(os.path.join(shards_dir, "index.json")):
+            shards_dir = shards_dir or os.path.join(tmp, "shards")
+            prepare_shards(data_root, shards_dir, shard_size=params.shard_size, num_workers=params.num_workers or 1)
+
+        images_dir, labels_dir = os.path.join(data_root, "CelebA-HQ-img"), os.path.join(data_root, "mask")
+        folder = CelebAMaskHQ(images_dir, labels_dir, transform=DefaultTransform())
+        shards = CelebAMaskHQShards(shards_dir, transform=DefaultTransform())
+        if len(folder) != len(shards):
+            raise AssertionError(f"Dataset sizes differ: {len(folder)} images vs {len(shards)} shard samples")
+        for idx in np.linspace(0, len(folder) - 1, 8).astype(int):
+            (image_a, label_a), (image_b, label_b) = folder[idx], shards[idx]
+            if not (torch.equal(image_a, image_b) and np.array_equal(label_a, label_b)):
+                raise AssertionError(f"Sample {idx} differs between the folder and the shards")
+
+        rows = []
+        for transform_name, transform in (("default", DefaultTransform()), ("train", TrainTransform(params.image_size))):
+            row = {"transform": transform_name, "num_workers": params.num_workers}
+            for name, dataset in (("folder", CelebAMaskHQ(images_dir, labels_dir, transform=transform)),
+                                  ("shards", CelebAMaskHQShards(shards_dir, transform=transform))):
+                row[f"{name}_samples_per_sec"] = samples_per_sec(dataset, params)
+            row["speedup"] = row["shards_samples_per_sec"] / row["folder_samples_per_sec"]
+            rows.append(row)
+            logger.info(f"{transform_name:>8s} transform: folder {row['folder_samples_per_sec']:7.1f} samples/s  "
+                        f"shards {row['shards_samples_per_sec']:7.1f} samples/s  ({row['speedup']:.2f}x)")
+
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Training data pipeline benchmark")
+    parser.add_argument("--data-root", type=str, default=None, help="CelebAMask-HQ root (default: synthetic data)")
+    parser.add_argument("--shards", type=str, default=None, help="existing shards directory (default: built here)")
+    parser.add_argument("--num-samples", type=int, default=256, help="synthetic samples to generate")
+    parser.add_argument("--shard-size", type=int, default=2000, help="samples per shard when building shards")
+    parser.add_argument("--batch-size", type=int, default=8, help="batch size")
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader workers")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[448, 448], help="train crop size")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
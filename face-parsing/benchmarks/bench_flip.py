@@ -0,0 +1,101 @@
+"""
+Equivalence and speed of the lookup-table label flip (utils.transform.flip_label) against the previous
+per-pair boolean-mask loop of HorizontalFlip.
+
+Label maps contain every class, so each left/right pair is exercised. The PIL path of HorizontalFlip, the NumPy
+and the tensor variants of `flip_label` must all match the loop exactly; the script raises if they do not.
+
+Usage:
+    python benchmarks/bench_flip.py --sizes 512 1024 --batch-size 8
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+from typing import Callable, Dict, List
+
+import numpy as np
+from PIL import Image
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.transform import HorizontalFlip, flip_label  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+
+def flip_label_loop(target: Image.Image) -> Image.Image:
+    """The previous implementation: copy, one boolean-mask pass per swapped label, then flip."""
+    np_target = np.array(target)
+    label_swaps = {2: 3, 3: 2, 4: 5, 5: 4, 7: 8, 8: 7}
+    np_target_flipped = np_target.copy()
+    for src, dst in label_swaps.items():
+        np_target_flipped[np_target == src] = dst
+    return Image.fromarray(np_target_flipped).transpose(Image.FLIP_LEFT_RIGHT)
+
+
+def time_ms(fn: Callable, repeat: int) -> float:
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def run(params: argparse.Namespace) -> List[Dict]:
+    rng = np.random.default_rng(0)
+    flip = HorizontalFlip(p=1.0)
+    rows = []
+    for size in params.sizes:
+        labels = rng.integers(0, params.num_classes, (params.batch_size, size, size), dtype=np.uint8)
+        label = labels[0]
+        target = Image.fromarray(label)
+        image = Image.fromarray(np.zeros((size, size, 3), dtype=np.uint8))
+
+        reference = np.array(flip_label_loop(target))
+        if not np.array_equal(np.array(flip(image, target)[1]), reference):
+            raise AssertionError(f"{size}: HorizontalFlip differs from the per-pair loop")
+        if not np.array_equal(flip_label(label), reference):
+            raise AssertionError(f"{size}: NumPy flip_label differs from the per-pair loop")
+        batch = torch.from_numpy(labels).long()
+        references = np.stack([np.array(flip_label_loop(Image.fromarray(x))) for x in labels])
+        if not np.array_equal(flip_label(batch).numpy(), references):
+            raise AssertionError(f"{size}: tensor flip_label differs from the per-pair loop")
+
+        row = {
+            "size": size,
+            "loop_ms": time_ms(lambda: flip_label_loop(target), params.repeat),
+            "horizontal_flip_ms": time_ms(lambda: flip(image, target), params.repeat),
+            "numpy_lut_ms": time_ms(lambda: flip_label(label), params.repeat),
+            "tensor_batch_lut_ms": time_ms(lambda: flip_label(batch), params.repeat),
+        }
+        row["speedup"] = row["loop_ms"] / row["numpy_lut_ms"]
+        rows.append(row)
+        logger.info(f"{size:>5d}px  per-pair loop {row['loop_ms']:6.2f} ms  HorizontalFlip {row['horizontal_flip_ms']:6.2f} ms  "
+                    f"NumPy LUT {row['numpy_lut_ms']:6.2f} ms ({row['speedup']:.1f}x)  "
+                    f"tensor LUT {row['tensor_batch_lut_ms']:7.2f} ms / {params.batch_size} labels")
+
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Label flip benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024], help="label map side")
+    parser.add_argument("--batch-size", type=int, default=8, help="label maps in the tensor batch")
+    parser.add_argument("--num-classes", type=int, default=19, help="number of classes")
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per size")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
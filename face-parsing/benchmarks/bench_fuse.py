@@ -0,0 +1,120 @@
+"""
+Parity check and CPU throughput of `BiSeNet.fuse_for_inference`.
+
+Variants: the eager model, BatchNorm folded (NCHW), folded + channels-last, and folded + channels-last
+compiled with TorchScript (and torch.compile with --inductor). Every variant is checked against the
+eager logits first (max abs difference and label agreement); the script exits with an error if a variant
+exceeds the tolerance.
+
+Usage:
+    python benchmarks/bench_fuse.py --weight ./weights/resnet18.pt --batch-size 4 --input-size 512
+"""
+import os
+import sys
+import copy
+import time
+import json
+import argparse
+import logging
+from typing import Dict, List
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.bisenet import BiSeNet  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+
+def randomize_batchnorm(model: torch.nn.Module) -> None:
+    """Give every BatchNorm non-trivial statistics so that folding is actually exercised without trained weights."""
+    generator = torch.Generator().manual_seed(0)
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.5, 0.5, generator=generator)
+            module.running_var.uniform_(0.5, 2.0, generator=generator)
+            module.weight.data.uniform_(0.5, 1.5, generator=generator)
+            module.bias.data.uniform_(-0.2, 0.2, generator=generator)
+
+
+def throughput(model: torch.nn.Module, batch: torch.Tensor, repeat: int) -> float:
+    model(batch)  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        model(batch)
+    return repeat * batch.shape[0] / (time.perf_counter() - t0)
+
+
+@torch.no_grad()
+def run(params: argparse.Namespace) -> List[Dict]:
+    model = BiSeNet(19, backbone_name=params.model)
+    if params.weight:
+        model.load_state_dict(torch.load(params.weight, map_location="cpu"))
+    else:
+        logger.warning("No --weight given: using random weights with randomized BatchNorm statistics")
+        randomize_batchnorm(model)
+    model.eval().set_output_mode("logits")
+    if params.threads:
+        torch.set_num_threads(params.threads)
+
+    batch = torch.randn(params.batch_size, 3, params.input_size, params.input_size)
+    reference = model(batch)
+
+    variants = {
+        "eager": lambda: model,
+        "folded": lambda: copy.deepcopy(model).fuse_for_inference(channels_last=False),
+        "folded+channels_last": lambda: copy.deepcopy(model).fuse_for_inference(),
+        "folded+channels_last+torchscript": lambda: copy.deepcopy(model).fuse_for_inference(
+            compile="torchscript", example_input=batch),
+    }
+    if params.inductor:
+        variants["folded+channels_last+inductor"] = lambda: copy.deepcopy(model).fuse_for_inference(
+            compile="inductor", example_input=batch)
+
+    rows = []
+    for name, build in variants.items():
+        variant = build()
+        output = variant(batch)
+        max_abs_diff = float((output - reference).abs().max())
+        agreement = float((output.argmax(1) == reference.argmax(1)).float().mean())
+        if max_abs_diff > params.atol:
+            raise AssertionError(f"{name}: max abs difference {max_abs_diff:.2e} exceeds tolerance {params.atol:.0e}")
+
+        images_per_sec = throughput(variant, batch, params.repeat)
+        rows.append({
+            "variant": name,
+            "max_abs_diff": max_abs_diff,
+            "label_agreement": agreement,
+            "images_per_sec": images_per_sec,
+        })
+        logger.info(f"{name:>34s}  max|diff| {max_abs_diff:.2e}  labels {agreement:.5%}  {images_per_sec:6.2f} img/s")
+
+    logger.info(f"Speed-up of the best variant over eager: "
+                f"{max(r['images_per_sec'] for r in rows) / rows[0]['images_per_sec']:.2f}x "
+                f"(batch {params.batch_size}, {params.input_size}px, {torch.get_num_threads()} threads)")
+
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="BatchNorm folding / channels-last parity and throughput benchmark")
+    parser.add_argument("--model", type=str, default="resnet18", choices=["resnet18", "resnet34"], help="model name")
+    parser.add_argument("--weight", type=str, default=None, help="path to trained model, i.e resnet18/34")
+    parser.add_argument("--batch-size", type=int, default=1, help="images per forward pass")
+    parser.add_argument("--input-size", type=int, default=512, help="model input resolution")
+    parser.add_argument("--repeat", type=int, default=10, help="timed forward passes per variant")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch default)")
+    parser.add_argument("--atol", type=float, default=1e-3, help="max abs logits difference allowed against eager")
+    parser.add_argument("--inductor", action="store_true", help="also benchmark torch.compile (needs a C++ compiler)")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
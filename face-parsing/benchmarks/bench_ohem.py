@@ -0,0 +1,136 @@
+"""
+Equivalence and speed of the top-k OHEM loss (utils.loss) against the previous sort-based implementation.
+
+Runs both on random logits for the three BiSeNet heads, in the regime where the threshold branch is taken
+(early training, most pixels hard) and where the top-k fallback is taken (late training, few hard pixels).
+Loss values and gradients must match; the script raises if they do not.
+
+Usage:
+    python benchmarks/bench_ohem.py --batch-size 8 --image-size 448 448
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+from typing import Dict, List
+
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.loss import OhemLossWrapper  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+
+class SortOhemCELoss(nn.Module):
+    """The previous implementation: full descending sort of every pixel loss."""
+
+    def __init__(self, thresh: float, min_kept: int) -> None:
+        super().__init__()
+        self.thresh = torch.log(torch.tensor(1 / thresh, dtype=torch.float))
+        self.min_kept = min_kept
+        self.criteria = nn.CrossEntropyLoss(reduction='none')
+
+    def forward(self, logits: torch.Tensor, labels: torch.Tensor) -> torch.Tensor:
+        loss = self.criteria(logits, labels).view(-1)
+        loss, _ = torch.sort(loss, descending=True)
+        if loss[self.min_kept] > self.thresh:
+            loss = loss[loss > self.thresh]
+        else:
+            loss = loss[:self.min_kept]
+        return torch.mean(loss)
+
+
+def sort_wrapper(criterion: SortOhemCELoss, output, labels) -> torch.Tensor:
+    return sum(criterion(out, labels) for out in output)
+
+
+def make_inputs(params: argparse.Namespace, confidence: float, device: torch.device):
+    """Logits whose correct class gets `confidence` extra score: higher means fewer hard pixels."""
+    generator = torch.Generator().manual_seed(0)
+    height, width = params.image_size
+    labels = torch.randint(0, params.num_classes, (params.batch_size, height, width), generator=generator)
+    output = []
+    for _ in range(3):
+        logits = torch.randn(params.batch_size, params.num_classes, height, width, generator=generator)
+        logits.scatter_add_(1, labels[:, None], torch.full_like(logits[:, :1], confidence))
+        output.append(logits.to(device).requires_grad_(True))
+    return output, labels.to(device)
+
+
+def timed(fn, output, repeat: int, device: torch.device) -> float:
+    def step():
+        for out in output:
+            out.grad = None
+        fn().backward()
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+    step()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        step()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def run(params: argparse.Namespace) -> List[Dict]:
+    device = torch.device("cuda" if torch.cuda.is_available() and not params.cpu else "cpu")
+    height, width = params.image_size
+    min_kept = params.batch_size * height * width // 16  # as in train.py
+    topk_loss = OhemLossWrapper(thresh=params.score_thres, min_kept=min_kept)
+    sort_loss = SortOhemCELoss(thresh=params.score_thres, min_kept=min_kept)
+
+    rows = []
+    for regime, confidence in (("threshold", 0.0), ("top-k", 8.0)):
+        output, labels = make_inputs(params, confidence, device)
+
+        reference = sort_wrapper(sort_loss, output, labels)
+        reference_grads = torch.autograd.grad(reference, output)
+        value = topk_loss(output, labels)
+        grads = torch.autograd.grad(value, output)
+
+        value_diff = abs(value.item() - reference.item())
+        grad_diff = max(float((g - r).abs().max()) for g, r in zip(grads, reference_grads))
+        if value_diff > params.atol * max(1.0, abs(reference.item())) or grad_diff > params.atol:
+            raise AssertionError(f"{regime}: loss differs by {value_diff:.2e}, gradients by {grad_diff:.2e}")
+
+        row = {
+            "regime": regime,
+            "loss": reference.item(),
+            "value_diff": value_diff,
+            "grad_diff": grad_diff,
+            "sort_ms": timed(lambda: sort_wrapper(sort_loss, output, labels), output, params.repeat, device),
+            "topk_ms": timed(lambda: topk_loss(output, labels), output, params.repeat, device),
+        }
+        row["speedup"] = row["sort_ms"] / row["topk_ms"]
+        rows.append(row)
+        logger.info(f"{regime:>9s} branch: loss {row['loss']:.5f} (|diff| {value_diff:.1e}, grad |diff| {grad_diff:.1e})  "
+                    f"sort {row['sort_ms']:7.1f} ms  top-k {row['topk_ms']:7.1f} ms  ({row['speedup']:.2f}x, "
+                    f"forward + backward, 3 heads, {device.type})")
+
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="OHEM loss benchmark")
+    parser.add_argument("--batch-size", type=int, default=8, help="batch size")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[448, 448], help="train crop size")
+    parser.add_argument("--num-classes", type=int, default=19, help="number of classes")
+    parser.add_argument("--score-thres", type=float, default=0.7, help="OHEM score threshold")
+    parser.add_argument("--repeat", type=int, default=5, help="timed steps")
+    parser.add_argument("--atol", type=float, default=1e-5, help="tolerance for loss values and gradients")
+    parser.add_argument("--cpu", action="store_true", help="run on CPU even if CUDA is available")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,116 @@
+"""
+Accuracy vs. latency of BiSeNet at reduced input resolutions.
+
+Every image is parsed at each `--sizes` resolution and the mask, restored to the original image size,
+is compared against the 512x512 mask (the service default). Reported per size: mean inference latency,
+pixel agreement with 512, mIoU over all classes and over the head classes (the ones the ID-photo
+pipeline cuts out), as a markdown table.
+
+Usage:
+    python benchmarks/bench_resolution.py --weight ./weights/resnet18.pt --input ./assets/images/ --sizes 256 384 512
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import get_files_to_process, prepare_image  # noqa: E402
+from models.bisenet import BiSeNet  # noqa: E402
+from onnx_export import HEAD_PARTS_INDICES  # noqa: E402
+from utils.metrics import confusion_matrix, mean_iou  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+NUM_CLASSES = 19
+REFERENCE_SIZE = 512
+
+
+def parse_at(model: torch.nn.Module, image: Image.Image, size: int, repeat: int):
+    """Parse `image` at `size` x `size`; returns the mask at the original size and the mean latency in ms."""
+    image_batch = prepare_image(image, (size, size))
+    model(image_batch)  # warm-up for this shape
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        labels = model(image_batch)[0].numpy()
+    latency_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+    mask = np.array(Image.fromarray(labels).resize(image.size, resample=Image.NEAREST))
+    return mask, latency_ms
+
+
+@torch.no_grad()
+def run(params: argparse.Namespace) -> List[Dict]:
+    model = BiSeNet(NUM_CLASSES, backbone_name=params.model)
+    if params.weight:
+        model.load_state_dict(torch.load(params.weight, map_location="cpu"))
+    else:
+        logger.warning("No --weight given: using randomly initialised weights, accuracy numbers are not meaningful")
+    model.eval().set_output_mode("labels")
+    torch.set_num_threads(params.threads or torch.get_num_threads())
+
+    sizes = sorted(set(params.sizes) | {REFERENCE_SIZE})
+    latencies = {size: [] for size in sizes}
+    confusions = {size: np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.int64) for size in sizes}
+
+    for file_path in get_files_to_process(params.input):
+        image = Image.open(file_path).convert("RGB")
+        masks = {}
+        for size in sizes:
+            masks[size], latency_ms = parse_at(model, image, size, params.repeat)
+            latencies[size].append(latency_ms)
+        for size in sizes:
+            confusions[size] += confusion_matrix(masks[size], masks[REFERENCE_SIZE], NUM_CLASSES)
+
+    rows = []
+    for size in sizes:
+        confusion = confusions[size]
+        rows.append({
+            "input_size": size,
+            "latency_ms": float(np.mean(latencies[size])),
+            "speedup": float(np.mean(latencies[REFERENCE_SIZE]) / np.mean(latencies[size])),
+            "pixel_agreement": float(np.trace(confusion) / confusion.sum()),
+            "miou": mean_iou(confusion),
+            "head_miou": mean_iou(confusion, HEAD_PARTS_INDICES),
+        })
+
+    logger.info(f"Accuracy vs. latency against {REFERENCE_SIZE}x{REFERENCE_SIZE} masks "
+                f"({len(latencies[REFERENCE_SIZE])} images, {torch.get_num_threads()} threads):")
+    print("| input | latency (ms) | speedup | pixel agreement | mIoU | head mIoU |")
+    print("|------:|-------------:|--------:|----------------:|-----:|----------:|")
+    for row in rows:
+        print(f"| {row['input_size']} | {row['latency_ms']:.1f} | {row['speedup']:.2f}x | "
+              f"{row['pixel_agreement']:.2%} | {row['miou']:.3f} | {row['head_miou']:.3f} |")
+
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Face parsing input resolution benchmark")
+    parser.add_argument("--model", type=str, default="resnet18", choices=["resnet18", "resnet34"], help="model name")
+    parser.add_argument("--weight", type=str, default=None, help="path to trained model, i.e resnet18/34")
+    parser.add_argument("--input", type=str, default="./assets/images/", help="path to an image or a folder of images")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 384, 512], help="input sizes, multiples of 32")
+    parser.add_argument("--repeat", type=int, default=5, help="timed forward passes per image and size")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch default)")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,143 @@
+"""
+Training throughput (samples/s) on a synthetic CelebAMask-HQ-like dataset, runnable on CPU.
+
+Compares the per-sample PIL augmentation in the DataLoader workers (TrainTransform) with the batched
+uint8 tensor augmentation after collation (BatchTrainTransform), each in float32 and with mixed precision
+(bfloat16 autocast on CPU, float16 with gradient scaling on CUDA). Every configuration runs the same
+`train_one_epoch` as train.py, with the same model initialization and data.
+
+Usage:
+    python benchmarks/bench_train.py --batch-size 4 --image-size 256 256 --steps 5 --cpu
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+import torch
+from torch.utils.data import DataLoader, Dataset
+from torch.optim.lr_scheduler import PolynomialLR
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.bisenet import BiSeNet  # noqa: E402
+from train import add_weight_decay, train_one_epoch  # noqa: E402
+from utils.loss import OhemLossWrapper  # noqa: E402
+from utils.transform import BatchTrainTransform, ToUint8Tensor, TrainTransform  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+
+class SyntheticFaces(Dataset):
+    """In-memory 512x512 images and label maps (random rectangles per class), decoded as PIL like CelebAMaskHQ."""
+
+    def __init__(self, num_samples: int, num_classes: int, transform, size: int = 512) -> None:
+        super().__init__()
+        rng = np.random.default_rng(0)
+        self.transform = transform
+        self.images, self.labels = [], []
+        for _ in range(num_samples):
+            label = np.zeros((size, size), dtype=np.uint8)
+            for class_index in range(1, num_classes):
+                x, y = rng.integers(0, size - 64, 2)
+                w, h = rng.integers(16, 128, 2)
+                label[y:y + h, x:x + w] = class_index
+            self.images.append(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+            self.labels.append(label)
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, idx: int):
+        image, label = self.transform(Image.fromarray(self.images[idx]), Image.fromarray(self.labels[idx]))
+        if not isinstance(label, torch.Tensor):
+            label = np.array(label).astype(np.int64)
+        return image, label
+
+
+def run_config(params: argparse.Namespace, device: torch.device, batch_augment: bool, amp: bool) -> float:
+    """Train `params.steps` iterations after one warm-up epoch and return samples/s."""
+    torch.manual_seed(0)
+    if batch_augment:
+        transform, augment = ToUint8Tensor(), BatchTrainTransform(image_size=params.image_size)
+    else:
+        transform, augment = TrainTransform(image_size=params.image_size), None
+    dataset = SyntheticFaces(params.batch_size * params.steps, params.num_classes, transform)
+    data_loader = DataLoader(
+        dataset,
+        batch_size=params.batch_size,
+        shuffle=True,
+        num_workers=params.num_workers,
+        pin_memory=device.type == "cuda",
+        drop_last=True,
+        persistent_workers=params.num_workers > 0,
+    )
+
+    model = BiSeNet(num_classes=params.num_classes, backbone_name=params.backbone).to(device)
+    criterion = OhemLossWrapper(
+        thresh=0.7, min_kept=params.batch_size * params.image_size[0] * params.image_size[1] // 16
+    )
+    optimizer = torch.optim.SGD(add_weight_decay(model, 5e-4), lr=1e-2, momentum=0.9, weight_decay=5e-4)
+    lr_scheduler = PolynomialLR(optimizer, total_iters=10 * params.steps, power=0.9)
+
+    amp_dtype, scaler = None, None
+    if amp:
+        amp_dtype = torch.float16 if device.type == "cuda" else torch.bfloat16
+        scaler = torch.cuda.amp.GradScaler() if device.type == "cuda" else None
+
+    def epoch(index: int) -> None:
+        train_one_epoch(model, criterion, optimizer, data_loader, lr_scheduler, device, index,
+                        print_freq=params.steps + 1, scaler=scaler, amp_dtype=amp_dtype, augment=augment)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+
+    epoch(0)  # warm-up: worker start, allocator and kernel selection
+    t0 = time.perf_counter()
+    epoch(1)
+    return len(data_loader) * params.batch_size / (time.perf_counter() - t0)
+
+
+def run(params: argparse.Namespace) -> List[Dict]:
+    device = torch.device("cuda" if torch.cuda.is_available() and not params.cpu else "cpu")
+    rows = []
+    for batch_augment in (False, True):
+        for amp in (False, True):
+            row = {
+                "augmentation": "batched tensor" if batch_augment else "per-sample PIL",
+                "precision": ("float16" if device.type == "cuda" else "bfloat16") if amp else "float32",
+                "samples_per_s": run_config(params, device, batch_augment, amp),
+            }
+            row["speedup"] = row["samples_per_s"] / (rows[0]["samples_per_s"] if rows else row["samples_per_s"])
+            rows.append(row)
+            logger.info(f"{row['augmentation']:>15s}  {row['precision']:>8s}  {row['samples_per_s']:7.2f} samples/s  "
+                        f"({row['speedup']:.2f}x, {device.type}, {params.num_workers} workers)")
+
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Training throughput benchmark")
+    parser.add_argument("--backbone", type=str, default="resnet18", help="backbone architecture")
+    parser.add_argument("--num-classes", type=int, default=19, help="number of classes")
+    parser.add_argument("--batch-size", type=int, default=4, help="batch size")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[256, 256], help="train crop size")
+    parser.add_argument("--steps", type=int, default=5, help="timed iterations per configuration")
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader workers")
+    parser.add_argument("--cpu", action="store_true", help="run on CPU even if CUDA is available")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,103 @@
+"""
+Compare the current mask restoration path against `upsample_labels` on low-resolution logits.
+
+Current path:  logits -> bilinear 512x512x19 -> argmax -> PIL NEAREST resize to the original size
+New path:      1/8-scale logits -> upsample_labels straight to the original size
+
+Reports pixel agreement with the current masks (the tolerance), agreement with an exact full-resolution
+bilinear upsample and the time of both paths for each image.
+
+Usage:
+    python benchmarks/bench_upsample.py --weight ./weights/resnet18.pt --input ./assets/images/
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+import torch
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import get_files_to_process, prepare_image  # noqa: E402
+from models.bisenet import BiSeNet, upsample_labels  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+
+def current_path(logits: torch.Tensor, input_size: int, original_size) -> np.ndarray:
+    """Mask restoration as done before: bilinear to the input size, argmax, NEAREST to the original size."""
+    full = F.interpolate(logits, (input_size, input_size), mode="bilinear", align_corners=True)
+    mask = full.argmax(dim=1)[0].numpy().astype(np.uint8)
+    return np.array(Image.fromarray(mask).resize(original_size, resample=Image.NEAREST))
+
+
+@torch.no_grad()
+def run(params: argparse.Namespace) -> List[Dict]:
+    model = BiSeNet(19, backbone_name=params.model)
+    if params.weight:
+        model.load_state_dict(torch.load(params.weight, map_location="cpu"))
+    else:
+        logger.warning("No --weight given: using randomly initialised weights, agreement numbers are not meaningful")
+    model.eval().set_output_mode("low_res_logits")
+
+    rows = []
+    for file_path in get_files_to_process(params.input):
+        image = Image.open(file_path).convert("RGB")
+        logits = model(prepare_image(image, (params.input_size, params.input_size)))
+
+        for scale in params.scales:
+            width, height = int(image.size[0] * scale), int(image.size[1] * scale)
+
+            t0 = time.perf_counter()
+            reference = current_path(logits, params.input_size, (width, height))
+            t1 = time.perf_counter()
+            restored = upsample_labels(logits, (height, width))[0].numpy()
+            t2 = time.perf_counter()
+
+            exact = F.interpolate(logits, (height, width), mode="bilinear", align_corners=True).argmax(dim=1)[0].numpy()
+            row = {
+                "image": os.path.basename(file_path),
+                "size": f"{width}x{height}",
+                "agreement_current": float((restored == reference).mean()),
+                "agreement_exact": float((restored == exact).mean()),
+                "current_ms": (t1 - t0) * 1000,
+                "upsample_labels_ms": (t2 - t1) * 1000,
+            }
+            rows.append(row)
+            logger.info(
+                f"{row['image']:>10s} {row['size']:>11s}  agree(current) {row['agreement_current']:.4%}  "
+                f"agree(exact) {row['agreement_exact']:.4%}  current {row['current_ms']:7.1f} ms  "
+                f"new {row['upsample_labels_ms']:7.1f} ms"
+            )
+
+    if rows:
+        logger.info(f"Min agreement with current masks: {min(r['agreement_current'] for r in rows):.4%}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Low-resolution logits upsampling benchmark")
+    parser.add_argument("--model", type=str, default="resnet18", choices=["resnet18", "resnet34"], help="model name")
+    parser.add_argument("--weight", type=str, default=None, help="path to trained model, i.e resnet18/34")
+    parser.add_argument("--input", type=str, default="./assets/images/", help="path to an image or a folder of images")
+    parser.add_argument("--input-size", type=int, default=512, help="model input resolution")
+    parser.add_argument(
+        "--scales",
+        type=float,
+        nargs="+",
+        default=[1.0, 4.0],
+        help="target size as a multiple of the image size (4.0 emulates a 12 MP upload of a 3 MP image)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
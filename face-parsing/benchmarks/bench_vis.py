@@ -0,0 +1,109 @@
+"""
+Benchmark `vis_parsing_maps` (palette lookup) against the previous per-class `np.where` implementation.
+
+Both are run on the same image and a synthetic label map covering all 19 classes at several resolutions;
+the outputs must be identical.
+
+Usage:
+    python benchmarks/bench_vis.py --input ./assets/images/1.jpg --sizes 512 1024 4032
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.common import COLOR_LIST, palette_mask, vis_parsing_maps  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+
+def vis_parsing_maps_loop(image, segmentation_mask):
+    """The previous implementation: float64 color image filled class by class with np.where."""
+    image = np.array(image).copy().astype(np.uint8)
+    segmentation_mask = segmentation_mask.copy().astype(np.uint8)
+    segmentation_mask_color = np.zeros((segmentation_mask.shape[0], segmentation_mask.shape[1], 3))
+    for class_index in range(1, np.max(segmentation_mask) + 1):
+        class_pixels = np.where(segmentation_mask == class_index)
+        segmentation_mask_color[class_pixels[0], class_pixels[1], :] = COLOR_LIST[class_index]
+    segmentation_mask_color = segmentation_mask_color.astype(np.uint8)
+    bgr_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return cv2.addWeighted(bgr_image, 0.6, segmentation_mask_color, 0.4, 0)
+
+
+def synthetic_mask(width: int, height: int) -> np.ndarray:
+    """Overlapping ellipses, one per class, so that every class covers a region with long boundaries."""
+    small = np.zeros((512, 512), dtype=np.uint8)
+    for label in range(1, len(COLOR_LIST)):
+        angle = 2 * np.pi * label / len(COLOR_LIST)
+        center = (int(256 + 150 * np.cos(angle)), int(256 + 150 * np.sin(angle)))
+        cv2.ellipse(small, center, (60, 90), np.degrees(angle), 0, 360, label, -1)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_NEAREST)
+
+
+def time_ms(fn: Callable, repeat: int) -> float:
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def run(params: argparse.Namespace) -> List[Dict]:
+    source = Image.open(params.input).convert("RGB")
+    rows = []
+    for size in params.sizes:
+        # longest side = size, keeping the aspect ratio of the input image
+        scale = size / max(source.size)
+        width, height = round(source.width * scale), round(source.height * scale)
+        image = np.array(source.resize((width, height), resample=Image.BILINEAR))
+        mask = synthetic_mask(width, height)
+
+        reference = vis_parsing_maps_loop(image, mask)
+        if not np.array_equal(vis_parsing_maps(image, mask), reference):
+            raise AssertionError(f"{width}x{height}: palette output differs from the per-class implementation")
+        scratch = image.copy()
+        if not np.array_equal(vis_parsing_maps(scratch, mask, inplace=True), reference):
+            raise AssertionError(f"{width}x{height}: in-place output differs from the per-class implementation")
+
+        row = {
+            "size": f"{width}x{height}",
+            "loop_ms": time_ms(lambda: vis_parsing_maps_loop(image, mask), params.repeat),
+            "palette_ms": time_ms(lambda: vis_parsing_maps(image, mask), params.repeat),
+            # the writer threads blend into a private copy of the decoded image
+            "palette_inplace_ms": time_ms(lambda: vis_parsing_maps(scratch, mask, inplace=True), params.repeat),
+            "palette_png_ms": time_ms(lambda: palette_mask(mask), params.repeat),
+        }
+        row["speedup"] = row["loop_ms"] / row["palette_inplace_ms"]
+        rows.append(row)
+        logger.info(f"{row['size']:>10s}  per-class loop {row['loop_ms']:8.2f} ms  palette {row['palette_ms']:7.2f} ms  "
+                    f"in-place {row['palette_inplace_ms']:7.2f} ms  ({row['speedup']:.1f}x)  "
+                    f"P-mode mask {row['palette_png_ms']:5.2f} ms")
+
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Segmentation visualization benchmark")
+    parser.add_argument("--input", type=str, default="./assets/images/1.jpg", help="path to an image")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 4032], help="longest image side")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per size")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
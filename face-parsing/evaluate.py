@@ -0,0 +1,307 @@
+"""
+Evaluate face parsing models on a folder of images and ground-truth label maps.
+
+Reports per-class IoU (head classes, the ones production keeps via HEAD_PARTS_INDICES, are marked), mIoU,
+head-class mIoU and pixel accuracy, together with throughput (images/s) and peak memory. Every backend runs
+in its own spawned process so that its peak RSS is its own:
+    torch  - eager BiSeNet (labels output mode)
+    fused  - BiSeNet with batch norms folded and channels-last convolutions (BiSeNet.fuse_for_inference)
+    onnx   - onnxruntime session of an exported model (FP32 or INT8, see onnx_export.py / quantize.py)
+
+Labels are CelebAMask-HQ style: <image stem>.png uint8 maps with values 0..18 next to the images
+(see utils/prepare_labels.py). Predictions are resized (nearest) to the label resolution before scoring.
+
+Usage:
+    # resnet18 vs resnet34, eager and fused
+    python evaluate.py --model resnet18 --weight ./weights/resnet18.pt --images ./val/images --labels ./val/labels
+    python evaluate.py --model resnet34 --weight ./weights/resnet34.pt --images ./val/images --labels ./val/labels
+    # torch vs FP32 ONNX vs INT8 ONNX
+    python evaluate.py --weight ./weights/resnet18.pt --backends torch onnx \
+        --onnx ./weights/resnet18_labels.onnx ./weights/resnet18_labels_int8.onnx --images ... --labels ...
+    # smoke test on a small synthetic folder
+    python evaluate.py --weight ./weights/resnet18.pt --synthetic 8
+"""
+import os
+import time
+import json
+import argparse
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+import torch
+
+from inference import load_model, prepare_image
+from onnx_export import HEAD_PARTS_INDICES
+from onnx_inference import load_onnx_model, prepare_image as prepare_onnx_image
+from utils.metrics import class_iou, confusion_matrix, mean_iou, peak_rss_mb
+from utils.prepare_labels import attributes
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+NUM_CLASSES = 19
+CLASS_NAMES = ["background"] + attributes
+BACKENDS = ("torch", "fused", "onnx")
+
+
+def find_pairs(images_dir: str, labels_dir: str) -> List[Tuple[str, str]]:
+    """
+    Match every image in `images_dir` with its `<stem>.png` label map in `labels_dir`.
+
+    Args:
+        images_dir: Folder of images
+        labels_dir: Folder of label maps
+
+    Returns:
+        List[Tuple[str, str]]: Sorted (image path, label path) pairs; images without a label are skipped
+    """
+    image_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+    pairs, missing = [], 0
+    for name in sorted(os.listdir(images_dir)):
+        if not name.lower().endswith(image_extensions):
+            continue
+        label_path = os.path.join(labels_dir, os.path.splitext(name)[0] + ".png")
+        if os.path.isfile(label_path):
+            pairs.append((os.path.join(images_dir, name), label_path))
+        else:
+            missing += 1
+    if missing:
+        logger.warning(f"{missing} images in {images_dir} have no label map in {labels_dir}, skipped")
+    return pairs
+
+
+def make_synthetic_folder(root: str, num_images: int, size: int = 512) -> Tuple[str, str]:
+    """
+    Write `num_images` synthetic image / label pairs (colored blobs for every class) under `root`.
+
+    Scores on this data only check that the pipeline runs end to end; they say nothing about accuracy.
+
+    Returns:
+        Tuple[str, str]: Images and labels folders
+    """
+    images_dir, labels_dir = os.path.join(root, "images"), os.path.join(root, "labels")
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(labels_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 256, (NUM_CLASSES, 3), dtype=np.uint8)
+    yy, xx = np.mgrid[:size, :size]
+    for idx in range(num_images):
+        label = np.zeros((size, size), dtype=np.uint8)
+        for class_index in range(1, NUM_CLASSES):
+            cy, cx = rng.integers(0, size, 2)
+            ry, rx = rng.integers(size // 32, size // 6, 2)
+            label[((yy - cy) / ry) ** 2 + ((xx - cx) / rx) ** 2 <= 1] = class_index
+        noise = rng.integers(-20, 21, (size, size, 3))
+        image = np.clip(colors[label].astype(np.int64) + noise, 0, 255).astype(np.uint8)
+        Image.fromarray(image).save(os.path.join(images_dir, f"{idx}.jpg"), quality=95)
+        Image.fromarray(label).save(os.path.join(labels_dir, f"{idx}.png"))
+    return images_dir, labels_dir
+
+
+def build_predictor(backend: str, params: argparse.Namespace, model_path: str) -> Tuple[Callable, Callable]:
+    """
+    Load one backend.
+
+    Returns:
+        Tuple[Callable, Callable]: (preprocess: PIL image -> (1, 3, H, W) input,
+            predict: stacked inputs -> (N, H, W) uint8 labels)
+    """
+    input_size = (params.input_size, params.input_size)
+    if backend == "onnx":
+        session = load_onnx_model(model_path)
+        input_name = session.get_inputs()[0].name
+
+        def predict(batch: np.ndarray) -> np.ndarray:
+            output = session.run(None, {input_name: batch})[0]
+            # labels graphs output uint8 (N, H, W), logits graphs (N, C, H, W)
+            return output if output.dtype == np.uint8 else output.argmax(1).astype(np.uint8)
+
+        return partial(prepare_onnx_image, input_size=input_size), predict
+
+    device = torch.device("cuda" if torch.cuda.is_available() and not params.cpu else "cpu")
+    model = load_model(params.model, NUM_CLASSES, model_path, device)
+    if backend == "fused":
+        model = model.fuse_for_inference(compile=params.compile)
+
+    @torch.no_grad()
+    def predict(batch: torch.Tensor) -> np.ndarray:
+        return model(batch.to(device)).cpu().numpy()
+
+    return partial(prepare_image, input_size=input_size), predict
+
+
+def evaluate_backend(backend: str, model_path: str, pairs: List[Tuple[str, str]], params: argparse.Namespace) -> Dict:
+    """
+    Score one backend on `pairs`; meant to run in a fresh (spawned) process so that the peak RSS is its own.
+
+    Returns:
+        Dict: confusion matrix, model-only and end-to-end images/s, peak RSS (and peak CUDA memory)
+    """
+    preprocess, predict = build_predictor(backend, params, model_path)
+
+    confusion = np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.int64)
+    model_time, start_time = 0.0, time.perf_counter()
+    for batch_start in range(0, len(pairs), params.batch_size):
+        batch_pairs = pairs[batch_start:batch_start + params.batch_size]
+        inputs = [preprocess(Image.open(image_path).convert("RGB")) for image_path, _ in batch_pairs]
+        batch = torch.cat(inputs) if isinstance(inputs[0], torch.Tensor) else np.concatenate(inputs)
+        if batch_start == 0:
+            t0 = time.perf_counter()
+            predict(batch)  # warm-up, not timed
+            start_time += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        masks = predict(batch)
+        model_time += time.perf_counter() - t0
+
+        for mask, (_, label_path) in zip(masks, batch_pairs):
+            target = np.array(Image.open(label_path))
+            if mask.shape != target.shape:
+                mask = np.array(Image.fromarray(mask).resize(target.shape[::-1], resample=Image.NEAREST))
+            confusion += confusion_matrix(mask, target, NUM_CLASSES)
+    total_time = time.perf_counter() - start_time
+
+    result = {
+        "confusion": confusion,
+        "images_per_sec": len(pairs) / model_time,
+        "end_to_end_images_per_sec": len(pairs) / total_time,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if backend != "onnx" and torch.cuda.is_available() and not params.cpu:
+        result["peak_cuda_mb"] = torch.cuda.max_memory_allocated() / 2**20
+    return result
+
+
+def summarize(name: str, result: Dict) -> Dict:
+    """Metrics of one evaluated model as a JSON-serializable row."""
+    confusion = result["confusion"]
+    iou = class_iou(confusion)
+    row = {
+        "name": name,
+        "miou": mean_iou(confusion),
+        "head_miou": mean_iou(confusion, HEAD_PARTS_INDICES),
+        "pixel_accuracy": float(np.trace(confusion) / max(confusion.sum(), 1)),
+        "class_iou": {CLASS_NAMES[i]: (None if np.isnan(v) else float(v)) for i, v in enumerate(iou)},
+    }
+    row.update({key: value for key, value in result.items() if key != "confusion"})
+    return row
+
+
+def print_report(rows: List[Dict]) -> None:
+    """Markdown tables: per-class IoU (head classes marked with *) and the summary per model."""
+    print("| class | " + " | ".join(row["name"] for row in rows) + " |")
+    print("|:------|" + "------:|" * len(rows))
+    for class_index, class_name in enumerate(CLASS_NAMES):
+        marker = "*" if class_index in HEAD_PARTS_INDICES else ""
+        values = [row["class_iou"][class_name] for row in rows]
+        print(f"| {marker}{class_name}{marker} | "
+              + " | ".join("-" if v is None else f"{v:.4f}" for v in values) + " |")
+    print()
+    print("| model | mIoU | head mIoU | pixel acc. | images/s | end-to-end images/s | peak RSS (MB) |")
+    print("|:------|-----:|----------:|-----------:|---------:|--------------------:|--------------:|")
+    for row in rows:
+        print(f"| {row['name']} | {row['miou']:.4f} | {row['head_miou']:.4f} | {row['pixel_accuracy']:.2%} | "
+              f"{row['images_per_sec']:.2f} | {row['end_to_end_images_per_sec']:.2f} | {row['peak_rss_mb']:.0f} |")
+
+
+def evaluate(params: argparse.Namespace) -> List[Dict]:
+    """
+    Evaluate every requested backend and print / save the report.
+
+    Args:
+        params: Configuration namespace, see `parse_args`
+
+    Returns:
+        List[Dict]: One summary row per evaluated model
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if params.synthetic:
+            images_dir, labels_dir = make_synthetic_folder(tmp_dir, params.synthetic)
+            logger.info(f"Generated {params.synthetic} synthetic images: scores only check the pipeline")
+        else:
+            images_dir, labels_dir = params.images, params.labels
+        pairs = find_pairs(images_dir, labels_dir)
+        if params.max_images:
+            pairs = pairs[:params.max_images]
+        if not pairs:
+            raise ValueError(f"No image / label pairs found in {images_dir} and {labels_dir}")
+
+        runs = []
+        for backend in params.backends:
+            if backend == "onnx":
+                runs += [(f"onnx:{os.path.basename(path)}", backend, path) for path in params.onnx]
+            else:
+                runs.append((f"{backend}:{params.model}", backend, params.weight))
+
+        logger.info(f"Evaluating {len(runs)} model(s) on {len(pairs)} images at {params.input_size}x{params.input_size}")
+        rows = []
+        for name, backend, model_path in runs:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                result = executor.submit(evaluate_backend, backend, model_path, pairs, params).result()
+            rows.append(summarize(name, result))
+            logger.info(f"{name}: mIoU {rows[-1]['miou']:.4f}, head mIoU {rows[-1]['head_miou']:.4f}, "
+                        f"{result['images_per_sec']:.2f} images/s, peak RSS {result['peak_rss_mb']:.0f} MB")
+
+    print_report(rows)
+    if params.output:
+        with open(params.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        logger.info(f"Results saved to {params.output}")
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse and validate command line arguments.
+
+    Returns:
+        argparse.Namespace: Validated command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Face parsing evaluation: per-class IoU, throughput, memory")
+    parser.add_argument("--model", type=str, default="resnet18", choices=["resnet18", "resnet34"], help="model name")
+    parser.add_argument("--weight", type=str, default="./weights/resnet18.pt",
+                        help="path to trained model, i.e resnet18/34 (torch and fused backends)")
+    parser.add_argument("--onnx", type=str, nargs="+", default=[],
+                        help="ONNX model(s) for the onnx backend, e.g. FP32 and INT8 exports")
+    parser.add_argument("--backends", type=str, nargs="+", default=["torch"], choices=BACKENDS,
+                        help="backends to evaluate")
+    parser.add_argument("--images", type=str, default=None, help="folder of evaluation images")
+    parser.add_argument("--labels", type=str, default=None, help="folder of ground-truth label maps (<image stem>.png)")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="evaluate on this many generated images instead of --images/--labels")
+    parser.add_argument("--max-images", type=int, default=None, help="evaluate at most this many images")
+    parser.add_argument("--input-size", type=int, default=512, help="model input resolution, a multiple of 32")
+    parser.add_argument("--batch-size", type=int, default=8, help="images per forward pass")
+    parser.add_argument("--compile", type=str, default=None, choices=["torchscript", "inductor"],
+                        help="compile the fused model (fused backend)")
+    parser.add_argument("--cpu", action="store_true", help="run torch backends on CPU even if CUDA is available")
+    parser.add_argument("--output", type=str, default=None, help="optional JSON file for the results")
+
+    args = parser.parse_args()
+
+    # Validate arguments
+    if not args.synthetic and not (args.images and args.labels):
+        parser.error("either --images and --labels, or --synthetic is required")
+    if "onnx" in args.backends and not args.onnx:
+        parser.error("the onnx backend needs --onnx")
+    if args.input_size % 32 != 0:
+        parser.error("--input-size must be a multiple of 32")
+
+    return args
+
+
+def main() -> None:
+    """Main entry point of the script."""
+    evaluate(parse_args())
+
+
+if __name__ == "__main__":
+    main()
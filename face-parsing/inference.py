@@ -1,10 +1,9 @@
 import os
 import argparse
 import logging
-from typing import List, Tuple, Optional
-from pathlib import Path
+from functools import partial
+from typing import List, Tuple
 
-import numpy as np
 from PIL import Image
 from tqdm import tqdm
 
@@ -12,7 +11,7 @@ import torch
 import torchvision.transforms as transforms
 
 from models.bisenet import BiSeNet
-from utils.common import vis_parsing_maps
+from utils.batch_inference import ResultWriter, create_loader, output_paths, save_prediction
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
@@ -68,6 +67,8 @@ def load_model(model_name: str, num_classes: int, weight_path: str, device: torc
         raise ValueError(f"Weights not found from given path ({weight_path})")
 
     model.eval()
+    # Skip the auxiliary heads and run the argmax on-device: forward() returns a uint8 (N, H, W) label map
+    model.set_output_mode("labels")
     return model
 
 
@@ -120,50 +121,28 @@ def inference(params: argparse.Namespace) -> None:
     files_to_process = get_files_to_process(params.input)
     logger.info(f"Found {len(files_to_process)} files to process")
 
-    # Process each file
-    for file_path in tqdm(files_to_process, desc="Processing images"):
-        filename = os.path.basename(file_path)
-        root_ext_pair = os.path.splitext(filename)
-        save_raw_path = os.path.join(output_path, root_ext_pair[0] + "_raw.png")
-        save_path = os.path.join(output_path, filename)
-
-        try:
-            # Load and process the image
-            image = Image.open(file_path).convert("RGB")
-
-            # Store original image resolution
-            original_size = image.size  # (width, height)
+    # Decoding and preprocessing run in DataLoader workers, saving in a writer thread pool,
+    # so the main thread only runs batched forward passes
+    loader = create_loader(
+        files_to_process,
+        partial(prepare_image, input_size=(params.input_size, params.input_size)),
+        batch_size=params.batch_size,
+        num_workers=params.num_workers,
+    )
 
-            # Prepare image for inference
-            image_batch = prepare_image(image).to(device)
+    with ResultWriter(num_threads=params.num_writers) as writer:
+        for image_batch, images, paths in tqdm(loader, desc="Processing batches"):
+            if image_batch is None:
+                continue
 
             # Run inference
-            output = model(image_batch)[0]  # feat_out, feat_out16, feat_out32 -> use feat_out for inference only
-            predicted_mask = output.squeeze(0).cpu().numpy().argmax(0)
-
-            # Convert mask to PIL Image for resizing
-            mask_pil = Image.fromarray(predicted_mask.astype(np.uint8))
-
-            # Resize mask back to original image resolution
-            restored_mask = mask_pil.resize(original_size, resample=Image.NEAREST)
-
-            # Save the raw mask
-            mask_pil.save(save_raw_path)
-
-            # Convert back to numpy array
-            predicted_mask = np.array(restored_mask)
-
-            # Visualize and save the results
-            vis_parsing_maps(
-                image,
-                predicted_mask,
-                save_image=True,
-                save_path=save_path,
-            )
+            predicted_masks = model(image_batch.to(device)).cpu().numpy()  # uint8 label maps, see BiSeNet.set_output_mode
 
-        except Exception as e:
-            logger.error(f"Error processing {file_path}: {e}")
-            continue
+            # Resize, visualize and save the results in the writer threads
+            for image, predicted_mask, file_path in zip(images, predicted_masks, paths):
+                writer.submit(
+                    save_prediction, image.numpy(), predicted_mask, *output_paths(file_path, output_path), params.vis_mode
+                )
 
     logger.info(f"Processing complete. Results saved to {output_path}")
 
@@ -191,10 +170,34 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument("--input", type=str, default="./assets/images/", help="path to an image or a folder of images")
     parser.add_argument("--output", type=str, default="./assets/results", help="path to save model outputs")
+    parser.add_argument("--batch-size", type=int, default=8, help="images per forward pass")
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=min(4, os.cpu_count() or 1),
+        help="processes decoding and preprocessing images, 0 to decode in the main process"
+    )
+    parser.add_argument("--num-writers", type=int, default=4, help="threads saving masks and visualizations")
+    parser.add_argument(
+        "--vis-mode",
+        type=str,
+        default="blend",
+        choices=["blend", "palette"],
+        help="blend: raw mask + blended visualization, palette: only the raw mask as a colored palette PNG"
+    )
+    parser.add_argument(
+        "--input-size",
+        type=int,
+        default=512,
+        help="square model input resolution, a multiple of 32 (e.g. 256 or 384 for faster, coarser masks)"
+    )
 
     args = parser.parse_args()
 
     # Validate arguments
+    if args.input_size % 32 != 0:
+        raise ValueError(f"Input size must be a multiple of 32, got {args.input_size}")
+
     if not os.path.exists(args.input):
         raise ValueError(f"Input path does not exist: {args.input}")
 
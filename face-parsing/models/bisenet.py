@@ -9,8 +9,9 @@ import torch
 from torch import nn, Tensor
 import torch.nn.functional as F
 
+from models.fusion import compile_for_inference, fold_conv_bn, fold_sequential_conv_bn
 from models.resnet import resnet18, resnet34
-from typing import Union, Optional, Tuple
+from typing import Union, Optional, Sequence, Tuple
 
 
 class ConvBNReLU(nn.Module):
@@ -91,10 +92,9 @@ class AttentionRefinementModule(nn.Module):
 
     def forward(self, x: Tensor) -> Tensor:
         feat = self.conv_block(x)
-        
-        feat_shape = [int(t) for t in feat.size()[2:]]
-        pool = F.avg_pool2d(feat, feat_shape)
-        # pool = F.avg_pool2d(feat, feat.size()[2:]) # gives error when converting to onnx due to dynamic size
+
+        # global pooling without static shapes, exports to ONNX GlobalAveragePool (any input resolution)
+        pool = F.adaptive_avg_pool2d(feat, 1)
 
         attention = self.attention(pool)
         out = torch.mul(feat, attention)
@@ -127,10 +127,7 @@ class ContextPath(nn.Module):
         h16, w16 = feat16.size()[2:]
         h32, w32 = feat32.size()[2:]
 
-        feat32_shape = [int(t) for t in feat32.size()[2:]]
-        avg = F.avg_pool2d(feat32, feat32_shape)
-        # avg = F.avg_pool2d(feat32, feat32.size()[2:]) # gives error when converting to onnx due to dynamic size
-        
+        avg = F.adaptive_avg_pool2d(feat32, 1)
         avg = self.conv_avg(avg)
         avg_up = F.interpolate(avg, (h32, w32), mode="nearest")
 
@@ -177,11 +174,8 @@ class FeatureFusionModule(nn.Module):
     def forward(self, fsp: Tensor, fcp: Tensor) -> Tensor:
         fcat = torch.cat([fsp, fcp], dim=1)
         feat = self.conv_block(fcat)
-        
-        feat_shape = [int(t) for t in feat.size()[2:]]
-        attention = F.avg_pool2d(feat, feat_shape)
-        # attention = F.avg_pool2d(feat, feat.size()[2:]) # gives error when converting to onnx due to dynamic size
-        
+
+        attention = F.adaptive_avg_pool2d(feat, 1)
         attention = self.conv1(attention)
         attention = self.relu(attention)
         attention = self.conv2(attention)
@@ -192,8 +186,11 @@ class FeatureFusionModule(nn.Module):
 
 
 class BiSeNet(nn.Module):
+    OUTPUT_MODES = ("logits", "labels", "head_mask", "low_res_logits")
+
     def __init__(self, num_classes, backbone_name="resnet18"):
         super().__init__()
+        self.num_classes = num_classes
         self.fpn = ContextPath(backbone_name=backbone_name)
         self.ffm = FeatureFusionModule(in_channels=256, out_channels=256)
 
@@ -201,12 +198,98 @@ class BiSeNet(nn.Module):
         self.conv_out16 = BiSeNetOutput(in_channels=128, mid_channels=64, num_classes=num_classes)
         self.conv_out32 = BiSeNetOutput(in_channels=128, mid_channels=64, num_classes=num_classes)
 
+        self.output_mode: Optional[str] = None
+        self.channels_last = False
+        # label -> {0, 255} lookup table for the "head_mask" mode, not part of the checkpoint
+        self.register_buffer("head_lut", torch.zeros(num_classes, dtype=torch.uint8), persistent=False)
+
+    def set_output_mode(self, mode: Optional[str] = None, head_classes: Optional[Sequence[int]] = None) -> "BiSeNet":
+        """
+        Select what forward() returns.
+
+        Args:
+            mode: None for training (main and auxiliary logits at input resolution),
+                "logits" for the main head only, "labels" for a uint8 (N, H, W) label map,
+                "head_mask" for a uint8 (N, H, W) {0, 255} mask of `head_classes`,
+                "low_res_logits" for the main head logits at 1/8 input resolution (see `upsample_labels`).
+                Every mode except None skips the auxiliary heads; "labels" and "head_mask" run the argmax
+                in the graph, so only H*W bytes per image leave the device.
+            head_classes: Class indices that make up the mask in "head_mask" mode
+
+        Returns:
+            BiSeNet: self, for chaining
+        """
+        if mode is not None and mode not in self.OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode '{mode}', available: {self.OUTPUT_MODES}")
+        if mode == "head_mask":
+            if not head_classes:
+                raise ValueError("head_classes are required for the 'head_mask' output mode")
+            self.head_lut.zero_()
+            self.head_lut[list(head_classes)] = 255
+        self.output_mode = mode
+        return self
+
+    def fuse_for_inference(
+            self,
+            channels_last: bool = True,
+            compile: Optional[str] = None,
+            example_input: Optional[Tensor] = None,
+    ) -> nn.Module:
+        """
+        Build the inference graph: fold every BatchNorm into its convolution, switch to channels-last
+        memory format and optionally compile the model.
+
+        Call it after `load_state_dict` and `set_output_mode`: the folded model can no longer load a
+        regular checkpoint, and a TorchScript graph is traced for the current output mode.
+
+        Args:
+            channels_last: Run the convolutions in NHWC layout (inputs are converted in forward)
+            compile: None for eager, "torchscript" (trace + freeze + optimize_for_inference, which also
+                fuses Conv -> ReLU) or "inductor" (torch.compile)
+            example_input: Input used to trace / warm up the compiled graph, defaults to 1x3x512x512
+
+        Returns:
+            nn.Module: self when compile is None, otherwise the compiled module
+        """
+        self.eval()
+        self.fpn.backbone.fuse_for_inference(channels_last=False)
+        for module in self.modules():
+            if isinstance(module, ConvBNReLU):
+                fold_conv_bn(module, "conv", "norm")
+        fold_sequential_conv_bn(self)  # attention branch of the refinement modules
+
+        self.channels_last = channels_last
+        if channels_last:
+            self.to(memory_format=torch.channels_last)
+
+        if example_input is None:
+            example_input = torch.randn(1, 3, 512, 512, device=self.head_lut.device)
+        return compile_for_inference(self, compile, example_input)
+
+    def _inference_output(self, feat_out: Tensor, size: Tuple[int, int]) -> Tensor:
+        if self.output_mode == "low_res_logits":
+            return feat_out
+
+        feat_out = F.interpolate(feat_out, size, mode="bilinear", align_corners=True)
+        if self.output_mode == "logits":
+            return feat_out
+
+        labels = feat_out.argmax(dim=1)
+        if self.output_mode == "head_mask":
+            return self.head_lut[labels]
+        return labels.to(torch.uint8)
+
     def forward(self, x):
         h, w = x.size()[2:]
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
         feat_res8, feat_cp8, feat_cp16 = self.fpn(x)  # here return res3b1 feature
         feat_fuse = self.ffm(feat_res8, feat_cp8)
 
         feat_out = self.conv_out(feat_fuse)
+        if self.output_mode is not None:
+            return self._inference_output(feat_out, (h, w))
+
         feat_out16 = self.conv_out16(feat_cp8)
         feat_out32 = self.conv_out32(feat_cp16)
 
@@ -215,3 +298,48 @@ class BiSeNet(nn.Module):
         feat_out32 = F.interpolate(feat_out32, (h, w), mode="bilinear", align_corners=True)
 
         return feat_out, feat_out16, feat_out32
+
+
+def upsample_labels(logits: Tensor, size: Tuple[int, int]) -> Tensor:
+    """
+    Turn low-resolution logits into a uint8 label map of the target size in a single step.
+
+    The argmax runs at low resolution. A bilinear sample whose four corner pixels share the same
+    argmax keeps that label (it is a convex combination of the corners), so only output pixels in
+    cells whose corners disagree - a one-cell band around class boundaries - get their logits
+    bilinearly sampled and re-argmaxed. The result equals argmax of a full bilinear upsample
+    (align_corners=True, as in BiSeNet.forward) without ever building the C x H x W logits.
+
+    Args:
+        logits: (N, C, h, w) logits, e.g. from the "low_res_logits" output mode
+        size: Target (height, width), e.g. the original image size
+
+    Returns:
+        Tensor: uint8 label map of shape (N, height, width)
+    """
+    n, _, h, w = logits.shape
+    out_h, out_w = size
+    labels = logits.argmax(dim=1).to(torch.uint8)
+
+    # cells whose right / lower / diagonal corner has a different label
+    right = torch.cat([labels[:, :, 1:], labels[:, :, -1:]], dim=2)
+    down = torch.cat([labels[:, 1:], labels[:, -1:]], dim=1)
+    diagonal = torch.cat([right[:, 1:], right[:, -1:]], dim=1)
+    boundary = (labels != right) | (labels != down) | (labels != diagonal)
+
+    # source coordinates of every output row / column (align_corners=True) and their top-left cell
+    ys = torch.linspace(0, h - 1, out_h, device=logits.device)
+    xs = torch.linspace(0, w - 1, out_w, device=logits.device)
+    iy, ix = ys.floor().long().clamp_(max=h - 1), xs.floor().long().clamp_(max=w - 1)
+    output = labels.index_select(1, iy).index_select(2, ix)
+    refine = boundary.index_select(1, iy).index_select(2, ix)
+
+    for i in range(n):
+        py, px = refine[i].nonzero(as_tuple=True)
+        if py.numel() == 0:
+            continue
+        grid = torch.stack([xs[px] * (2 / max(w - 1, 1)) - 1, ys[py] * (2 / max(h - 1, 1)) - 1], dim=-1)
+        sampled = F.grid_sample(logits[i:i + 1], grid.view(1, 1, -1, 2).to(logits.dtype),
+                                mode="bilinear", align_corners=True)
+        output[i, py, px] = sampled[0, :, 0].max(dim=0).indices.to(torch.uint8)
+    return output
@@ -0,0 +1,65 @@
+from typing import Optional
+
+import torch
+from torch import nn, Tensor
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+COMPILE_BACKENDS = ("torchscript", "inductor")
+
+
+def fold_conv_bn(parent: nn.Module, conv_name: str, bn_name: str) -> None:
+    """
+    Fold `parent.<bn_name>` into `parent.<conv_name>` and replace the BatchNorm with an identity.
+
+    Args:
+        parent: Module that owns both layers
+        conv_name: Attribute (or nn.Sequential index) of the convolution
+        bn_name: Attribute (or nn.Sequential index) of the BatchNorm following it
+    """
+    conv, bn = getattr(parent, conv_name), getattr(parent, bn_name)
+    if not isinstance(bn, nn.BatchNorm2d):
+        return  # already folded
+    setattr(parent, conv_name, fuse_conv_bn_eval(conv, bn))
+    setattr(parent, bn_name, nn.Identity())
+
+
+def fold_sequential_conv_bn(module: nn.Module) -> None:
+    """Fold every Conv2d -> BatchNorm2d pair that sits back to back inside an nn.Sequential below `module`."""
+    for seq in module.modules():
+        if not isinstance(seq, nn.Sequential):
+            continue
+        names = list(seq._modules)
+        for conv_name, bn_name in zip(names, names[1:]):
+            if isinstance(seq._modules[conv_name], nn.Conv2d) and isinstance(seq._modules[bn_name], nn.BatchNorm2d):
+                fold_conv_bn(seq, conv_name, bn_name)
+
+
+def compile_for_inference(model: nn.Module, backend: Optional[str], example_input: Tensor) -> nn.Module:
+    """
+    Optionally compile a folded model.
+
+    "torchscript" traces the model, freezes it and runs `torch.jit.optimize_for_inference`, which lets
+    oneDNN fuse the remaining Conv -> ReLU / Conv -> Add -> ReLU chains on CPU. "inductor" wraps the model
+    in `torch.compile`, compiled lazily on the first call (needs a working C++ toolchain on CPU).
+
+    Args:
+        model: Folded model in eval mode
+        backend: None (eager), "torchscript" or "inductor"
+        example_input: Input used for tracing and warm-up
+
+    Returns:
+        nn.Module: The eager model, a frozen ScriptModule or a compiled module
+    """
+    if backend is None:
+        return model
+    if backend not in COMPILE_BACKENDS:
+        raise ValueError(f"Unknown compile backend '{backend}', available: {COMPILE_BACKENDS}")
+
+    if backend == "torchscript":
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example_input, check_trace=False)
+            scripted = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+            scripted(example_input)  # warm-up: run the profiling executor once
+        return scripted
+    return torch.compile(model, dynamic=True)
@@ -1,7 +1,10 @@
+import torch
 from torch import nn, Tensor
 from torchvision.models import ResNet18_Weights, ResNet34_Weights
 from typing import Any, Callable, List, Optional, Type, Tuple
 
+from models.fusion import fold_conv_bn, fold_sequential_conv_bn
+
 
 def conv3x3(in_channels: int, out_channels: int, stride: int = 1, groups: int = 1, dilation: int = 1) -> nn.Conv2d:
     """3x3 convolution with padding"""
@@ -70,6 +73,12 @@ class BasicBlock(nn.Module):
 
         return out
 
+    def fold_batchnorm(self) -> None:
+        fold_conv_bn(self, "conv1", "bn1")
+        fold_conv_bn(self, "conv2", "bn2")
+        if self.downsample is not None:
+            fold_sequential_conv_bn(self.downsample)
+
 
 class ResNet(nn.Module):
     def __init__(
@@ -166,6 +175,29 @@ class ResNet(nn.Module):
 
         return nn.Sequential(*layers)
 
+    def fuse_for_inference(self, channels_last: bool = True) -> "ResNet":
+        """
+        Fold every BatchNorm into the preceding convolution and optionally switch to channels-last.
+
+        The model is put in eval mode; the folded BatchNorms become nn.Identity, so the result can no
+        longer be trained or loaded from a regular checkpoint.
+
+        Args:
+            channels_last: Convert the conv weights to torch.channels_last (NHWC), the layout oneDNN
+                prefers on CPU
+
+        Returns:
+            ResNet: self, for chaining
+        """
+        self.eval()
+        fold_conv_bn(self, "conv1", "bn1")
+        for block in self.modules():
+            if isinstance(block, BasicBlock):
+                block.fold_batchnorm()
+        if channels_last:
+            self.to(memory_format=torch.channels_last)
+        return self
+
     def forward(self, x: Tensor) -> Tuple[Tensor, Tensor, Tensor]:
         x = self.conv1(x)
         x = self.bn1(x)
@@ -4,6 +4,9 @@ import torch
 
 from models.bisenet import BiSeNet
 
+# 1:skin, 2:l_brow, 3:r_brow, 4:l_eye, 5:r_eye, 7:l_ear, 8:r_ear, 9:ear_r, 10:nose, 11:mouth, 12:u_lip, 13:l_lip, 17:hair
+HEAD_PARTS_INDICES = [1, 2, 3, 4, 5, 7, 8, 9, 10, 11, 12, 13, 17]
+
 
 def torch2onnx_export(params):
     num_classes = 19
@@ -12,9 +15,14 @@ def torch2onnx_export(params):
     model.load_state_dict(torch.load(params.weight))
     model.eval()
 
-    onnx_model_path = params.weight.replace(".pt", ".onnx")
+    # "full" keeps the training graph (main + auxiliary logits); the other modes drop the auxiliary heads
+    if params.output_mode != "full":
+        model.set_output_mode(params.output_mode, head_classes=params.head_classes)
+
+    suffix = ".onnx" if params.output_mode == "full" else f"_{params.output_mode}.onnx"
+    onnx_model_path = params.weight.replace(".pt", suffix)
 
-    dummy_input = torch.randn(1, 3, 512, 512, requires_grad=True)
+    dummy_input = torch.randn(1, 3, params.input_size, params.input_size, requires_grad=True)
 
     # Export the model to ONNX
     torch.onnx.export(
@@ -27,7 +35,7 @@ def torch2onnx_export(params):
         input_names=['input'],
         output_names=['output'],
         dynamic_axes={
-            'input': {0: 'batch_size'},    # variable length axes
+            'input': {0: 'batch_size', 2: 'height', 3: 'width'},    # variable length axes
             'output': {0: 'batch_size'}
         }
     )
@@ -42,6 +50,27 @@ def parse_args():
         default="./weights/resnet18.pt",
         help="path to trained model, i.e resnet18/34"
     )
+    parser.add_argument(
+        "--input-size",
+        type=int,
+        default=512,
+        help="spatial size of the dummy input; height/width stay dynamic in the exported graph"
+    )
+    parser.add_argument(
+        "--output-mode",
+        type=str,
+        default="full",
+        choices=["full", "logits", "labels", "head_mask", "low_res_logits"],
+        help="graph output: full (all heads, logits), logits (main head), labels (uint8 argmax), "
+             "head_mask (uint8 0/255), low_res_logits (main head at 1/8 resolution)"
+    )
+    parser.add_argument(
+        "--head-classes",
+        type=int,
+        nargs="+",
+        default=HEAD_PARTS_INDICES,
+        help="class indices merged into the mask for --output-mode head_mask"
+    )
 
     return parser.parse_args()
 
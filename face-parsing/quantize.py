@@ -0,0 +1,256 @@
+"""
+Post-training static INT8 quantization of an exported BiSeNet ONNX model with onnxruntime.
+
+Workflow:
+    # 1. export the FP32 inference graph (argmax in the graph, dynamic height/width)
+    python onnx_export.py --model resnet18 --weight ./weights/resnet18.pt --output-mode labels
+    # 2. calibrate on a folder of representative face images and write the QDQ INT8 model
+    python quantize.py --model ./weights/resnet18_labels.onnx --calibration ./assets/images/
+    # 3. optionally compare FP32 and INT8 on an evaluation folder (head-class mIoU, latency, RSS);
+    #    with --eval-labels (CelebAMask-HQ style <image stem>.png label maps) both are scored against ground truth
+    python quantize.py --model ./weights/resnet18_labels.onnx --calibration ./calib/ --eval-input ./val/images/ \
+        --eval-labels ./val/labels/
+
+The face parsing service loads the result with FACE_PARSING_ONNX_MODEL=./weights/resnet18_labels_int8.onnx
+"""
+import os
+import time
+import json
+import argparse
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quant_pre_process,
+    quantize_static,
+)
+
+from onnx_export import HEAD_PARTS_INDICES
+from onnx_inference import get_files_to_process, prepare_image
+from utils.metrics import confusion_matrix, mean_iou, peak_rss_mb
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+NUM_CLASSES = 19
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+
+
+class ImageFolderCalibrationReader(CalibrationDataReader):
+    """Feeds preprocessed images from a folder to the onnxruntime calibrator, one image per batch."""
+
+    def __init__(self, files: List[str], input_name: str, input_size: int) -> None:
+        self.files = files
+        self.input_name = input_name
+        self.input_size = input_size
+        self._iterator = iter(self.files)
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        file_path = next(self._iterator, None)
+        if file_path is None:
+            return None
+        image = Image.open(file_path).convert("RGB")
+        return {self.input_name: prepare_image(image, (self.input_size, self.input_size))}
+
+    def rewind(self) -> None:
+        self._iterator = iter(self.files)
+
+
+def quantize_model(params: argparse.Namespace) -> str:
+    """
+    Calibrate and quantize `params.model`, returns the path of the INT8 model.
+
+    Activations are quantized to uint8 and weights to int8 (per channel by default) in QDQ format,
+    which onnxruntime's CPU provider runs with integer convolutions.
+    """
+    output_path = params.output or params.model.replace(".onnx", "_int8.onnx")
+    files = get_files_to_process(params.calibration)[:params.num_images]
+    if not files:
+        raise ValueError(f"No calibration images found in {params.calibration}")
+    logger.info(f"Calibrating on {len(files)} images at {params.input_size}x{params.input_size} ({params.method})")
+
+    # shape inference + graph optimization first, as recommended by onnxruntime for static quantization
+    model_input = params.model
+    if not params.skip_preprocess:
+        model_input = output_path.replace(".onnx", "_preprocessed.onnx")
+        quant_pre_process(params.model, model_input)
+
+    input_name = ort.InferenceSession(model_input, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = ImageFolderCalibrationReader(files, input_name, params.input_size)
+    try:
+        quantize_static(
+            model_input,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=not params.per_tensor,
+            calibrate_method=CALIBRATION_METHODS[params.method],
+        )
+    finally:
+        if model_input != params.model:
+            os.remove(model_input)
+
+    logger.info(f"INT8 model saved to {output_path} "
+                f"({os.path.getsize(params.model) / 2**20:.1f} MB -> {os.path.getsize(output_path) / 2**20:.1f} MB)")
+    return output_path
+
+
+def _labels(output: np.ndarray) -> np.ndarray:
+    """(1, H, W) uint8 labels from either a labels graph or a logits graph."""
+    return output[0] if output.dtype == np.uint8 else output[0].argmax(0).astype(np.uint8)
+
+
+def evaluate_model(model_path: str, files: List[str], input_size: int, repeat: int) -> Dict:
+    """
+    Run `model_path` on `files`; returns its masks, mean latency and peak RSS.
+
+    Meant to run in a fresh (spawned) process so that the peak RSS belongs to this model alone.
+    """
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+
+    masks, latencies = [], []
+    for file_path in files:
+        image_batch = prepare_image(Image.open(file_path).convert("RGB"), (input_size, input_size))
+        masks.append(_labels(session.run(None, {input_name: image_batch})[0]))
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            session.run(None, {input_name: image_batch})
+        latencies.append((time.perf_counter() - t0) * 1000 / repeat)
+
+    return {
+        "masks": np.stack(masks),
+        "latency_ms": float(np.mean(latencies)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def score_against_labels(masks: np.ndarray, files: List[str], labels_dir: str) -> np.ndarray:
+    """Confusion matrix of `masks` against the ground-truth label maps of `files`."""
+    confusion = np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.int64)
+    for mask, file_path in zip(masks, files):
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        target = np.array(Image.open(os.path.join(labels_dir, stem + ".png")))
+        pred = np.array(Image.fromarray(mask).resize(target.shape[::-1], resample=Image.NEAREST))
+        confusion += confusion_matrix(pred, target, NUM_CLASSES)
+    return confusion
+
+
+def report(fp32_path: str, int8_path: str, params: argparse.Namespace) -> Dict:
+    """
+    Compare the INT8 model against FP32: head-class mIoU delta, latency, peak RSS and file size.
+
+    Without ground-truth labels the FP32 masks are the reference, so the FP32 score is 1 by definition
+    and the delta is the INT8 score minus 1.
+    """
+    files = get_files_to_process(params.eval_input)
+    logger.info(f"Evaluating FP32 and INT8 models on {len(files)} images")
+
+    results = {}
+    for name, path in (("fp32", fp32_path), ("int8", int8_path)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results[name] = executor.submit(evaluate_model, path, files, params.input_size, params.repeat).result()
+
+    fp32, int8 = results["fp32"], results["int8"]
+    confusion = confusion_matrix(int8["masks"], fp32["masks"], NUM_CLASSES)
+    if params.eval_labels:
+        fp32_confusion = score_against_labels(fp32["masks"], files, params.eval_labels)
+        int8_confusion = score_against_labels(int8["masks"], files, params.eval_labels)
+        reference = "ground truth"
+    else:
+        fp32_confusion, int8_confusion = np.diag(confusion.sum(axis=1)), confusion
+        reference = "FP32 masks"
+    fp32_head_miou = mean_iou(fp32_confusion, HEAD_PARTS_INDICES)
+    int8_head_miou = mean_iou(int8_confusion, HEAD_PARTS_INDICES)
+
+    summary = {
+        "images": len(files),
+        "input_size": params.input_size,
+        "reference": reference,
+        "fp32_head_miou": fp32_head_miou,
+        "int8_head_miou": int8_head_miou,
+        "head_miou_delta": int8_head_miou - fp32_head_miou,
+        "pixel_agreement": float(np.trace(confusion) / confusion.sum()),
+        "fp32_latency_ms": fp32["latency_ms"],
+        "int8_latency_ms": int8["latency_ms"],
+        "speedup": fp32["latency_ms"] / int8["latency_ms"],
+        "fp32_peak_rss_mb": fp32["peak_rss_mb"],
+        "int8_peak_rss_mb": int8["peak_rss_mb"],
+        "fp32_size_mb": os.path.getsize(fp32_path) / 2**20,
+        "int8_size_mb": os.path.getsize(int8_path) / 2**20,
+    }
+
+    logger.info(f"Head-class mIoU against {reference}: FP32 {fp32_head_miou:.4f}, INT8 {int8_head_miou:.4f} "
+                f"(delta {summary['head_miou_delta']:+.4f}); INT8/FP32 pixel agreement {summary['pixel_agreement']:.2%}")
+    logger.info(f"Latency: FP32 {fp32['latency_ms']:.1f} ms, INT8 {int8['latency_ms']:.1f} ms "
+                f"({summary['speedup']:.2f}x)")
+    logger.info(f"Peak RSS: FP32 {fp32['peak_rss_mb']:.0f} MB, INT8 {int8['peak_rss_mb']:.0f} MB; "
+                f"model size: FP32 {summary['fp32_size_mb']:.1f} MB, INT8 {summary['int8_size_mb']:.1f} MB")
+
+    if params.report:
+        with open(params.report, "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Report saved to {params.report}")
+    return summary
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse and validate command line arguments.
+
+    Returns:
+        argparse.Namespace: Validated command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Static INT8 quantization of the face parsing ONNX model")
+    parser.add_argument("--model", type=str, required=True, help="path to the FP32 ONNX model (see onnx_export.py)")
+    parser.add_argument("--calibration", type=str, required=True, help="folder of calibration images")
+    parser.add_argument("--output", type=str, default=None, help="INT8 model path (default: <model>_int8.onnx)")
+    parser.add_argument("--input-size", type=int, default=512, help="model input resolution used for calibration")
+    parser.add_argument("--num-images", type=int, default=200, help="maximum number of calibration images")
+    parser.add_argument("--method", type=str, default="minmax", choices=sorted(CALIBRATION_METHODS),
+                        help="activation range calibration method")
+    parser.add_argument("--per-tensor", action="store_true", help="per-tensor instead of per-channel weight scales")
+    parser.add_argument("--skip-preprocess", action="store_true", help="skip onnxruntime quant_pre_process")
+    parser.add_argument("--eval-input", type=str, default=None, help="folder of images to compare FP32 and INT8 on")
+    parser.add_argument("--eval-labels", type=str, default=None,
+                        help="folder of ground-truth label maps (<image stem>.png) for --eval-input")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per evaluation image")
+    parser.add_argument("--report", type=str, default=None, help="optional JSON file for the evaluation report")
+
+    args = parser.parse_args()
+
+    # Validate arguments
+    if not os.path.exists(args.model):
+        raise ValueError(f"ONNX model file does not exist: {args.model}")
+    if not os.path.exists(args.calibration):
+        raise ValueError(f"Calibration path does not exist: {args.calibration}")
+
+    return args
+
+
+def main() -> None:
+    """Main entry point of the script."""
+    args = parse_args()
+    int8_path = quantize_model(args)
+    if args.eval_input:
+        report(args.model, int8_path, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,9 @@ from torch.utils.data import DataLoader
 from torch.optim.lr_scheduler import PolynomialLR
 
 from models.bisenet import BiSeNet
-from utils.dataset import CelebAMaskHQ
+from utils.dataset import CelebAMaskHQ, CelebAMaskHQShards
 from utils.loss import OhemLossWrapper
-from utils.transform import TrainTransform
+from utils.transform import BatchTrainTransform, ToUint8Tensor, TrainTransform
 
 
 def parse_args():
@@ -26,6 +26,10 @@ def parse_args():
     parser.add_argument('--image-size', type=int, nargs=2, default=[448, 448], help='Size of input images')
     parser.add_argument('--data-root', type=str, default='/mnt/d/Datasets/CelebAMask-HQ/',
                         help='Root directory of the dataset')
+    parser.add_argument('--shards', type=str, default=None,
+                        help='Directory of pre-decoded shards (python -m utils.prepare_shards), used instead of the images')
+    parser.add_argument('--batch-augment', action='store_true',
+                        help='Augment collated uint8 batches on the training device instead of per sample in the workers')
 
     # Optimizer
     parser.add_argument('--momentum', type=float, default=0.9, help='Momentum for optimizer')
@@ -44,6 +48,8 @@ def parse_args():
     # Train loop
     parser.add_argument('--print-freq', type=int, default=50, help='Print frequency during training')
     parser.add_argument('--resume', action='store_true', help='Resume training from checkpoint')
+    parser.add_argument('--amp', action='store_true',
+                        help='Mixed precision: float16 with gradient scaling on CUDA, bfloat16 on CPU')
 
     args = parser.parse_args()
     return args
@@ -70,15 +76,30 @@ def add_weight_decay(model, weight_decay=1e-5):
             {"params": decay, "weight_decay": weight_decay}]
 
 
-def train_one_epoch(model, criterion, optimizer, data_loader, lr_scheduler, device, epoch, print_freq, scaler=None):
+def train_one_epoch(
+        model,
+        criterion,
+        optimizer,
+        data_loader,
+        lr_scheduler,
+        device,
+        epoch,
+        print_freq,
+        scaler=None,
+        amp_dtype=None,
+        augment=None
+):
     model.train()
     batch_loss = []
+    num_samples, epoch_start = 0, time.time()
     for batch_idx, (image, target) in enumerate(data_loader):
         start_time = time.time()
-        image = image.to(device)
-        target = target.to(device)
+        image = image.to(device, non_blocking=True)
+        target = target.to(device, non_blocking=True)
+        if augment is not None:
+            image, target = augment(image, target)
 
-        with torch.cuda.amp.autocast(enabled=scaler is not None):
+        with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
             output = model(image)
             loss = criterion(output, target)
 
@@ -93,6 +114,7 @@ def train_one_epoch(model, criterion, optimizer, data_loader, lr_scheduler, devi
 
         lr_scheduler.step()
         batch_loss.append(loss.item())
+        num_samples += image.shape[0]
 
         if (batch_idx + 1) % print_freq == 0:
             lr = optimizer.param_groups[0]["lr"]
@@ -102,23 +124,32 @@ def train_one_epoch(model, criterion, optimizer, data_loader, lr_scheduler, devi
                 f'Time: {(time.time() - start_time):.3f}s '
                 f'LR: {lr:.7f} '
             )
-    print(f"Avg batch loss: {np.mean(batch_loss):.7f}")
+    print(f"Avg batch loss: {np.mean(batch_loss):.7f}  "
+          f"Throughput: {num_samples / (time.time() - epoch_start):.1f} samples/s")
 
 
 def main(params):
     random_seed()
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    images_dir = os.path.join(params.data_root, 'CelebA-HQ-img')
-    labels_dir = os.path.join(params.data_root, 'mask')
-
-    dataset = CelebAMaskHQ(images_dir, labels_dir, transform=TrainTransform(image_size=params.image_size))
+    if params.batch_augment:
+        # workers only decode; augmentation runs on whole batches in train_one_epoch
+        transform, augment = ToUint8Tensor(), BatchTrainTransform(image_size=params.image_size)
+    else:
+        transform, augment = TrainTransform(image_size=params.image_size), None
+
+    if params.shards:
+        dataset = CelebAMaskHQShards(params.shards, transform=transform)
+    else:
+        images_dir = os.path.join(params.data_root, 'CelebA-HQ-img')
+        labels_dir = os.path.join(params.data_root, 'mask')
+        dataset = CelebAMaskHQ(images_dir, labels_dir, transform=transform)
     data_loader = DataLoader(
         dataset,
         batch_size=params.batch_size,
         shuffle=True,
         num_workers=params.num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         drop_last=True
     )
 
@@ -126,6 +157,11 @@ def main(params):
     model = BiSeNet(num_classes=params.num_classes, backbone_name=params.backbone)
     model.to(device)
 
+    amp_dtype, scaler = None, None
+    if params.amp:
+        amp_dtype = torch.float16 if device.type == "cuda" else torch.bfloat16
+        scaler = torch.cuda.amp.GradScaler() if device.type == "cuda" else None
+
     n_min = params.batch_size * params.image_size[0] * params.image_size[1] // 16
     criterion = OhemLossWrapper(thresh=params.score_thres, min_kept=n_min)
 
@@ -156,7 +192,9 @@ def main(params):
             device,
             epoch,
             params.print_freq,
-            scaler=None
+            scaler=scaler,
+            amp_dtype=amp_dtype,
+            augment=augment
         )
 
         ckpt = {
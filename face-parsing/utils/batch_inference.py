@@ -0,0 +1,146 @@
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from utils.common import palette_mask, vis_parsing_maps
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceImageFolder(Dataset):
+    """
+    Decodes and preprocesses images for offline inference, so that DataLoader workers do it in parallel.
+
+    Every item is (model input without the batch dimension, original RGB image as a uint8 tensor, file path),
+    or None when the image can not be read. The original image is returned as a tensor so that it is handed
+    from the worker to the main process through shared memory instead of being pickled.
+    """
+
+    def __init__(self, files: List[str], preprocess: Callable) -> None:
+        super().__init__()
+        self.files = files
+        self.preprocess = preprocess
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __getitem__(self, idx: int) -> Optional[Tuple]:
+        file_path = self.files[idx]
+        try:
+            image = Image.open(file_path).convert("RGB")
+            image_batch = self.preprocess(image)
+        except Exception as e:
+            logger.error(f"Error reading {file_path}: {e}")
+            return None
+        return image_batch[0], torch.from_numpy(np.array(image)), file_path
+
+
+def collate_images(samples: List[Optional[Tuple]]) -> Tuple:
+    """Stack the model inputs (torch or numpy) of the readable samples, keep images and paths as lists."""
+    samples = [sample for sample in samples if sample is not None]
+    if not samples:
+        return None, [], []
+    inputs, images, paths = zip(*samples)
+    batch = torch.stack(inputs) if isinstance(inputs[0], torch.Tensor) else np.stack(inputs)
+    return batch, list(images), list(paths)
+
+
+def create_loader(files: List[str], preprocess: Callable, batch_size: int, num_workers: int) -> DataLoader:
+    """
+    DataLoader that decodes and preprocesses `files` in `num_workers` processes and prefetches batches.
+
+    Args:
+        files: Image paths, processed in order
+        preprocess: Picklable callable turning a PIL image into a (1, 3, H, W) tensor or array
+        batch_size: Images per forward pass
+        num_workers: Decoding processes, 0 decodes in the main process
+
+    Returns:
+        DataLoader: Yields (batch, images, paths) tuples, see `collate_images`
+    """
+    return DataLoader(
+        InferenceImageFolder(files, preprocess),
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        collate_fn=collate_images,
+        pin_memory=torch.cuda.is_available(),
+        prefetch_factor=2 if num_workers > 0 else None,
+    )
+
+
+class ResultWriter:
+    """
+    Thread pool for encoding and saving results off the inference loop.
+
+    PNG/JPEG encoding and resizing release the GIL, so the writers run in parallel with each other and with
+    the forward pass. At most `max_pending` results are queued; `submit` blocks beyond that to bound memory.
+    """
+
+    def __init__(self, num_threads: int = 4, max_pending: Optional[int] = None) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="writer")
+        self.slots = threading.BoundedSemaphore(max_pending or 4 * num_threads)
+        self.errors = 0
+
+    def submit(self, fn: Callable, *args) -> Future:
+        self.slots.acquire()
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        self.slots.release()
+        if future.exception() is not None:
+            self.errors += 1
+            logger.error(f"Error saving result: {future.exception()}")
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.executor.shutdown(wait=True)
+
+
+def output_paths(file_path: str, output_path: str) -> Tuple[str, str]:
+    """Paths of the raw mask and of the visualization for `file_path`."""
+    filename = os.path.basename(file_path)
+    root, _ = os.path.splitext(filename)
+    return os.path.join(output_path, root + "_raw.png"), os.path.join(output_path, filename)
+
+
+def save_prediction(
+        image: np.ndarray,
+        predicted_mask: np.ndarray,
+        save_raw_path: str,
+        save_path: str,
+        vis_mode: str = "blend",
+) -> None:
+    """
+    Save the raw (model resolution) mask and the visualization at the original image resolution.
+
+    Args:
+        image: Original RGB image (H, W, 3) uint8, blended in place
+        predicted_mask: uint8 label map at model input resolution
+        save_raw_path: Path of the raw mask PNG
+        save_path: Path of the blended visualization
+        vis_mode: "blend" saves a grayscale raw mask and the blended image, "palette" only saves the raw
+            mask as a palette-mode PNG (same label values, colored in viewers) and skips the blend
+    """
+    if vis_mode == "palette":
+        palette_mask(predicted_mask).save(save_raw_path)
+        return
+
+    mask_pil = Image.fromarray(predicted_mask)
+    mask_pil.save(save_raw_path)
+
+    # Resize mask back to original image resolution
+    restored_mask = np.array(mask_pil.resize((image.shape[1], image.shape[0]), resample=Image.NEAREST))
+    vis_parsing_maps(image, restored_mask, save_image=True, save_path=save_path, inplace=True)
@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from PIL import Image
 
 
 ATTRIBUTES = [
@@ -46,30 +47,51 @@ COLOR_LIST = [
 ]
 
 
-def vis_parsing_maps(image, segmentation_mask, save_image=False, save_path="result.png"):
-    # Create numpy arrays for image and segmentation mask
-    image = np.array(image).copy().astype(np.uint8)
-    segmentation_mask = segmentation_mask.copy().astype(np.uint8)
+# COLOR_LIST as a lookup table indexed by the label map; labels without a color stay black
+PALETTE = np.zeros((256, 3), dtype=np.uint8)
+PALETTE[:len(COLOR_LIST)] = COLOR_LIST
 
-    # Create a color mask
-    segmentation_mask_color = np.zeros((segmentation_mask.shape[0], segmentation_mask.shape[1], 3))
 
-    num_classes = np.max(segmentation_mask)
+def vis_parsing_maps(image, segmentation_mask, save_image=False, save_path="result.png", inplace=False):
+    """
+    Blend the color-coded segmentation mask over the image (BGR output, as written by cv2.imwrite).
 
-    for class_index in range(1, num_classes + 1):
-        class_pixels = np.where(segmentation_mask == class_index)
-        segmentation_mask_color[class_pixels[0], class_pixels[1], :] = COLOR_LIST[class_index]
+    Args:
+        image: RGB image, PIL Image or (H, W, 3) uint8 array
+        segmentation_mask: (H, W) label map
+        save_image: Write the blended image to `save_path`
+        save_path: Output path
+        inplace: Blend into `image` itself (a writable contiguous uint8 array) instead of a new buffer
 
-    segmentation_mask_color = segmentation_mask_color.astype(np.uint8)
+    Returns:
+        np.ndarray: Blended BGR image
+    """
+    image = np.asarray(image, dtype=np.uint8)
+    segmentation_mask = np.asarray(segmentation_mask).astype(np.uint8, copy=False)
+
+    # Create a color mask with a single palette lookup (cv2.LUT maps each channel through its own column)
+    segmentation_mask_color = cv2.LUT(cv2.merge([segmentation_mask] * 3), PALETTE[np.newaxis])
 
     # Convert image to BGR format for blending
-    bgr_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    bgr_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=image if inplace else None)
 
     # Blend the image with the segmentation mask
-    blended_image = cv2.addWeighted(bgr_image, 0.6, segmentation_mask_color, 0.4, 0)
+    blended_image = cv2.addWeighted(bgr_image, 0.6, segmentation_mask_color, 0.4, 0, dst=bgr_image)
 
     # Save the result if required
     if save_image:
         cv2.imwrite(save_path, blended_image, [int(cv2.IMWRITE_JPEG_QUALITY), 100])
 
     return blended_image
+
+
+def palette_mask(segmentation_mask):
+    """
+    Wrap a label map in a palette-mode ("P") PIL image: the pixel values stay the labels, so the file
+    still reads back as the raw mask, but image viewers show it in the visualization colors.
+    """
+    mask_image = Image.fromarray(np.asarray(segmentation_mask).astype(np.uint8, copy=False))
+    # putpalette turns the "L" image into "P" without touching the pixel values;
+    # COLOR_LIST is blended as BGR by vis_parsing_maps, PIL palettes are RGB
+    mask_image.putpalette(PALETTE[:, ::-1].tobytes())
+    return mask_image
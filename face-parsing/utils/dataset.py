@@ -1,11 +1,23 @@
 import os
+import json
 import numpy as np
 from PIL import Image
 
+import torch
 from torch.utils.data import Dataset
 from utils.transform import DefaultTransform
 
 
+def read_sample(image_path, label_path):
+    """Decode an image / label pair; the 1024x1024 image is resized to the 512x512 mask size."""
+    image = Image.open(image_path)
+    # mask image size is 512x512, so original image needs to be resized from 1024x1024 to 512x512
+    image = image.resize((512, 512), Image.BILINEAR)
+
+    label = Image.open(label_path).convert('P')
+    return image, label
+
+
 class CelebAMaskHQ(Dataset):
     def __init__(self, images_dir, labels_dir, transform=None) -> None:
         super().__init__()
@@ -36,16 +48,67 @@ class CelebAMaskHQ(Dataset):
 
     def __getitem__(self, idx: int):
 
-        image_path = self.image_files[idx]
-        label_path = self.label_files[idx]
+        image, label = read_sample(self.image_files[idx], self.label_files[idx])
+
+        image, label = self.transform(image, label)
+        if not isinstance(label, torch.Tensor):
+            label = np.array(label).astype(np.int64)
+
+        return image, label
+
+
+class CelebAMaskHQShards(Dataset):
+    """
+    CelebAMask-HQ read from the pre-decoded uint8 shards written by `utils/prepare_shards.py`.
+
+    Shards are memory-mapped lazily in each DataLoader worker and samples are wrapped in PIL images
+    that share the mapped memory (Image.frombuffer), so no JPEG/PNG decoding or resizing happens per sample
+    and the page cache is shared between workers.
+    """
+
+    def __init__(self, shards_dir, transform=None) -> None:
+        super().__init__()
+        self.shards_dir = shards_dir
+
+        if transform is None:
+            transform = DefaultTransform()
+
+        self.transform = transform
+
+        with open(os.path.join(shards_dir, "index.json")) as f:
+            self.index = json.load(f)
+        self.offsets = np.cumsum([0] + [shard["count"] for shard in self.index["shards"]])
+        self._images = None
+        self._labels = None
+
+    def _open(self) -> None:
+        self._images = [np.load(os.path.join(self.shards_dir, s["images"]), mmap_mode="r") for s in self.index["shards"]]
+        self._labels = [np.load(os.path.join(self.shards_dir, s["labels"]), mmap_mode="r") for s in self.index["shards"]]
+
+    def __getstate__(self):
+        # never pickle the memory maps into spawned workers, each worker maps the shards itself
+        state = self.__dict__.copy()
+        state["_images"] = state["_labels"] = None
+        return state
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx: int):
+        if self._images is None:
+            self._open()
 
-        image = Image.open(image_path)
-        # mask image size is 512x512, so original image needs to be resized from 1024x1024 to 512x512
-        image = image.resize((512, 512), Image.BILINEAR)
+        shard = int(np.searchsorted(self.offsets, idx, side="right")) - 1
+        offset = idx - self.offsets[shard]
+        image_array = self._images[shard][offset]
+        label_array = self._labels[shard][offset]
+        height, width = label_array.shape
 
-        label = Image.open(label_path).convert('P')
+        image = Image.frombuffer("RGB", (width, height), image_array, "raw", "RGB", 0, 1)
+        label = Image.frombuffer("L", (width, height), label_array, "raw", "L", 0, 1)
 
         image, label = self.transform(image, label)
-        label = np.array(label).astype(np.int64)
+        if not isinstance(label, torch.Tensor):
+            label = np.array(label).astype(np.int64)
 
         return image, label
@@ -10,13 +10,33 @@ class OhemCELoss(nn.Module):
         self.criteria = nn.CrossEntropyLoss(reduction='none')
 
     def forward(self, logits: torch.Tensor, labels: torch.Tensor) -> torch.Tensor:
-        loss = self.criteria(logits, labels).view(-1)
-        loss, _ = torch.sort(loss, descending=True)
-        if loss[self.min_kept] > self.thresh:
-            loss = loss[loss > self.thresh]
-        else:
-            loss = loss[:self.min_kept]
-        return torch.mean(loss)
+        loss = self.criteria(logits, labels).view(1, -1)
+        return self.ohem_mean(loss)[0]
+
+    def ohem_mean(self, loss: torch.Tensor) -> torch.Tensor:
+        """
+        Online hard example mining over per-pixel losses, one row per output head.
+
+        Same result as sorting the losses in descending order and averaging either every loss above the
+        threshold (if the `min_kept`-th largest one is above it) or the `min_kept` largest ones, but without
+        the sort: the condition is "more than `min_kept` losses above the threshold", and the fallback
+        is a top-k selection, only run for the heads that need it.
+
+        Args:
+            loss: (heads, N) per-pixel losses
+
+        Returns:
+            torch.Tensor: (heads,) mean of the kept losses per head
+        """
+        hard = loss > self.thresh
+        num_hard = hard.sum(dim=1)
+        keep_hard = num_hard > self.min_kept
+        loss_hard = (loss * hard).sum(dim=1) / num_hard.clamp(min=1)
+        if bool(keep_hard.all()):
+            return loss_hard
+
+        loss_top = loss.topk(self.min_kept, dim=1, sorted=False).values.mean(dim=1)
+        return torch.where(keep_hard, loss_hard, loss_top)
 
 
 class OhemLossWrapper:
@@ -24,11 +44,9 @@ class OhemLossWrapper:
         self.loss = OhemCELoss(thresh=thresh, min_kept=min_kept)
 
     def __call__(self, output, labels):
-        out, out16, out32 = output
-
-        loss1 = self.loss(out, labels)
-        loss2 = self.loss(out16, labels)
-        loss3 = self.loss(out32, labels)
+        # per-pixel losses of the three heads (main, 1/16 and 1/32 context) in one (3, N) tensor,
+        # so hard example mining runs once for all heads
+        losses = torch.stack([self.loss.criteria(out, labels).view(-1) for out in output])
 
-        loss = loss1 + loss2 + loss3
+        loss = self.loss.ohem_mean(losses).sum()
         return loss
@@ -0,0 +1,73 @@
+import resource
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def confusion_matrix(pred: np.ndarray, target: np.ndarray, num_classes: int, ignore_index: int = 255) -> np.ndarray:
+    """
+    Accumulate a confusion matrix with a single bincount.
+
+    Args:
+        pred: Predicted label map(s), any shape
+        target: Ground truth label map(s), same shape as `pred`
+        num_classes: Number of segmentation classes
+        ignore_index: Target label that is left out of the matrix
+
+    Returns:
+        np.ndarray: int64 (num_classes, num_classes) matrix, rows are targets and columns predictions
+    """
+    pred = np.asarray(pred).ravel()
+    target = np.asarray(target).ravel()
+    valid = target != ignore_index
+    if not valid.all():
+        pred, target = pred[valid], target[valid]
+    index = target.astype(np.int64) * num_classes + pred
+    return np.bincount(index, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
+
+def class_iou(confusion: np.ndarray) -> np.ndarray:
+    """
+    Per-class intersection over union from a confusion matrix.
+
+    Args:
+        confusion: (num_classes, num_classes) matrix from `confusion_matrix`
+
+    Returns:
+        np.ndarray: float64 IoU per class, NaN for classes absent from both prediction and target
+    """
+    intersection = np.diag(confusion).astype(np.float64)
+    union = confusion.sum(axis=0) + confusion.sum(axis=1) - intersection
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return intersection / union
+
+
+def mean_iou(confusion: np.ndarray, classes: Optional[Sequence[int]] = None) -> float:
+    """
+    Mean IoU over `classes` (all classes by default), ignoring classes that never occur.
+
+    Args:
+        confusion: (num_classes, num_classes) matrix from `confusion_matrix`
+        classes: Class indices to average over, e.g. the head classes
+
+    Returns:
+        float: Mean IoU, NaN if none of the classes occur
+    """
+    iou = class_iou(confusion)
+    if classes is not None:
+        iou = iou[list(classes)]
+    iou = iou[~np.isnan(iou)]
+    return float(iou.mean()) if iou.size else float("nan")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    try:
+        # VmHWM belongs to the current address space; ru_maxrss would carry over the parent's peak across exec
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
@@ -1,5 +1,8 @@
 import os
+import re
 import cv2
+import time
+import argparse
 import numpy as np
 from PIL import Image
 from tqdm import tqdm
@@ -29,49 +32,108 @@ attributes = [
     'hat'
 ]
 
+ATTRIBUTE_INDEX = {attribute: idx for idx, attribute in enumerate(attributes, 1)}
+ANNOTATION_PATTERN = re.compile(r"^(\d+)_(\w+)\.png$")
+IMAGES_PER_FOLDER = 2000  # annotation folder i holds the parts of images i * 2000 .. (i + 1) * 2000 - 1
+MASK_SIZE = 512
 
-def process_folder(i):
-    count, total = 0, 0  # Initialize count and total for each folder
-    for j in tqdm(range(i * 2000, (i + 1) * 2000), desc=f"Processing Folder {i}"):
-        mask = np.zeros((512, 512))
-        for idx, attribute in enumerate(attributes, 1):
-            total += 1
-            filename = f"{str(j).zfill(5)}_{attribute}.png"
-            path = os.path.join(face_sep_mask, str(i), filename)
-            if os.path.exists(path):
-                count += 1
-                sep_mask = np.array(Image.open(path).convert('P'))
-                mask[sep_mask == 225] = idx
-        cv2.imwrite('{}/{}.png'.format(mask_path, j), mask)
-    return count, total
 
+def list_annotations(anno_dir):
+    """
+    List every annotation folder once and group the part masks by image id.
+
+    Every image id covered by an annotation folder is included, also the ones without any part mask
+    (they get an empty label map, as CelebAMaskHQ expects a mask for every image).
+
+    Returns:
+        dict: image id -> [(label index, path), ...] sorted by label index
+    """
+    annotations = {}
+    for folder in sorted(os.scandir(anno_dir), key=lambda entry: entry.name):
+        if not folder.is_dir():
+            continue
+        if folder.name.isdigit():
+            first_id = int(folder.name) * IMAGES_PER_FOLDER
+            for image_id in range(first_id, first_id + IMAGES_PER_FOLDER):
+                annotations.setdefault(image_id, [])
+        for entry in os.scandir(folder.path):
+            match = ANNOTATION_PATTERN.match(entry.name)
+            if match is None or match.group(2) not in ATTRIBUTE_INDEX:
+                continue
+            annotations.setdefault(int(match.group(1)), []).append((ATTRIBUTE_INDEX[match.group(2)], entry.path))
+    for parts in annotations.values():
+        parts.sort()
+    return annotations
+
+
+def merge_parts(parts):
+    """
+    Merge the part masks of one image into a uint8 label map.
+
+    Parts are applied in attribute order, so a later attribute overwrites an earlier one. With the labels
+    being the attribute order, that is a per-pixel maximum over (part hit * label), done in one reduction.
+    An image without any part gets an all-background map.
+    """
+    if not parts:
+        return np.zeros((MASK_SIZE, MASK_SIZE), dtype=np.uint8)
+    stacked = np.stack([np.array(Image.open(path).convert('P')) == 225 for _, path in parts])
+    labels = np.array([idx for idx, _ in parts], dtype=np.uint8)
+    return (stacked * labels[:, None, None]).max(axis=0)
 
-def process_folders_with_multiprocessing(folders_to_process=15):
-    """Processes multiple folders using multiprocessing."""
 
-    with multiprocessing.Pool() as pool:
-        results = pool.map(process_folder, range(folders_to_process))
+def process_image(task):
+    """Decode, merge and write the label map of one image; runs in a worker process."""
+    image_id, parts, output_dir = task
+    mask = merge_parts(parts)
+    output_file = os.path.join(output_dir, f"{image_id}.png")
+    # write to a temporary name first, so an interrupted run never leaves a truncated mask behind
+    tmp_file = os.path.join(output_dir, f"{image_id}.tmp.png")
+    cv2.imwrite(tmp_file, mask)
+    os.replace(tmp_file, output_file)
+    return len(parts)
 
-    # Collect and aggregate results from each folder
-    count = 0
-    total = 0
-    for c, t in results:
-        count += c
-        total += t
 
+def prepare_labels(anno_dir=face_sep_mask, output_dir=mask_path, num_workers=None, overwrite=False):
+    """
+    Build the label maps of every image id (see list_annotations), in parallel at image granularity.
+
+    Already written masks are skipped unless `overwrite` is set, so an interrupted run can be resumed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    annotations = list_annotations(anno_dir)
+
+    done = set() if overwrite else {name for name in os.listdir(output_dir) if not name.endswith(".tmp.png")}
+    tasks = [
+        (image_id, parts, output_dir)
+        for image_id, parts in sorted(annotations.items())
+        if f"{image_id}.png" not in done
+    ]
+    print(f"Found {len(annotations)} images, {len(annotations) - len(tasks)} already done, "
+          f"{len(tasks)} to process")
+
+    count, start_time = 0, time.time()
+    with multiprocessing.Pool(num_workers) as pool:
+        for found in tqdm(pool.imap_unordered(process_image, tasks, chunksize=16), total=len(tasks),
+                          desc="Merging masks"):
+            count += found
+    elapsed = max(time.time() - start_time, 1e-9)
+
+    total = len(tasks) * len(attributes)
     print(f"Total files processed: {count}, {total}")
+    print(f"Throughput: {len(tasks) / elapsed:.1f} images/s, {count / elapsed:.1f} part masks/s "
+          f"({elapsed:.1f}s)")
+    return count, total
 
 
-def process_folder_default(folders_to_process=15):
-    count, total = 0, 0
-    os.makedirs(mask_path, exist_ok=True)
-    for i in range(folders_to_process):
-        c, t = process_folder(i)
-        count += c
-        total += t
-    print(count, total)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge CelebAMask-HQ part annotations into label maps")
+    parser.add_argument('--anno-dir', type=str, default=face_sep_mask, help='CelebAMask-HQ-mask-anno directory')
+    parser.add_argument('--output', type=str, default=mask_path, help='Directory to save the label maps')
+    parser.add_argument('--num-workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--overwrite', action='store_true', help='Rebuild masks that already exist')
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    # process_folder_default() # without multiprocessing
-    process_folders_with_multiprocessing()  # with multiprocessing
+    args = parse_args()
+    prepare_labels(args.anno_dir, args.output, num_workers=args.num_workers, overwrite=args.overwrite)
@@ -0,0 +1,94 @@
+"""
+Pre-decode CelebAMask-HQ into memory-mapped uint8 shards for training (see utils.dataset.CelebAMaskHQShards).
+
+Every shard is a pair of .npy files, images (N, 512, 512, 3) and labels (N, 512, 512), plus one index.json
+for the whole set. Images are decoded and resized exactly like utils.dataset.CelebAMaskHQ does per sample.
+
+Usage (from the face-parsing directory):
+    python -m utils.prepare_shards --data-root /path/to/CelebAMask-HQ --output /path/to/CelebAMask-HQ/shards
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from tqdm import tqdm
+
+from utils.dataset import CelebAMaskHQ, read_sample
+
+IMAGE_SIZE = 512
+
+
+def fill_chunk(task):
+    """Decode samples [start, end) of one shard straight into its memory maps; runs in a worker process."""
+    images_path, labels_path, pairs, start = task
+    images = np.load(images_path, mmap_mode="r+")
+    labels = np.load(labels_path, mmap_mode="r+")
+    for offset, (image_path, label_path) in enumerate(pairs, start):
+        image, label = read_sample(image_path, label_path)
+        images[offset] = np.asarray(image.convert("RGB"))
+        labels[offset] = np.asarray(label)
+    images.flush()
+    labels.flush()
+    return len(pairs)
+
+
+def prepare_shards(data_root, output, shard_size=2000, chunk_size=64, num_workers=None):
+    dataset = CelebAMaskHQ(os.path.join(data_root, "CelebA-HQ-img"), os.path.join(data_root, "mask"))
+    pairs = list(zip(dataset.image_files, dataset.label_files))
+    if not pairs:
+        raise ValueError(f"No image / label pairs found under {data_root}")
+    os.makedirs(output, exist_ok=True)
+
+    shards, tasks = [], []
+    for shard_idx, shard_start in enumerate(range(0, len(pairs), shard_size)):
+        shard_pairs = pairs[shard_start:shard_start + shard_size]
+        shard = {
+            "images": f"images_{shard_idx:03d}.npy",
+            "labels": f"labels_{shard_idx:03d}.npy",
+            "count": len(shard_pairs),
+        }
+        images_path, labels_path = os.path.join(output, shard["images"]), os.path.join(output, shard["labels"])
+        # allocate the full shard files up front, workers fill disjoint slices of them
+        open_memmap(images_path, mode="w+", dtype=np.uint8, shape=(len(shard_pairs), IMAGE_SIZE, IMAGE_SIZE, 3))
+        open_memmap(labels_path, mode="w+", dtype=np.uint8, shape=(len(shard_pairs), IMAGE_SIZE, IMAGE_SIZE))
+        for start in range(0, len(shard_pairs), chunk_size):
+            tasks.append((images_path, labels_path, shard_pairs[start:start + chunk_size], start))
+        shards.append(shard)
+
+    start_time = time.time()
+    with multiprocessing.Pool(num_workers) as pool, tqdm(total=len(pairs), desc="Writing shards") as progress:
+        for count in pool.imap_unordered(fill_chunk, tasks):
+            progress.update(count)
+    elapsed = time.time() - start_time
+
+    # the index is written last, so an interrupted run never leaves a readable but incomplete set
+    index = {
+        "image_size": IMAGE_SIZE,
+        "shards": shards,
+        "files": [os.path.basename(image_path) for image_path, _ in pairs],
+    }
+    with open(os.path.join(output, "index.json"), "w") as f:
+        json.dump(index, f)
+
+    print(f"Wrote {len(pairs)} samples in {len(shards)} shards to {output} "
+          f"({len(pairs) / elapsed:.1f} samples/s)")
+    return index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-decode CelebAMask-HQ into memory-mapped uint8 shards")
+    parser.add_argument('--data-root', type=str, required=True,
+                        help='Dataset root with CelebA-HQ-img/ and mask/ (see utils/prepare_labels.py)')
+    parser.add_argument('--output', type=str, required=True, help='Output directory for the shards')
+    parser.add_argument('--shard-size', type=int, default=2000, help='Samples per shard file')
+    parser.add_argument('--num-workers', type=int, default=None, help='Decoding processes (default: all cores)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    prepare_shards(args.data_root, args.output, shard_size=args.shard_size, num_workers=args.num_workers)
@@ -1,9 +1,35 @@
 import random
 import numpy as np
+import torch
+import torch.nn.functional as nnf
 from PIL import Image, ImageEnhance
 from torchvision.transforms import functional as F
 
-__all__ = ["TrainTransform", "DefaultTransform"]
+__all__ = ["TrainTransform", "DefaultTransform", "BatchTrainTransform", "ToUint8Tensor", "flip_label"]
+
+# left <-> right label pairs (eyebrows, eyes, ears) as a 256-entry remap table for flipped masks
+FLIP_LABEL_LUT = np.arange(256, dtype=np.uint8)
+FLIP_LABEL_LUT[[2, 3, 4, 5, 7, 8]] = [3, 2, 5, 4, 8, 7]
+_FLIP_LABEL_LUT_TENSOR = torch.from_numpy(FLIP_LABEL_LUT)
+
+
+def flip_label(label, mirror=True):
+    """
+    Horizontally flip a label map and swap the left/right classes in a single lookup pass.
+
+    Args:
+        label: (..., H, W) integer NumPy array or tensor
+        mirror: Mirror the last axis; False only remaps the classes, for callers that already mirrored
+            the pixels (e.g. through a sampling grid)
+
+    Returns:
+        Same type, shape and dtype as `label`
+    """
+    if isinstance(label, torch.Tensor):
+        source = label.flip(-1) if mirror else label
+        return torch.take(_FLIP_LABEL_LUT_TENSOR.to(label.device, label.dtype), source.long())
+    source = label[..., ::-1] if mirror else label
+    return FLIP_LABEL_LUT[source].astype(label.dtype, copy=False)
 
 
 class RandomCrop:
@@ -46,25 +72,9 @@ class HorizontalFlip:
 
     def __call__(self, image, target):
         if random.random() < self.p:
-            np_target = np.array(target)
-            label_swaps = {
-                2: 3,  # l -> r eyebrow
-                3: 2,  # r -> l eyebrow
-                4: 5,  # l -> r eye
-                5: 4,  # r -> l eye
-                7: 8,  # l -> r ear
-                8: 7,  # r -> l ear
-            }
-            np_target_flipped = np_target.copy()
-
-            for src, dst in label_swaps.items():
-                np_target_flipped[np_target == src] = dst 
-
-            target = Image.fromarray(np_target_flipped)
-
-            # flip image and image mask
+            # flip image, flip image mask and swap l <-> r eyebrow, eye and ear labels
             image = image.transpose(Image.FLIP_LEFT_RIGHT)
-            target = target.transpose(Image.FLIP_LEFT_RIGHT)
+            target = Image.fromarray(flip_label(np.asarray(target)))
 
         return image, target
 
@@ -157,3 +167,104 @@ class DefaultTransform:
 
     def __call__(self, image, label):
         return self.transform(image, label)
+
+
+class ToUint8Tensor:
+    """Per-sample transform for BatchTrainTransform: no augmentation, just uint8 (3, H, W) image and (H, W) label."""
+
+    def __call__(self, image, label):
+        image = torch.from_numpy(np.array(image.convert("RGB"))).permute(2, 0, 1)
+        label = torch.from_numpy(np.array(label))
+        return image, label
+
+
+class BatchTrainTransform:
+    """
+    Batched counterpart of TrainTransform, applied to whole collated uint8 batches on the training device.
+
+    Random scale, crop and horizontal flip (with left/right label swap) are folded into one per-sample
+    sampling grid, so images and labels are resampled with a single grid_sample call each. Brightness,
+    contrast and saturation jitter (ImageEnhance semantics, applied to the crop) and normalization are
+    elementwise tensor ops on the batch.
+    """
+
+    def __init__(
+            self,
+            image_size,
+            scales=(0.75, 1.0, 1.25, 1.5, 1.75, 2.0),
+            brightness=0.5,
+            contrast=0.5,
+            saturation=0.5,
+            flip_p=0.5,
+            mean=(0.485, 0.456, 0.406),
+            std=(0.229, 0.224, 0.225),
+    ):
+        self.crop_width, self.crop_height = image_size
+        self.scales = torch.tensor(scales, dtype=torch.float)
+        self.brightness = (max(1 - brightness, 0), 1 + brightness)
+        self.contrast = (max(1 - contrast, 0), 1 + contrast)
+        self.saturation = (max(1 - saturation, 0), 1 + saturation)
+        self.flip_p = flip_p
+        self.mean = torch.tensor(mean).view(1, 3, 1, 1) * 255
+        self.std = torch.tensor(std).view(1, 3, 1, 1) * 255
+        self.gray_weights = torch.tensor([0.299, 0.587, 0.114]).view(1, 3, 1, 1)
+
+    def _sampling_grid(self, batch_size, height, width, flip, device):
+        """Normalized (B, crop_h, crop_w, 2) source coordinates for scale + random crop + flip."""
+        scale = self.scales[torch.randint(len(self.scales), (batch_size,))]
+        # as RandomScale + RandomCrop: images scaled below the crop size are scaled up to fit it
+        scale = torch.maximum(scale, torch.tensor(max(self.crop_width / width, self.crop_height / height)))
+        scaled_w, scaled_h = (width * scale).floor(), (height * scale).floor()
+        left = (torch.rand(batch_size) * (scaled_w - self.crop_width + 1)).floor()
+        top = (torch.rand(batch_size) * (scaled_h - self.crop_height + 1)).floor()
+
+        # pixel centers of the crop in the scaled image, normalized to [-1, 1] of the source image
+        xs = (torch.arange(self.crop_width) + 0.5 + left[:, None]) * 2 / scaled_w[:, None] - 1
+        ys = (torch.arange(self.crop_height) + 0.5 + top[:, None]) * 2 / scaled_h[:, None] - 1
+        xs = torch.where(flip[:, None], -xs, xs)
+
+        grid = torch.stack([
+            xs[:, None, :].expand(-1, self.crop_height, -1),
+            ys[:, :, None].expand(-1, -1, self.crop_width),
+        ], dim=-1)
+        return grid.to(device)
+
+    def _jitter(self, images):
+        """ImageEnhance.Brightness, Contrast and Color with per-sample factors, on float [0, 255] images."""
+        batch_size = images.shape[0]
+
+        def factors(bounds):
+            low, high = bounds
+            return (torch.rand(batch_size, 1, 1, 1) * (high - low) + low).to(images.device)
+
+        images = (images * factors(self.brightness)).clamp_(0, 255)
+        gray_weights = self.gray_weights.to(images.device)
+        gray_mean = (images * gray_weights).sum(dim=1, keepdim=True).mean(dim=(2, 3), keepdim=True).round()
+        images = torch.lerp(gray_mean, images, factors(self.contrast)).clamp_(0, 255)
+        gray = (images * gray_weights).sum(dim=1, keepdim=True)
+        images = torch.lerp(gray, images, factors(self.saturation)).clamp_(0, 255)
+        return images
+
+    def __call__(self, images, labels):
+        """
+        Args:
+            images: uint8 (B, 3, H, W) batch
+            labels: (B, H, W) label maps, any integer dtype
+
+        Returns:
+            Tuple: normalized float (B, 3, crop_h, crop_w) images and int64 (B, crop_h, crop_w) labels
+        """
+        batch_size, _, height, width = images.shape
+        device = images.device
+        flip = torch.rand(batch_size) < self.flip_p
+        grid = self._sampling_grid(batch_size, height, width, flip, device)
+
+        images = nnf.grid_sample(images.float(), grid, mode="bilinear", padding_mode="border", align_corners=False)
+        labels = nnf.grid_sample(labels[:, None].float(), grid, mode="nearest", padding_mode="border",
+                                 align_corners=False)[:, 0].long()
+        # the grid already mirrored the flipped samples, only their left/right classes are swapped
+        labels = torch.where(flip.to(device)[:, None, None], flip_label(labels, mirror=False), labels)
+
+        images = self._jitter(images)
+        images = (images - self.mean.to(device)) / self.std.to(device)
+        return images, labels
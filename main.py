@@ -1,46 +1,176 @@
 # main.py
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from typing import Dict
+from typing import List, Optional
+from fastapi.responses import Response, JSONResponse
+import base64
 import os
 import time
 import shutil
+import tempfile
+import uuid
+from PIL import Image
 
 # 只需导入 pipeline
 from src.pipeline import main_pipeline
+from src.variants import PRINT_SIZES, parse_variants, encode_variants
+from src.layout import SHEET_SIZES, DEFAULT_DPI, check_fit, render_sheets
+from src.image_io import open_image
+from src.alignment import face_models
+from src.cpu_pool import CPU_WORKERS, CpuStagePool
+from src.template_bundle import load_bundles
 
-# 不再需要 lifespan，直接创建 app
-app = FastAPI(title="Intelligent ID Photo Generator API")
+# IDPHOTO_CPU_WORKERS > 0 时, 抠头/对齐/合成在该大小的进程池中执行 (见 src/cpu_pool.py)
+cpu_pool = None
 
-@app.post("/api/v1/idphoto/generate", summary="Generate ID Photo")
-async def generate_id_photo(
+
+@asynccontextmanager
+async def lifespan(app):
+    # 校验并 memory-map 预编译的模板包 (prepare_template.py), 请求中不再解码模板 PNG
+    load_bundles()
+    global cpu_pool
+    if CPU_WORKERS > 0:
+        # 工作进程在后台拉起并各自预加载 dlib 模型 (主进程不使用 dlib)
+        cpu_pool = CpuStagePool(CPU_WORKERS).start(wait_ready=False)
+    elif os.environ.get("IDPHOTO_WARMUP", "1") == "1":
+        # 启动时在后台加载并预热 dlib 模型: 存活探针立即可用, 预热完成前就绪探针返回 503
+        face_models.warm_up_in_background()
+    else:
+        # IDPHOTO_WARMUP=0 时改为首个请求时加载
+        face_models.load_on_first_use()
+    yield
+    if cpu_pool is not None:
+        cpu_pool.shutdown()
+        cpu_pool = None
+
+
+app = FastAPI(title="Intelligent ID Photo Generator API", lifespan=lifespan)
+
+RESPONSE_FORMATS = ("json", "image", "multipart")
+
+
+def _multipart_response(results, headers):
+    """将多张结果图以 multipart/mixed 直接返回 (每个 part 为原始 JPEG 字节)."""
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for name, img_bytes in results.items():
+        body += (
+            f"--{boundary}\r\n"
+            f"Content-Type: image/jpeg\r\n"
+            f"Content-Disposition: attachment; name=\"{name}\"; filename=\"{name}.jpg\"\r\n"
+            f"Content-Length: {len(img_bytes)}\r\n\r\n"
+        ).encode("utf-8")
+        body += img_bytes + b"\r\n"
+    body += f"--{boundary}--\r\n".encode("utf-8")
+    return Response(content=bytes(body), media_type=f"multipart/mixed; boundary={boundary}", headers=headers)
+
+
+def _build_response(results, response_format, processing_time):
+    """按 response_format 返回 JSON (base64 data URI)、单张 image/jpeg 或 multipart."""
+    # --- 二进制输出: 省去 base64 带来的约 33% 体积和编解码开销 ---
+    headers = {"X-Processing-Time-Seconds": str(processing_time)}
+    if response_format == "image":
+        name, img_bytes = next(iter(results.items()))
+        headers["Content-Disposition"] = f"inline; filename=\"{name}.jpg\""
+        return Response(content=img_bytes, media_type="image/jpeg", headers=headers)
+    if response_format == "multipart":
+        return _multipart_response(results, headers)
+
+    results_base64 = {
+        name: "data:image/jpeg;base64," + base64.b64encode(img_bytes).decode("utf-8")
+        for name, img_bytes in results.items()
+    }
+    return {
+        "status": "success",
+        "processing_time_seconds": processing_time,
+        "results": results_base64
+    }
+
+
+def _check_layout_options(response_format, sheet):
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=422, detail=f"response_format must be one of {RESPONSE_FORMATS}.")
+    if sheet is not None and sheet not in SHEET_SIZES:
+        raise HTTPException(status_code=422, detail=f"Sheet size must be one of {list(SHEET_SIZES)}.")
+
+
+@app.get("/healthz", summary="Liveness probe")
+async def healthz():
+    return {"status": "alive"}
+
+
+@app.get("/readyz", summary="Readiness probe")
+async def readyz():
+    """模型可用 (已预热, 或按配置在首个请求时加载) 时返回 200, 否则 503."""
+    if cpu_pool is not None:
+        # 进程池模式下 dlib 模型由工作进程加载并预热, 主进程不使用
+        models = {"cpu pool": cpu_pool.status()}
+        ready = cpu_pool.ready
+    else:
+        models = {face_models.name: face_models.status()}
+        ready = face_models.ready
+    if not ready:
+        return JSONResponse(status_code=503, content={"status": "not ready", "models": models})
+    return {"status": "ready", "models": models}
+
+
+# 普通 def: FastAPI 在线程池中执行, 多个请求可同时进行 (CPU 阶段由进程池分摊到多核)
+@app.post("/api/v1/idphoto/generate", summary="Generate ID Photo", response_model=None)
+def generate_id_photo(
     user_image: UploadFile = File(..., description="User's portrait photo."),
-    template_id: str = Form(..., description="ID of the template to use (e.g., '001').")
-) -> Dict:
-    
+    template_id: str = Form(..., description="ID of the template to use (e.g., '001')."),
+    variants: str = Form("white", description="Comma-separated 'color[:size]' list, e.g. 'white,blue:2inch,red:passport'."),
+    response_format: str = Form("json", description="'json' (base64 data URIs), 'image' (raw image/jpeg) or 'multipart'."),
+    jpeg_quality: int = Form(75, ge=1, le=100, description="JPEG quality of the returned photos."),
+    progressive: bool = Form(False, description="Encode progressive JPEGs."),
+    optimize: bool = Form(False, description="Optimize JPEG Huffman tables (smaller, slightly slower)."),
+    layout: Optional[str] = Form(None, description="Also lay the variants out on a print sheet, e.g. '6inch'."),
+    layout_copies: int = Form(0, ge=0, description="Copies of each variant on the sheet (0 fills one sheet)."),
+    layout_dpi: int = Form(DEFAULT_DPI, ge=72, le=1200, description="Print sheet resolution."),
+    cut_guides: bool = Form(True, description="Draw cut guides between the photos on the sheet."),
+):
+
     start_time = time.time()
-    
+
+    _check_layout_options(response_format, layout)
+    try:
+        requested_variants = parse_variants(variants)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     template_dir = f'assets/templates/{template_id}'
     if not os.path.exists(os.path.join(template_dir, 'template.png')):
         raise HTTPException(status_code=404, detail=f"Template ID '{template_id}' is missing template.png.")
+    if layout:
+        # 排版参数无效 (照片放不下相纸) 属于客户端错误, 在运行流水线之前返回 422 (与排版接口一致)
+        template_size = Image.open(os.path.join(template_dir, 'template.png')).size
+        photo_sizes = {PRINT_SIZES[size] or template_size for _, size in requested_variants}
+        try:
+            check_fit(photo_sizes, sheet=layout, dpi=layout_dpi)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
 
-    user_image_path = os.path.join('inputs', user_image.filename)
+    # 上传文件与中间结果按请求隔离, 并发请求互不覆盖
+    upload_name = os.path.basename(user_image.filename or "upload")
+    user_image_path = os.path.join('inputs', f"{uuid.uuid4().hex}_{upload_name}")
     with open(user_image_path, "wb") as buffer:
         shutil.copyfileobj(user_image.file, buffer)
+    output_dir = tempfile.mkdtemp(prefix="idphoto_")
 
     try:
         # --- 调用已修改的 pipeline ---
-        results_base64 = main_pipeline(user_image_path, template_id)
-        
+        encode_options = {"quality": jpeg_quality, "progressive": progressive, "optimize": optimize}
+        layout_options = None
+        if layout:
+            layout_options = {"sheet": layout, "copies": layout_copies, "dpi": layout_dpi, "cut_guides": cut_guides}
+        results = main_pipeline(user_image_path, template_id, variants=requested_variants,
+                                encode_options=encode_options, layout=layout_options, cpu_pool=cpu_pool,
+                                output_dir=output_dir)
+
         end_time = time.time()
         processing_time = round(end_time - start_time, 2)
-        
-        response_data = {
-            "status": "success",
-            "processing_time_seconds": processing_time,
-            "results": results_base64
-        }
-        return response_data
+        return _build_response(results, response_format, processing_time)
 
     except Exception as e:
         print(f"[!!!] Pipeline Error: {e}")
@@ -48,6 +178,38 @@ async def generate_id_photo(
     finally:
         if os.path.exists(user_image_path):
             os.remove(user_image_path)
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+@app.post("/api/v1/idphoto/layout", summary="Lay out many ID photos on print sheets", response_model=None)
+async def layout_id_photos(
+    photos: List[UploadFile] = File(..., description="Generated ID photos (e.g. one per user), rendered at 300 DPI."),
+    sheet: str = Form("6inch", description="Print sheet size."),
+    copies: int = Form(1, ge=1, description="Copies of each photo."),
+    dpi: int = Form(DEFAULT_DPI, ge=72, le=1200, description="Print sheet resolution."),
+    cut_guides: bool = Form(True, description="Draw cut guides between the photos."),
+    response_format: str = Form("json", description="'json', 'image' (first sheet only) or 'multipart'."),
+    jpeg_quality: int = Form(90, ge=1, le=100, description="JPEG quality of the sheets."),
+):
+    """批量排版: 多个用户的证件照按顺序排到尽量少的相纸上."""
+    start_time = time.time()
+    _check_layout_options(response_format, sheet)
+
+    try:
+        images = {}
+        for index, photo in enumerate(photos):
+            try:
+                image, _ = open_image(await photo.read())
+            except OSError as e:
+                # 无法识别或已损坏的图像 (PIL.UnidentifiedImageError 是 OSError 的子类)
+                raise ValueError(f"Could not decode photo '{photo.filename}': {e}")
+            images[f"{index}_{photo.filename}"] = image
+        sheets = render_sheets(images, sheet=sheet, copies=copies, dpi=dpi, cut_guides=cut_guides)
+        results = encode_variants(sheets, {"quality": jpeg_quality})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    processing_time = round(time.time() - start_time, 2)
+    return _build_response(results, response_format, processing_time)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8080)
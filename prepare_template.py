@@ -1,47 +1,137 @@
 # prepare_template.py
-import dlib
+"""
+模板编译器: 把 assets/templates 下的模板目录编译为服务启动时直接 memory-map 的模板包.
+
+每个模板目录需要 template.png, template_no_head.png 与 long_neck_mask.png (后两者仍需手工制作), 产物:
+- landmark_template.npy: 68 点关键点 (float32)
+- template.bundle: 关键点 + 长脖掩码包围盒 + 修复区域边界 + 预乘 RGBA (格式见 src/template_bundle.py)
+- assets/templates/manifest.json: 各模板源文件与模板包的 sha256
+多个模板在进程池中并行编译. template.png 未变化 (sha256 与 manifest 一致) 时沿用已有关键点, 不再重新检测;
+源文件与模板包都未变化的模板直接跳过 (--force 强制重新编译).
+用法: python prepare_template.py [--template_id 001] [--workers 4] [--force] [--reuse-landmarks]
+"""
 import cv2
 import numpy as np
 import os
+import sys
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
 
-DLIB_MODEL_PATH = 'assets/dlib_models/shape_predictor_68_face_landmarks.dat'
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor(DLIB_MODEL_PATH)
-
-def landmarks_to_np(landmarks, dtype="int"):
-    coords = np.zeros((landmarks.num_parts, 2), dtype=dtype)
-    for i in range(0, landmarks.num_parts):
-        coords[i] = (landmarks.part(i).x, landmarks.part(i).y)
-    return coords
-
-def main(args):
-    template_dir = os.path.join('assets/templates', args.template_id)
-    template_image_path = os.path.join(template_dir, 'template.png')
-    output_path = os.path.join(template_dir, 'landmark_template.npy')
-
-    if not os.path.exists(template_image_path):
-        print(f"[!] Error: Template image not found at {template_image_path}")
-        return
+from src.alignment import face_models, landmarks_to_np
+from src.image_utils import inpaint_region_bounds, premultiply_div255
+from src.template_bundle import (BUNDLE_NAME, FORMAT_VERSION, MANIFEST_NAME, SOURCE_FILES, TEMPLATES_ROOT,
+                                 read_manifest, sha256_file, write_bundle, write_manifest)
 
-    print(f"[*] Processing template image: {template_image_path}")
+def detect_template_landmarks(template_image_path):
     image = cv2.imread(template_image_path)
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
+
+    detector, predictor = face_models.get()
     rects = detector(gray, 1)
     if not rects:
-        print("[!] Error: No faces found in the template image.")
-        return
-        
+        raise ValueError("No faces found in the template image.")
+
     rect = max(rects, key=lambda r: r.width() * r.height())
-    landmarks = predictor(gray, rect)
-    landmark_points = landmarks_to_np(landmarks)
+    return landmarks_to_np(predictor(gray, rect), dtype=np.float32)
+
+def compile_template(template_dir, entry=None, force=False, reuse_landmarks=False):
+    """编译单个模板目录 (在工作进程中执行), 返回 (manifest 条目, 状态说明)."""
+    missing = [name for name in SOURCE_FILES if not os.path.exists(os.path.join(template_dir, name))]
+    if missing:
+        raise FileNotFoundError(f"missing {', '.join(missing)}")
+
+    entry = entry or {}
+    sources = {name: sha256_file(os.path.join(template_dir, name)) for name in SOURCE_FILES}
+    bundle_path = os.path.join(template_dir, BUNDLE_NAME)
+    landmark_path = os.path.join(template_dir, 'landmark_template.npy')
+    if (not force and entry.get("sources") == sources and os.path.exists(bundle_path)
+            and sha256_file(bundle_path) == entry.get("bundle_sha256")):
+        return entry, "up to date"
+
+    # 关键点: template.png 未变化 (或 --reuse-landmarks) 时沿用, 否则重新检测 (带上采样, 较慢)
+    template_unchanged = not force and entry.get("sources", {}).get("template.png") == sources["template.png"]
+    if os.path.exists(landmark_path) and (reuse_landmarks or template_unchanged):
+        landmarks, status = np.load(landmark_path).astype(np.float32), "compiled (landmarks reused)"
+    else:
+        landmarks, status = detect_template_landmarks(os.path.join(template_dir, 'template.png')), "compiled"
+    np.save(landmark_path, landmarks)
+
+    size = Image.open(os.path.join(template_dir, 'template.png')).size
+    template_no_head = np.array(Image.open(os.path.join(template_dir, 'template_no_head.png')).convert("RGBA"))
+    long_neck_mask = np.array(Image.open(os.path.join(template_dir, 'long_neck_mask.png')).convert("L"))
+    if template_no_head.shape[1::-1] != size or long_neck_mask.shape[::-1] != size:
+        raise ValueError(f"template_no_head.png and long_neck_mask.png must match template.png ({size[0]}x{size[1]})")
+
+    neck = np.where(long_neck_mask > 128, 255, 0).astype(np.uint8)
+    neck_bbox, inpaint_bounds = inpaint_region_bounds(neck)
+    x, y, w, h = neck_bbox
+    write_bundle(bundle_path, landmarks, premultiply_div255(template_no_head), neck_bbox, neck[y:y + h, x:x + w],
+                 inpaint_bounds)
+
+    entry = {
+        "size": list(size),
+        "landmarks": len(landmarks),
+        "neck_bbox": list(neck_bbox),
+        "inpaint_bounds": list(inpaint_bounds),
+        "sources": sources,
+        "bundle_sha256": sha256_file(bundle_path),
+        "compiled_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    return entry, status
+
+def main(args):
+    templates_root = args.templates_dir
+    if args.template_id:
+        template_ids = [args.template_id]
+    else:
+        template_ids = sorted(name for name in os.listdir(templates_root)
+                              if os.path.isdir(os.path.join(templates_root, name)))
+    if not template_ids:
+        print(f"[!] Error: No template folders found in {templates_root}")
+        return 1
+
+    manifest = read_manifest(templates_root)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        manifest = {"format_version": FORMAT_VERSION, "templates": {}}
+    entries = manifest["templates"]
+
+    workers = min(args.workers or os.cpu_count() or 1, len(template_ids))
+    print(f"[*] Compiling {len(template_ids)} template(s) from {templates_root} with {workers} worker(s)...")
+    t0 = time.time()
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(compile_template, os.path.join(templates_root, template_id), entries.get(template_id),
+                            args.force, args.reuse_landmarks): template_id
+            for template_id in template_ids
+        }
+        for future in as_completed(futures):
+            template_id = futures[future]
+            try:
+                entries[template_id], status = future.result()
+                print(f"[+] Template {template_id}: {status}")
+            except Exception as e:
+                failed.append(template_id)
+                print(f"[!] Error: Template {template_id}: {e}")
 
-    np.save(output_path, landmark_points)
-    print(f"[+] Landmark template saved to: {output_path}")
+    # 已删除的模板目录不再保留在 manifest 中
+    for template_id in list(entries):
+        if not os.path.isdir(os.path.join(templates_root, template_id)):
+            del entries[template_id]
+    write_manifest(manifest, templates_root)
+    print(f"[+] Manifest saved to: {os.path.join(templates_root, MANIFEST_NAME)} ({time.time() - t0:.2f}s)")
+    return 1 if failed else 0
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Create a facial landmark template from a template directory.")
-    parser.add_argument('--template_id', type=str, required=True, help="The ID of the template folder in assets/templates.")
+    parser = argparse.ArgumentParser(description="Compile template folders into memory-mappable template bundles.")
+    parser.add_argument('--template_id', type=str, default=None,
+                        help="The ID of a single template folder (default: every folder in --templates-dir).")
+    parser.add_argument('--templates-dir', type=str, default=TEMPLATES_ROOT)
+    parser.add_argument('--workers', type=int, default=None, help="Parallel compile processes (default: cpu_count).")
+    parser.add_argument('--force', action='store_true', help="Recompile and re-detect landmarks even if unchanged.")
+    parser.add_argument('--reuse-landmarks', action='store_true',
+                        help="Reuse an existing landmark_template.npy instead of running detection.")
     args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    sys.exit(main(args))
@@ -4,7 +4,9 @@ import torchvision.transforms as transforms
 from PIL import Image
 import numpy as np
 import uvicorn
-from fastapi import FastAPI, File, UploadFile
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, UploadFile, Request
+from fastapi.responses import Response, JSONResponse
 from io import BytesIO
 import base64
 import os
@@ -18,72 +20,168 @@ project_root = os.path.dirname(services_dir)
 face_parsing_path = os.path.join(project_root, 'face-parsing')
 if face_parsing_path not in sys.path:
     sys.path.insert(0, face_parsing_path)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from models.bisenet import BiSeNet, upsample_labels
+from src.image_io import open_image
+from src.lazy_model import LazyModel
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 启动时在后台加载并预热模型 (FACE_PARSING_WARMUP=0 时改为首个请求时加载)
+    if os.environ.get("FACE_PARSING_WARMUP", "1") == "1":
+        face_parsing_model.warm_up_in_background()
+    else:
+        face_parsing_model.load_on_first_use()
+    yield
 
-from models.bisenet import BiSeNet
 
 # --- FastAPI 应用和模型加载 ---
-app = FastAPI(title="Face Parsing Service")
+app = FastAPI(title="Face Parsing Service", lifespan=lifespan)
+
+
+class OnnxFaceParser:
+    """
+    以 onnxruntime 会话代替 PyTorch 模型 (如 face-parsing/quantize.py 生成的 INT8 模型), 调用方式与 model 相同.
+    模型需以与服务一致的输出模式导出: labels (或 logits) / low_res_logits.
+    """
+
+    def __init__(self, onnx_path, lowres_logits):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.lowres_logits = lowres_logits
+
+    def __call__(self, image_batch):
+        output = self.session.run(None, {self.input_name: image_batch.cpu().numpy()})[0]
+        if output.dtype != np.uint8 and not self.lowres_logits:
+            output = output.argmax(axis=1).astype(np.uint8)  # 以 logits 模式导出的模型
+        return torch.from_numpy(output)
+
 
-print("[*] Loading Face Parsing model...")
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model_path = os.path.join(project_root, 'face-parsing/weights/resnet18.pt')
 num_classes = 19
-model = BiSeNet(num_classes, backbone_name='resnet18')
-model.to(device)
+# FACE_PARSING_LOWRES_LOGITS=1: 模型只输出 1/8 分辨率 logits, 直接一步上采样到原图尺寸
+# (仅在类别边界处双线性采样 logits), 省去 512x512x19 的中间结果和二次 NEAREST 缩放
+lowres_logits = os.environ.get("FACE_PARSING_LOWRES_LOGITS", "0") == "1"
+# FACE_PARSING_ONNX_MODEL: 改用 ONNX 模型 (CPU), 例如 weights/resnet18_labels_int8.onnx
+onnx_model_path = os.environ.get("FACE_PARSING_ONNX_MODEL")
+if onnx_model_path:
+    device = torch.device("cpu")
+
 
-# --- 【修复 1】添加 weights_only=True 消除警告 ---
-model.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
-model.eval()
-print(f"[+] Face Parsing model loaded successfully on device '{device}'.")
+def load_face_parsing_model():
+    if onnx_model_path:
+        model = OnnxFaceParser(onnx_model_path, lowres_logits)
+        print(f"[+] Face Parsing ONNX model loaded from '{onnx_model_path}'.")
+        return model
+
+    model_path = os.path.join(project_root, 'face-parsing/weights/resnet18.pt')
+    model = BiSeNet(num_classes, backbone_name='resnet18')
+    model.to(device)
+
+    # --- 【修复 1】添加 weights_only=True 消除警告 ---
+    model.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
+    model.eval()
+    # 推理模式: 跳过辅助输出头, argmax 在图内完成, 只把 uint8 标签图拷回 CPU
+    model.set_output_mode("low_res_logits" if lowres_logits else "labels")
+    # 推理图: BN 折叠进卷积 + channels-last; FACE_PARSING_COMPILE=torchscript|inductor 时再编译整图
+    model = model.fuse_for_inference(compile=os.environ.get("FACE_PARSING_COMPILE") or None)
+    print(f"[+] Face Parsing model loaded successfully on device '{device}'.")
+    return model
+
+
+def warm_up_face_parsing_model(model):
+    """在默认输入尺寸的空白图上跑一次推理 (内核选择、编译图的首次执行等都在这里完成)."""
+    with torch.no_grad():
+        model(torch.zeros(1, 3, DEFAULT_INPUT_SIZE, DEFAULT_INPUT_SIZE, device=device))
+
+
+# 模型在首次请求或启动预热时才加载, 导入本模块不再读取权重
+face_parsing_model = LazyModel("Face Parsing model", load_face_parsing_model, warm_up_face_parsing_model)
 
 transform = transforms.Compose([
     transforms.ToTensor(),
     transforms.Normalize((0.485, 0.456, 0.406), (0.229, 0.224, 0.225)),
 ])
 
-def prepare_image(image: Image.Image, input_size=(512, 512)):
+INPUT_SIZE = (512, 512)
+# 模型全局池化与输入尺寸无关, 可按请求在更低分辨率上解析 (快速通道), 512 精度最高
+SUPPORTED_INPUT_SIZES = (256, 384, 512)
+DEFAULT_INPUT_SIZE = int(os.environ.get("FACE_PARSING_INPUT_SIZE", INPUT_SIZE[0]))
+if DEFAULT_INPUT_SIZE not in SUPPORTED_INPUT_SIZES:
+    raise ValueError(f"FACE_PARSING_INPUT_SIZE must be one of {SUPPORTED_INPUT_SIZES}, got {DEFAULT_INPUT_SIZE}")
+
+def prepare_image(image: Image.Image, input_size=INPUT_SIZE):
     resized_image = image.resize(input_size, resample=Image.BILINEAR)
     image_tensor = transform(resized_image)
     return image_tensor.unsqueeze(0)
 
+@app.get("/healthz")
+async def healthz():
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """模型已加载并完成预热时返回 200, 否则 503."""
+    models = {face_parsing_model.name: face_parsing_model.status()}
+    if not face_parsing_model.ready:
+        return JSONResponse(status_code=503, content={"status": "not ready", "models": models})
+    return {"status": "ready", "models": models}
+
 # --- 【修复 2】移除 @torch.no_grad() 装饰器 ---
 @app.post("/parse")
-async def parse_face(image: UploadFile = File(...)):
+async def parse_face(request: Request, image: UploadFile = File(...), input_size: int = Form(DEFAULT_INPUT_SIZE)):
     service_start_time = time.time()
+    # 调用方声明 Accept: image/png 时直接返回 PNG 字节, 否则保持 JSON + base64
+    binary = "image/png" in request.headers.get("accept", "")
     try:
+        if input_size not in SUPPORTED_INPUT_SIZES:
+            raise ValueError(f"input_size must be one of {SUPPORTED_INPUT_SIZES}, got {input_size}")
+        model = face_parsing_model.get()
         t0 = time.time()
         img_bytes = await image.read()
-        pil_image = Image.open(BytesIO(img_bytes)).convert("RGB")
-        original_size = pil_image.size
-        image_batch = prepare_image(pil_image).to(device)
+        # JPEG 直接以 DCT 域缩放解码到不小于输入尺寸, original_size 为摆正后的原图尺寸
+        pil_image, original_size = open_image(img_bytes, reduce_to=(input_size, input_size))
+        image_batch = prepare_image(pil_image, (input_size, input_size)).to(device)
         t1 = time.time()
         print(f"    [FaceParse-TIMER] Image read & preprocess took: {t1 - t0:.4f}s")
 
         # --- 【修复 2】将 torch.no_grad 用作 with 语句 ---
         with torch.no_grad():
-            output = model(image_batch)[0]
-            
-        predicted_mask = output.squeeze(0).cpu().numpy().argmax(0)
+            if lowres_logits:
+                logits = model(image_batch)
+                restored_mask = Image.fromarray(upsample_labels(logits, original_size[::-1])[0].cpu().numpy())
+            else:
+                predicted_mask = model(image_batch)[0].cpu().numpy()
         t2 = time.time()
         print(f"    [FaceParse-TIMER] Model inference took: {t2 - t1:.4f}s")
 
-        mask_pil = Image.fromarray(predicted_mask.astype(np.uint8))
-        restored_mask = mask_pil.resize(original_size, resample=Image.NEAREST)
+        if not lowres_logits:
+            mask_pil = Image.fromarray(predicted_mask)
+            restored_mask = mask_pil.resize(original_size, resample=Image.NEAREST)
         buffered = BytesIO()
         restored_mask.save(buffered, format="PNG")
-        mask_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+        if not binary:
+            mask_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
         t3 = time.time()
         print(f"    [FaceParse-TIMER] Post-process & encode took: {t3 - t2:.4f}s")
         
         service_end_time = time.time()
         print(f"    [FaceParse-TIMER] Full request took: {service_end_time - service_start_time:.4f}s")
 
+        if binary:
+            return Response(content=buffered.getvalue(), media_type="image/png")
         return {"status": "success", "mask_base64": mask_str}
     except Exception as e:
         print(f"[!!!] Face Parsing Error: {e}")
         # 在调试时可以返回更详细的错误
         import traceback
         traceback.print_exc()
+        if binary:
+            return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
         return {"status": "error", "message": str(e)}
 
 if __name__ == "__main__":
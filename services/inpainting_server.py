@@ -1,28 +1,71 @@
 # services/inpainting_server.py
 import torch
-from diffusers import StableDiffusionInpaintPipeline
 from PIL import Image
 import uvicorn
-from fastapi import FastAPI, File, UploadFile
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, Request
+from fastapi.responses import Response, JSONResponse
 from io import BytesIO
 import base64
+import os
+import sys
 import time # 导入 time 模块
 
-app = FastAPI()
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
-# --- 模型加载 ---
-print("[*] Loading Stable Diffusion Inpainting model...")
-pipe = StableDiffusionInpaintPipeline.from_pretrained(
-    "stabilityai/stable-diffusion-2-inpainting",
-    torch_dtype=torch.float16,
-    variant="fp16"
-)
-pipe.to("cuda")
-print("[+] Model loaded successfully.")
+from src.lazy_model import LazyModel
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 启动时在后台加载并预热 SD (INPAINTING_WARMUP=0 时改为首个请求时加载)
+    if os.environ.get("INPAINTING_WARMUP", "1") == "1":
+        inpainting_pipe.warm_up_in_background()
+    else:
+        inpainting_pipe.load_on_first_use()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# --- 模型加载 (首次请求或启动预热时才下载/加载, 导入本模块不再加载 SD) ---
+def load_inpainting_pipe():
+    from diffusers import StableDiffusionInpaintPipeline
+    pipe = StableDiffusionInpaintPipeline.from_pretrained(
+        "stabilityai/stable-diffusion-2-inpainting",
+        torch_dtype=torch.float16,
+        variant="fp16"
+    )
+    pipe.to("cuda")
+    return pipe
+
+def warm_up_inpainting_pipe(pipe):
+    """单步 dummy 推理: CUDA 上下文、cuDNN 内核选择与显存分配都在这里完成."""
+    with torch.no_grad():
+        pipe(prompt="warm up", image=Image.new("RGB", (512, 512), "white"),
+             mask_image=Image.new("L", (512, 512), 255), num_inference_steps=1)
+
+inpainting_pipe = LazyModel("Stable Diffusion Inpainting model", load_inpainting_pipe, warm_up_inpainting_pipe)
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """模型已加载并完成预热时返回 200, 否则 503."""
+    models = {inpainting_pipe.name: inpainting_pipe.status()}
+    if not inpainting_pipe.ready:
+        return JSONResponse(status_code=503, content={"status": "not ready", "models": models})
+    return {"status": "ready", "models": models}
 
 @app.post("/inpaint")
-async def inpaint(init_image: UploadFile = File(...), mask_image: UploadFile = File(...)):
+async def inpaint(request: Request, init_image: UploadFile = File(...), mask_image: UploadFile = File(...)):
     service_start_time = time.time()
+    # 调用方声明 Accept: image/png 时直接返回 PNG 字节, 否则保持 JSON + base64
+    binary = "image/png" in request.headers.get("accept", "")
     
     # --- 图像读取计时 ---
     t0 = time.time()
@@ -37,6 +80,7 @@ async def inpaint(init_image: UploadFile = File(...), mask_image: UploadFile = F
     negative_prompt = "snake, nsfw, jewelry, necklace, scarf, pattern, tattoo, cartoon, painting, 3d render, illustration"
 
     # --- 模型推理计时 ---
+    pipe = inpainting_pipe.get()
     with torch.no_grad():
         generated_image = pipe(
             prompt=prompt,
@@ -53,13 +97,16 @@ async def inpaint(init_image: UploadFile = File(...), mask_image: UploadFile = F
     # --- 编码计时 ---
     buffered = BytesIO()
     generated_image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    if not binary:
+        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
     t3 = time.time()
     print(f"    [Inpaint-TIMER] Encode took: {t3 - t2:.4f}s")
     
     service_end_time = time.time()
     print(f"    [Inpaint-TIMER] Full request took: {service_end_time - service_start_time:.4f}s")
     
+    if binary:
+        return Response(content=buffered.getvalue(), media_type="image/png")
     return {"status": "success", "image_base64": img_str}
 
 if __name__ == "__main__":
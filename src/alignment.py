@@ -1,11 +1,48 @@
 # src/alignment.py
-import dlib
+import os
+import threading
+from functools import lru_cache
+
 import cv2
 import numpy as np
 
+from src.image_io import read_gray
+from src.lazy_model import LazyModel
+from src.template_bundle import get_bundle
+
 DLIB_MODEL_PATH = 'assets/dlib_models/shape_predictor_68_face_landmarks.dat'
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor(DLIB_MODEL_PATH)
+
+# 人脸检测与关键点只在缩小图上进行 (JPEG 直接 DCT 域缩放解码), 结果再映射回原图坐标
+DETECTION_SIZE = (800, 800)
+
+# 对齐 warp 的插值方式与边界处理, 可用 IDPHOTO_ALIGN_INTERPOLATION / IDPHOTO_ALIGN_BORDER 覆盖
+INTERPOLATIONS = {"nearest": cv2.INTER_NEAREST, "linear": cv2.INTER_LINEAR, "cubic": cv2.INTER_CUBIC,
+                  "lanczos": cv2.INTER_LANCZOS4}
+BORDER_MODES = {"constant": cv2.BORDER_CONSTANT, "replicate": cv2.BORDER_REPLICATE, "reflect": cv2.BORDER_REFLECT,
+                "reflect101": cv2.BORDER_REFLECT_101}
+ALIGN_INTERPOLATION = INTERPOLATIONS[os.environ.get("IDPHOTO_ALIGN_INTERPOLATION", "linear")]
+ALIGN_BORDER_MODE = BORDER_MODES[os.environ.get("IDPHOTO_ALIGN_BORDER", "constant")]
+# 各插值核的采样半径 + 1 像素 (定点坐标取整的余量), 用于扩展 warp 的源/目标子区域
+_KERNEL_RADIUS = {cv2.INTER_NEAREST: 1, cv2.INTER_LINEAR: 2, cv2.INTER_CUBIC: 3, cv2.INTER_LANCZOS4: 5}
+# OpenCV warpAffine 通用实现的定点坐标: 系数放大 2^AB_BITS 后取整, 亚像素精度 2^INTER_BITS
+_AB_BITS, _INTER_BITS = 10, 5
+
+def _load_face_models():
+    import dlib
+    return dlib.get_frontal_face_detector(), dlib.shape_predictor(DLIB_MODEL_PATH)
+
+def _warm_up_face_models(models):
+    """在检测尺寸的空白图上跑一次检测 + 关键点."""
+    import dlib
+    detector, predictor = models
+    gray = np.zeros((DETECTION_SIZE[1], DETECTION_SIZE[0]), np.uint8)
+    detector(gray, 1)
+    predictor(gray, dlib.rectangle(0, 0, DETECTION_SIZE[0] // 2, DETECTION_SIZE[1] // 2))
+
+# dlib 检测器与 68 点关键点模型在首次使用时加载 (导入 src.pipeline 不再读取模型文件)
+face_models = LazyModel("dlib face models", _load_face_models, _warm_up_face_models)
+# dlib 的检测器不支持并发调用, 同一进程中的并发请求在检测 + 关键点处串行
+_face_models_lock = threading.Lock()
 
 def landmarks_to_np(landmarks, dtype="int"):
     coords = np.zeros((landmarks.num_parts, 2), dtype=dtype)
@@ -13,31 +50,154 @@ def landmarks_to_np(landmarks, dtype="int"):
         coords[i] = (landmarks.part(i).x, landmarks.part(i).y)
     return coords
 
-def align_head(matted_head_path, user_image_path, landmark_template_path, template_image_path, output_path):
-    """将抠出的人头对齐到模板位置"""
-    matted_head_image = cv2.imread(matted_head_path, cv2.IMREAD_UNCHANGED)
-    user_image = cv2.imread(user_image_path)
-    template_image = cv2.imread(template_image_path)
-    target_landmarks = np.load(landmark_template_path)
+# 左眼角, 右眼角, 鼻尖, 左嘴角, 右嘴角, 下巴
+STABLE_LANDMARK_INDICES = [36, 45, 30, 48, 54, 8]
 
-    if matted_head_image is None or user_image is None or template_image is None:
-        raise IOError("Could not load one of the required images for alignment.")
+def detect_landmarks(gray, scale=1.0):
+    """在灰度图上检测面积最大的人脸, 返回 68 点关键点 (float32, 已乘 scale 映射回原图坐标)."""
+    detector, predictor = face_models.get()
+    with _face_models_lock:
+        rects = detector(gray, 1)
+        if not rects:
+            raise ValueError("No face found in the user image.")
+        rect = max(rects, key=lambda r: r.width() * r.height())
+        landmarks = predictor(gray, rect)
+    return landmarks_to_np(landmarks, dtype=np.float32) * scale
+
+def _bounding_box(points, upper, pad=0):
+    """点集的整数包围盒 [x0, y0, x1, y1) (向外取整并外扩 pad 像素), 裁剪到 [0, upper)."""
+    x0, y0 = np.maximum(np.floor(points.min(axis=0)).astype(int) - pad, 0)
+    x1, y1 = np.minimum(np.ceil(points.max(axis=0)).astype(int) + 1 + pad, upper)
+    return int(x0), int(y0), int(x1), int(y1)
+
+def _transform(M, points):
+    return points @ M[:, :2].T + M[:, 2]
+
+def _fixed_point_maps(M, x0, y0, x1, y1, interpolation):
+    """
+    按 warpAffine 通用实现的定点算法, 计算目标子区域 [x0, x1) x [y0, y1) 的 remap 映射表 (坐标仍以整张画布为准,
+    因此与整图 warp 逐像素相同). 返回 (整数源坐标 int32 (h, w, 2), 亚像素表下标 uint16 (h, w) 或 None).
+    """
+    iM = cv2.invertAffineTransform(M.astype(np.float64))
+    ab_scale = 1 << _AB_BITS
+    nearest = interpolation == cv2.INTER_NEAREST
+    round_delta = ab_scale // 2 if nearest else ab_scale >> (_INTER_BITS + 1)
+    xs, ys = np.arange(x0, x1), np.arange(y0, y1)
+    adelta = np.rint(iM[0, 0] * xs * ab_scale).astype(np.int64)
+    bdelta = np.rint(iM[1, 0] * xs * ab_scale).astype(np.int64)
+    X = np.rint((iM[0, 1] * ys + iM[0, 2]) * ab_scale).astype(np.int64)[:, None] + round_delta + adelta
+    Y = np.rint((iM[1, 1] * ys + iM[1, 2]) * ab_scale).astype(np.int64)[:, None] + round_delta + bdelta
+    if nearest:
+        return np.dstack([X >> _AB_BITS, Y >> _AB_BITS]).astype(np.int32), None
+    X >>= _AB_BITS - _INTER_BITS
+    Y >>= _AB_BITS - _INTER_BITS
+    mask = (1 << _INTER_BITS) - 1
+    table_index = ((Y & mask) << _INTER_BITS) + (X & mask)
+    return np.dstack([X >> _INTER_BITS, Y >> _INTER_BITS]).astype(np.int32), table_index.astype(np.uint16)
 
-    h, w, _ = template_image.shape
-    gray_user = cv2.cvtColor(user_image, cv2.COLOR_BGR2GRAY)
+@lru_cache(maxsize=None)
+def _exact_remap_supported(interpolation):
+    """
+    本机 OpenCV 的 warpAffine 在该插值方式下是否走通用定点实现 (与 _fixed_point_maps + remap 逐像素一致).
+    有 IPP / SIMD 专用实现 (如部分构建的线性/双三次/最近邻) 时不一致, 改用裁剪后的 warpAffine.
+    """
+    rng = np.random.default_rng(0)
+    src = rng.integers(0, 256, (96, 96, 4), dtype=np.uint8)
+    M = cv2.getRotationMatrix2D((48.3, 47.6), 7.3, 0.83)
+    expected = cv2.warpAffine(src, M, (96, 96), flags=interpolation, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    map1, map2 = _fixed_point_maps(M, 0, 0, 96, 96, interpolation)
+    actual = cv2.remap(src, map1.astype(np.int16), map2, interpolation, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    return bool(np.array_equal(expected, actual))
 
-    rects = detector(gray_user, 1)
-    if not rects:
-        raise ValueError("No face found in the user image.")
-    rect = max(rects, key=lambda r: r.width() * r.height())
-    user_landmarks = landmarks_to_np(predictor(gray_user, rect))
+def warp_head(matted_head_image, M, size, interpolation=None, border_mode=None, out=None, bbox=None):
+    """
+    只对人头 alpha 的包围盒做 warpAffine, 结果写入模板尺寸画布 (size 为 (w, h)) 的对应子区域.
 
-    stable_indices = [36, 45, 30, 48, 54, 8] # 左眼角, 右眼角, 鼻尖, 左嘴角, 右嘴角, 下巴
-    M, _ = cv2.estimateAffinePartial2D(user_landmarks[stable_indices], target_landmarks[stable_indices])
+    包围盒四角经 M 变换后 (按插值核半径外扩) 即为目标子区域, 再把目标子区域反变换回原图得到需要读取的
+    源子区域; 包围盒外的像素全透明且颜色为零, 因此与整图 warp 的结果一致, 耗时与人头大小而不是画布大小成正比.
+    warpAffine 走通用定点实现的插值方式 (见 _exact_remap_supported, 如 Lanczos) 按整张画布的定点坐标构造
+    子区域的映射表再 remap, 逐像素一致; 其余方式直接 warp 源子区域, 目标原点平移后坐标取整略有不同,
+    约万分之一的像素存在差异 (线性/双三次 ±1, 最近邻稍大).
+    边界处理只作用于人头越出原图边缘的部分. out 给出时写入该画布 (其余区域清零), 否则新分配.
+    bbox 为人头包围盒 (x, y, w, h) (见 matte_head(return_bbox=True)); 未给出时直接整图 warp
+    (扫描整张原图的 alpha 求包围盒比整图 warp 本身还慢).
+    """
+    interpolation = ALIGN_INTERPOLATION if interpolation is None else interpolation
+    border_mode = ALIGN_BORDER_MODE if border_mode is None else border_mode
+    width, height = size
+    canvas = out if out is not None else np.empty((height, width) + matted_head_image.shape[2:], matted_head_image.dtype)
+    if bbox is None:
+        return cv2.warpAffine(matted_head_image, M, size, dst=canvas, flags=interpolation, borderMode=border_mode,
+                              borderValue=0)
+    canvas.fill(0)
+
+    x, y, w, h = bbox
+    if w == 0 or h == 0:
+        return canvas
+
+    radius = _KERNEL_RADIUS.get(interpolation, 4)
+    src_h, src_w = matted_head_image.shape[:2]
+    corners = np.array([[x - radius, y - radius], [x + w - 1 + radius, y - radius],
+                        [x - radius, y + h - 1 + radius], [x + w - 1 + radius, y + h - 1 + radius]], np.float64)
+    dx0, dy0, dx1, dy1 = _bounding_box(_transform(M, corners), (width, height))
+    if dx0 >= dx1 or dy0 >= dy1:
+        return canvas  # 人头整体落在模板画布之外
+
+    # 目标子区域反变换回原图, 再外扩一个插值核半径即为需要读取的源子区域
+    M_inv = cv2.invertAffineTransform(M)
+    dst_corners = np.array([[dx0, dy0], [dx1 - 1, dy0], [dx0, dy1 - 1], [dx1 - 1, dy1 - 1]], np.float64)
+    sx0, sy0, sx1, sy1 = _bounding_box(_transform(M_inv, dst_corners), (src_w, src_h), pad=radius)
+
+    if _exact_remap_supported(interpolation):
+        # 整张画布的定点坐标减去源子区域原点 (整数, 不引入取整差异)
+        map1, map2 = _fixed_point_maps(M, dx0, dy0, dx1, dy1, interpolation)
+        map1 -= np.array([sx0, sy0], np.int32)
+        canvas[dy0:dy1, dx0:dx1] = cv2.remap(matted_head_image[sy0:sy1, sx0:sx1],
+                                             np.clip(map1, -32768, 32767).astype(np.int16), map2, interpolation,
+                                             borderMode=border_mode, borderValue=0)
+        return canvas
+
+    # 子区域坐标系下的变换: dst' = M (src' + s0) - d0
+    M_roi = M.astype(np.float64).copy()
+    M_roi[:, 2] += M_roi[:, :2] @ [sx0, sy0] - [dx0, dy0]
+    canvas[dy0:dy1, dx0:dx1] = cv2.warpAffine(matted_head_image[sy0:sy1, sx0:sx1], M_roi, (dx1 - dx0, dy1 - dy0),
+                                              flags=interpolation, borderMode=border_mode, borderValue=0)
+    return canvas
+
+def align_head_image(matted_head_image, gray_user, scale, target_landmarks, size, interpolation=None,
+                     border_mode=None, out=None, bbox=None):
+    """
+    数组版本的对齐: 由用户关键点与模板关键点估计相似变换, 把抠出的人头 (4 通道, 通道顺序不限)
+    变换到模板坐标系, size 为模板 (w, h). 供 align_head 与进程池 (src.cpu_pool) 共用.
+    interpolation / border_mode / out / bbox 见 warp_head.
+    """
+    user_landmarks = detect_landmarks(gray_user, scale)
+    M, _ = cv2.estimateAffinePartial2D(user_landmarks[STABLE_LANDMARK_INDICES],
+                                       target_landmarks[STABLE_LANDMARK_INDICES].astype(np.float32))
     
     if M is None:
         raise ValueError("Could not estimate transformation matrix.")
 
-    aligned_head = cv2.warpAffine(matted_head_image, M, (w, h))
+    return warp_head(matted_head_image, M, size, interpolation, border_mode, out, bbox)
+
+def align_head(matted_head_path, user_image_path, landmark_template_path, template_image_path, output_path,
+               interpolation=None, border_mode=None, bbox=None):
+    """将抠出的人头对齐到模板位置; bbox 为抠头时得到的人头包围盒 (见 create_matted_head), 用于只 warp 该区域."""
+    matted_head_image = cv2.imread(matted_head_path, cv2.IMREAD_UNCHANGED)
+    gray_user, scale = read_gray(user_image_path, reduce_to=DETECTION_SIZE)
+    # 模板包 (prepare_template.py 生成) 中已有关键点与模板尺寸, 无需解码模板图
+    bundle = get_bundle(os.path.dirname(template_image_path))
+    if bundle is not None:
+        target_landmarks, size = bundle.landmarks, bundle.size
+    else:
+        template_image = cv2.imread(template_image_path)
+        target_landmarks = np.load(landmark_template_path)
+        size = None if template_image is None else template_image.shape[1::-1]
+
+    if matted_head_image is None or size is None:
+        raise IOError("Could not load one of the required images for alignment.")
+
+    aligned_head = align_head_image(matted_head_image, gray_user, scale, target_landmarks, size,
+                                    interpolation, border_mode, bbox=bbox)
     cv2.imwrite(output_path, aligned_head)
     print(f"[+] Aligned head saved to: {output_path}")
\ No newline at end of file
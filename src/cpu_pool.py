@@ -0,0 +1,213 @@
+# src/cpu_pool.py
+"""
+CPU 阶段的进程池 (抠头 / 人脸检测与关键点 / warpAffine / 合成 / 膨胀).
+
+这些步骤部分受 GIL 限制, 线程无法把它们扩展到多核, 因此放到独立的工作进程中执行:
+- 图像通过 multiprocessing.shared_memory 交给工作进程 (只传递 名称/形状/dtype), 不经过 pickle;
+  工作进程的数组结果同样写入共享内存, 由主进程拷出后释放.
+- 工作进程启动时 (initializer) 即加载并预热 dlib 模型, 之后每个任务不再加载;
+  同时安装主进程启动校验 (load_bundles) 未通过的模板目录, 工作进程中这些模板同样回退到 PNG.
+- 池大小由 IDPHOTO_CPU_WORKERS 配置 (0 表示不启用, 各步骤在请求线程中执行).
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import lru_cache
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+from PIL import Image
+
+from src.alignment import align_head_image, face_models
+from src.image_utils import get_compositor, matte_head
+from src.template_bundle import BUNDLE_NAME, get_bundle, reject_templates, rejected_templates
+
+CPU_WORKERS = int(os.environ.get("IDPHOTO_CPU_WORKERS", "0"))
+
+TEMPLATE_FILES = ("landmark_template.npy", "template.png", "template_no_head.png", "long_neck_mask.png", BUNDLE_NAME)
+
+# 共享内存中数组的描述, 替代数组本身在进程间传递
+SharedArray = namedtuple("SharedArray", ["name", "shape", "dtype"])
+
+
+def to_shared(array):
+    """把数组拷入新建的共享内存, 返回 (SharedMemory, SharedArray). 创建方负责 close + unlink."""
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, SharedArray(shm.name, array.shape, array.dtype.str)
+
+
+def attach_shared(ref):
+    """按描述挂载共享内存, 返回 (SharedMemory, 零拷贝的 ndarray 视图). 视图释放后才能 close."""
+    shm = shared_memory.SharedMemory(name=ref.name)
+    return shm, np.ndarray(ref.shape, np.dtype(ref.dtype), buffer=shm.buf)
+
+
+def _close(shm, unlink=False):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # 仍有视图 (例如异常的 traceback 引用了它), 由进程退出时回收映射
+    if unlink:
+        shm.unlink()
+
+
+def _take_shared(ref):
+    """拷出工作进程写入的结果并释放其共享内存."""
+    shm, view = attach_shared(ref)
+    array = np.array(view)
+    del view
+    _close(shm, unlink=True)
+    return array
+
+
+def _init_worker(rejected=()):
+    """工作进程启动时安装主进程的模板包校验结果, 并预加载 dlib 模型 (含一次 dummy 推理)."""
+    reject_templates(rejected)
+    face_models.warm_up()
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _attach_args(args):
+    handles, local_args = [], []
+    for arg in args:
+        if isinstance(arg, SharedArray):
+            shm, arg = attach_shared(arg)
+            handles.append(shm)
+        local_args.append(arg)
+    return handles, local_args
+
+
+def _run_in_worker(fn, args, kwargs, shared_results):
+    """在工作进程中挂载共享内存参数, 执行 fn; 数组结果 (或元组中的数组) 写入新的共享内存."""
+    handles, local_args = _attach_args(args)
+    try:
+        result = fn(*local_args, **kwargs)
+        return _export(result) if shared_results else result
+    finally:
+        del local_args
+        for shm in handles:
+            _close(shm)
+
+
+def _export(result):
+    if isinstance(result, tuple):
+        return tuple(_export(item) for item in result)
+    if isinstance(result, np.ndarray):
+        shm, ref = to_shared(result)
+        _close(shm)  # 不 unlink: 由主进程拷出后释放
+        return ref
+    return result
+
+
+def _import(result):
+    if isinstance(result, SharedArray):  # SharedArray 本身也是 tuple, 须先判断
+        return _take_shared(result)
+    if isinstance(result, tuple):
+        return tuple(_import(item) for item in result)
+    return result
+
+
+class CpuStagePool:
+    """
+    CPU 阶段进程池. run(fn, *args) 在工作进程中执行模块级函数 fn 并返回结果,
+    可在多个请求线程中并发调用. shared=False 时参数与结果改为 pickle 传递 (仅用于基准对比).
+    须在 load_bundles 之后创建: 创建时的校验结果 (未通过的模板目录) 传给每个工作进程.
+    """
+
+    def __init__(self, num_workers=None, shared=True, start_method="spawn"):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.shared = shared
+        # 默认 spawn: 服务进程已有多个线程, fork 可能复制到被持有的锁
+        self._executor = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=get_context(start_method),
+                                             initializer=_init_worker, initargs=(rejected_templates(),))
+        self._startup = []
+        self._lock = threading.Lock()
+        self.startup_seconds = None
+
+    def start(self, wait_ready=True):
+        """拉起全部工作进程并等待其预加载完成; wait_ready=False 时在后台进行 (见 ready)."""
+        with self._lock:
+            if not self._startup:
+                t0 = time.time()
+                self._startup = [self._executor.submit(_worker_ready) for _ in range(self.num_workers)]
+
+                def on_done(_):
+                    if self.ready:
+                        self.startup_seconds = time.time() - t0
+                        print(f"[+] CPU pool: {self.num_workers} worker(s) ready in {self.startup_seconds:.2f}s.")
+
+                for future in self._startup:
+                    future.add_done_callback(on_done)
+        if wait_ready:
+            wait(self._startup)
+            for future in self._startup:
+                future.result()  # 预加载失败时在此抛出
+        return self
+
+    @property
+    def ready(self):
+        return bool(self._startup) and all(f.done() and f.exception() is None for f in self._startup)
+
+    def status(self):
+        return {"workers": self.num_workers, "ready": self.ready, "startup_seconds": self.startup_seconds}
+
+    def run(self, fn, *args, **kwargs):
+        handles = []
+        if self.shared:
+            shared_args = []
+            for arg in args:
+                if isinstance(arg, np.ndarray):
+                    shm, arg = to_shared(arg)
+                    handles.append(shm)
+                shared_args.append(arg)
+            args = shared_args
+        try:
+            result = self._executor.submit(_run_in_worker, fn, tuple(args), kwargs, self.shared).result()
+        finally:
+            for shm in handles:
+                _close(shm, unlink=True)
+        return _import(result) if self.shared else result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+@lru_cache(maxsize=16)
+def _template_assets(template_dir, mtime):
+    """工作进程内缓存模板素材 (mtime 变化即模板被重新生成, 自动失效); 有最新的模板包时直接使用."""
+    bundle = get_bundle(template_dir)
+    if bundle is not None:
+        target_landmarks, size = bundle.landmarks, bundle.size
+    else:
+        target_landmarks = np.load(f'{template_dir}/landmark_template.npy')
+        size = Image.open(f'{template_dir}/template.png').size
+    compositor = get_compositor(f'{template_dir}/template_no_head.png', f'{template_dir}/long_neck_mask.png')
+    return target_landmarks, size, compositor
+
+
+def run_head_stages(original_np, mask_np, gray_user, scale, template_dir):
+    """
+    步骤 2~4 的数组版本 (在工作进程中执行): 抠头 -> 对齐 -> Inpainting 素材.
+    返回 (抠出的人头 RGBA, 对齐后的人头 RGBA, 白底待修复图 RGB, 修复区域掩码).
+    """
+    paths = [os.path.join(template_dir, name) for name in TEMPLATE_FILES]
+    mtime = max(os.path.getmtime(path) for path in paths if os.path.exists(path))
+    target_landmarks, size, compositor = _template_assets(template_dir, mtime)
+
+    matted_head, bbox = matte_head(original_np, mask_np, return_bbox=True)
+    aligned_head = align_head_image(matted_head, gray_user, scale, target_landmarks, size, bbox=bbox)
+    to_inpaint, inpaint_mask = compositor.compose(aligned_head)
+    return matted_head, aligned_head, to_inpaint, inpaint_mask
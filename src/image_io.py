@@ -0,0 +1,44 @@
+# src/image_io.py
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# EXIF Orientation 中 5~8 表示需要转置 (宽高互换)
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+_EXIF_ORIENTATION_TAG = 0x0112
+
+
+def open_image(source, mode="RGB", reduce_to=None):
+    """
+    解码图像并按 EXIF 方向摆正, 返回 (image, full_size).
+
+    source 可以是文件路径或原始字节. 指定 reduce_to=(w, h) 时, 对 JPEG 使用 libjpeg 的
+    DCT 域缩放 (PIL draft, 1/2, 1/4, 1/8) 直接解码出不小于该尺寸的缩小图, 不再先解出全分辨率.
+    full_size 为摆正后的原始分辨率, 用于把缩小图上的结果映射回原图.
+    """
+    image = Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+    orientation = image.getexif().get(_EXIF_ORIENTATION_TAG, 1)
+    transposed = orientation in _TRANSPOSED_ORIENTATIONS
+    full_size = image.size[::-1] if transposed else image.size
+
+    if reduce_to is not None and image.format == "JPEG":
+        # draft 作用于未摆正的原始数据, 需要按方向交换目标宽高
+        draft_size = tuple(reduce_to[::-1]) if transposed else tuple(reduce_to)
+        image.draft(mode if mode in ("RGB", "L") else "RGB", draft_size)
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != mode:
+        image = image.convert(mode)
+    return image, full_size
+
+
+def read_gray(source, reduce_to=None):
+    """
+    解码为灰度 numpy 数组 (用于人脸检测), 返回 (gray, scale).
+    scale 为原图相对缩小图的倍数, 缩小图上的坐标乘以 scale 即为原图坐标.
+    """
+    image, full_size = open_image(source, mode="L", reduce_to=reduce_to)
+    scale = full_size[0] / image.size[0]
+    return np.asarray(image), scale
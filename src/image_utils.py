@@ -1,67 +1,281 @@
+import os
+import threading
 import cv2
 import numpy as np
+from functools import lru_cache
+from io import BytesIO
 from PIL import Image
 
+from src.image_io import open_image
+from src.matting import refine_alpha
+from src.template_bundle import get_bundle
+
 # 1:skin, 2:l_brow, 3:r_brow, 4:l_eye, 5:r_eye, 7:l_ear, 8:r_ear, 9:ear_r, 10:nose, 11:mouth, 12:u_lip, 13:l_lip, 17:hair
 HEAD_PARTS_INDICES = [1, 2, 3, 4, 5, 7, 8, 9, 10, 11, 12, 13, 17] 
 
-def create_matted_head(original_image_path, mask_path, output_path):
-    """根据语义分割掩码, 从原图中抠出人头 (脸+头发+耳朵)."""
-    original_image = Image.open(original_image_path).convert("RGBA")
-    mask_image = Image.open(mask_path).convert("L")
-    
-    mask_np = np.array(mask_image)
+def matte_head(original_np, mask_np, soft_edge=True, return_bbox=False):
+    """
+    数组版本的抠头: 原图 (H, W, 3) + 解析掩码 (H, W) -> RGBA (非预乘, 透明区域颜色置零).
+    return_bbox=True 时同时返回人头包围盒 (x, y, w, h), 供对齐只 warp 该区域.
+    """
     head_mask = np.isin(mask_np, HEAD_PARTS_INDICES).astype(np.uint8) * 255
     
-    # kernel = np.ones((5, 5), np.uint8)
-    # head_mask = cv2.dilate(head_mask, kernel, iterations=4)
-    # head_mask = cv2.GaussianBlur(head_mask, (15, 15), 0)
+    original_np = np.array(original_np)
+    if soft_edge:
+        # 在边界窄带内以原图为导向细化 alpha, 代替 NEAREST 放大后的锯齿硬边
+        head_mask = refine_alpha(original_np, head_mask)
     
-    head_mask_pil = Image.fromarray(head_mask)
+    # 直接写入 alpha 通道 (非预乘), 透明区域颜色置零
+    original_np[head_mask == 0] = 0
+    matted_head = np.dstack([original_np, head_mask])
+    return (matted_head, cv2.boundingRect(head_mask)) if return_bbox else matted_head
+
+def create_matted_head(original_image_path, mask_path, output_path, soft_edge=True):
+    """根据语义分割掩码, 从原图中抠出人头 (脸+头发+耳朵), 返回人头包围盒 (x, y, w, h) 供对齐使用."""
+    # 与解析服务一致地按 EXIF 方向摆正, 保证掩码与原图对齐
+    original_image, _ = open_image(original_image_path, mode="RGB")
+    mask_image = Image.open(mask_path).convert("L")
     
-    matted_head = Image.new("RGBA", original_image.size, (0, 0, 0, 0))
-    matted_head.paste(original_image, mask=head_mask_pil)
+    matted_head_np, bbox = matte_head(np.array(original_image), np.array(mask_image), soft_edge, return_bbox=True)
     
-    matted_head.save(output_path)
-    print(f"[+] Matted head (hard edge) saved to: {output_path}")
+    Image.fromarray(matted_head_np, "RGBA").save(output_path)
+    print(f"[+] Matted head ({'soft' if soft_edge else 'hard'} edge) saved to: {output_path}")
+    return bbox
+
+def blend_div255(dst, src, alpha, work, tmp, inv_alpha):
+    """
+    原地计算 dst = DIV255(dst * (255 - a) + src * a), 与 PIL paste 的 BLEND 宏逐像素一致,
+    DIV255(v) = ((v + 128) >> 8 + v + 128) >> 8. 中间值不超过 65407, 全程 uint16 不溢出.
+    work / tmp / inv_alpha 为与 dst / alpha 同形状的 uint16 缓冲区 (可为更大缓冲区的切片).
+    """
+    np.subtract(255, alpha, out=inv_alpha, dtype=np.uint16)
+    np.multiply(dst, inv_alpha, out=work)
+    np.multiply(src, alpha, out=tmp, dtype=np.uint16)
+    work += tmp
+    work += 128
+    np.right_shift(work, 8, out=tmp)
+    tmp += work
+    tmp >>= 8
+    np.copyto(dst, tmp, casting="unsafe")
+
+def premultiply_div255(rgba_np):
+    """RGBA uint8 -> 预乘 RGBA uint8: RGB = DIV255(rgb * a) (即融合到黑色上), alpha 不变. 用于模板编译."""
+    pixels = rgba_np.reshape(-1, 4)
+    premultiplied = np.zeros_like(pixels)
+    buffers = (np.empty((len(pixels), 3), np.uint16), np.empty((len(pixels), 3), np.uint16),
+               np.empty((len(pixels), 1), np.uint16))
+    blend_div255(premultiplied[:, :3], pixels[:, :3], pixels[:, 3:], *buffers)
+    premultiplied[:, 3] = pixels[:, 3]
+    return premultiplied.reshape(rgba_np.shape)
+
+INPAINT_DILATE_SIZE = 5
+
+def inpaint_region_bounds(neck_np):
+    """
+    二值长脖掩码 -> (长脖包围盒, 修复区域边界), 均为 (x, y, w, h).
+    修复区域掩码是 (长脖掩码 - 人头) 的膨胀, 只可能在长脖包围盒外扩膨胀半径的范围内非零.
+    """
+    height, width = neck_np.shape
+    x, y, w, h = cv2.boundingRect(neck_np)
+    if w == 0 or h == 0:
+        return (0, 0, 0, 0), (0, 0, 0, 0)
+    radius = INPAINT_DILATE_SIZE // 2
+    x0, y0 = max(x - radius, 0), max(y - radius, 0)
+    x1, y1 = min(x + w + radius, width), min(y + h + radius, height)
+    return (x, y, w, h), (x0, y0, x1 - x0, y1 - y0)
+
+class InpaintingCompositor:
+    """
+    一次生成 "待修复图" 和 "修复区域掩码" (与原先 PIL 两次 paste + 逐步掩码运算逐像素一致).
+
+    模板相关的部分 (白底上叠加无头模板, 长脖掩码二值化) 在构造时只算一次; compose() 中人头的不透明像素
+    直接拷贝, 只有软边像素 (0 < alpha < 255) 做整数融合, 掩码由同一份 alpha 得到. 中间缓冲区预先分配,
+    在多次请求间复用 (加锁, 可跨线程共享). 同一模板的实例见 get_compositor 缓存.
+    修复区域掩码只在长脖包围盒附近 (inpaint_bounds) 计算, 其余部分恒为 0.
+    """
+
+    def __init__(self, template_no_head_np, long_neck_mask_np):
+        height, width = template_no_head_np.shape[:2]
+        self._allocate(height, width)
+
+        # 白色底板 + 无头模板
+        base = np.full((height, width, 3), 255, np.uint8)
+        blend_div255(base.reshape(-1, 3), template_no_head_np[..., :3].reshape(-1, 3),
+                     template_no_head_np[..., 3].reshape(-1, 1), self._work, self._tmp, self._inv_alpha)
+        # 长脖掩码二值化 (> 128 -> 255)
+        neck = np.where(long_neck_mask_np > 128, 255, 0).astype(np.uint8)
+        self._set_template(base, neck, inpaint_region_bounds(neck)[1])
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        """由预编译模板包 (src.template_bundle.TemplateBundle) 构造, 不解码 PNG, 结果与由 PNG 构造时一致."""
+        compositor = cls.__new__(cls)
+        width, height = bundle.size
+        compositor._allocate(height, width)
+        compositor._set_template(bundle.white_base(), bundle.neck_mask(), bundle.inpaint_bounds)
+        return compositor
+
+    def _allocate(self, height, width):
+        self.shape = (height, width)
+        # 融合用的 uint16 缓冲区按像素数分配, 每次只使用前 N 行 (N 为参与融合的像素数)
+        self._work = np.empty((height * width, 3), np.uint16)
+        self._tmp = np.empty((height * width, 3), np.uint16)
+        self._inv_alpha = np.empty((height * width, 1), np.uint16)
+        self._head_rgb = np.empty((height, width, 3), np.uint8)
+        self._alpha = np.empty((height, width), np.uint8)
+        self._selected = np.empty((height, width), np.uint8)
+        self._kernel = np.ones((INPAINT_DILATE_SIZE, INPAINT_DILATE_SIZE), np.uint8)
+        self._lock = threading.Lock()
+
+    def _set_template(self, base, neck, inpaint_bounds):
+        self.base = base
+        self.neck = neck
+        self.inpaint_bounds = tuple(inpaint_bounds)
+        _, _, w, h = self.inpaint_bounds
+        self._region_selected = np.empty((h, w), np.uint8)
+        self._region_mask = np.empty((h, w), np.uint8)
+        self._region_dilated = np.empty((h, w), np.uint8)
+
+    def compose(self, aligned_head_np, out=None):
+        """
+        对齐后的人头 RGBA -> (白底待修复图 RGB, 膨胀后的修复区域掩码).
+        out 为 (image, mask) 时直接写入这两个 (C 连续的) 缓冲区, 否则新分配.
+        """
+        if out is None:
+            out = (np.empty(self.shape + (3,), np.uint8), np.empty(self.shape, np.uint8))
+        to_inpaint, inpaint_mask = out
+
+        with self._lock:
+            alpha = cv2.extractChannel(aligned_head_np, 3, dst=self._alpha)
+            head_rgb = cv2.cvtColor(aligned_head_np, cv2.COLOR_RGBA2RGB, dst=self._head_rgb)
+
+            # alpha == 255 时 DIV255(src * 255) == src, alpha == 0 时保持底板: 直接拷贝
+            np.copyto(to_inpaint, self.base)
+            cv2.copyTo(head_rgb, cv2.inRange(alpha, 255, 255, dst=self._selected), to_inpaint)
+            # 只有软边像素需要融合 (按扁平下标取出, 融合后写回)
+            points = cv2.findNonZero(cv2.inRange(alpha, 1, 254, dst=self._selected))
+            if points is not None:
+                points = points.reshape(-1, 2)  # (x, y)
+                index = points[:, 1] * self.shape[1] + points[:, 0]
+                n = len(index)
+                target = to_inpaint.reshape(-1, 3)
+                edge = target[index]
+                blend_div255(edge, head_rgb.reshape(-1, 3)[index], alpha.reshape(-1, 1)[index],
+                             self._work[:n], self._tmp[:n], self._inv_alpha[:n])
+                target[index] = edge
+
+            # "长脖法": 长脖掩码减去人头, 阈值 127 后等价于去掉 alpha >= 128 的像素
+            inpaint_mask.fill(0)
+            x, y, w, h = self.inpaint_bounds
+            if w and h:
+                region = np.s_[y:y + h, x:x + w]
+                cv2.threshold(alpha[region], 127, 255, cv2.THRESH_BINARY_INV, dst=self._region_selected)
+                cv2.bitwise_and(self.neck[region], self._region_selected, dst=self._region_mask)
+                # 膨胀掩码以覆盖更多区域 (边界外的像素恒为 0, 不影响膨胀结果)
+                cv2.dilate(self._region_mask, self._kernel, dst=self._region_dilated, iterations=1)
+                inpaint_mask[region] = self._region_dilated
+        return to_inpaint, inpaint_mask
+
+@lru_cache(maxsize=16)
+def _cached_compositor(template_no_head_path, long_neck_mask_path, mtimes):
+    template_no_head = np.array(Image.open(template_no_head_path).convert("RGBA"))
+    long_neck_mask = np.array(Image.open(long_neck_mask_path).convert("L"))
+    return InpaintingCompositor(template_no_head, long_neck_mask)
+
+@lru_cache(maxsize=16)
+def _bundle_compositor(bundle):
+    return InpaintingCompositor.from_bundle(bundle)
+
+def get_compositor(template_no_head_path, long_neck_mask_path):
+    """
+    按模板文件缓存 InpaintingCompositor (文件 mtime 变化即重新生成).
+    模板目录有最新的模板包 (prepare_template.py 生成) 时由模板包构造, 不解码 PNG.
+    """
+    bundle = get_bundle(os.path.dirname(template_no_head_path))
+    if bundle is not None:
+        return _bundle_compositor(bundle)
+    mtimes = (os.path.getmtime(template_no_head_path), os.path.getmtime(long_neck_mask_path))
+    return _cached_compositor(template_no_head_path, long_neck_mask_path, mtimes)
+
+def compose_inpainting_assets(aligned_head_np, template_no_head_np, long_neck_mask_np):
+    """
+    数组版本的 Inpainting 素材: 对齐后的人头 RGBA + 无头模板 RGBA + 长脖掩码 (L),
+    返回 (白底待修复图 RGB, 膨胀后的修复区域掩码). 同一模板多次调用时应复用 InpaintingCompositor.
+    """
+    return InpaintingCompositor(template_no_head_np, long_neck_mask_np).compose(aligned_head_np)
 
 def create_inpainting_assets(aligned_head_path, template_no_head_path, long_neck_mask_path, 
                              output_to_inpaint_path, output_inpaint_mask_path):
     """创建用于inpainting的 "待修复图" 和 "修复区域掩码"."""
-    aligned_head = Image.open(aligned_head_path).convert("RGBA")
-    template_no_head = Image.open(template_no_head_path).convert("RGBA")
-    
-    long_neck_mask_raw = Image.open(long_neck_mask_path).convert("L")
-    long_neck_mask = long_neck_mask_raw.point(lambda p: 255 if p > 128 else 0, 'L')
-
-    # 创建一个白色底板
-    width, height = template_no_head.size
-    to_inpaint_image = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+    aligned_head = np.array(Image.open(aligned_head_path).convert("RGBA"))
+    to_inpaint_np, dilated_mask_np = get_compositor(template_no_head_path, long_neck_mask_path).compose(aligned_head)
     
-    to_inpaint_image.paste(template_no_head, (0, 0), template_no_head)
-    to_inpaint_image.paste(aligned_head, (0, 0), aligned_head)
-
-    
-    to_inpaint_image.convert("RGB").save(output_to_inpaint_path)
+    Image.fromarray(to_inpaint_np).save(output_to_inpaint_path)
     print(f"[+] Image to inpaint with WHITE background saved to: {output_to_inpaint_path}")
 
-    # "长脖法" 创建修复区域掩码
-    long_neck_np = np.array(long_neck_mask)
-    head_alpha = np.array(aligned_head.split()[-1])
-    
-    inpaint_mask_np = np.clip(long_neck_np.astype(np.int16) - head_alpha.astype(np.int16), 0, 255).astype(np.uint8)
-    _, inpaint_mask_np = cv2.threshold(inpaint_mask_np, 127, 255, cv2.THRESH_BINARY)
-    
-    # 膨胀掩码以覆盖更多区域
-    kernel = np.ones((5, 5), np.uint8) 
-    dilated_mask_np = cv2.dilate(inpaint_mask_np, kernel, iterations=1)
     Image.fromarray(dilated_mask_np).save(output_inpaint_mask_path)
     print(f"[+] Dilated inpainting mask saved to: {output_inpaint_mask_path}")
 
-def post_process(inpainted_image_path, bg_color=(255, 255, 255)):
+def build_person_layer(inpainted_image_path, aligned_head_path, template_no_head_path, long_neck_mask_path,
+                       output_path):
     """
-    后处理，时间有限暂时不处理，直接返回
+    由修复结果生成带 alpha 的人物层 (RGBA numpy 数组, 非预乘), 之后所有背景色/尺寸变体都从这一层派生.
+    alpha = 白底上 "模板身体 + 对齐后的人头" 的覆盖率, 再并上长脖区域 (修复出的新脖子, 不含掩码的膨胀边).
+    修复结果是合成在白底上的颜色, 按 alpha 从白底中还原 (rgb = (I - 255 * (1 - a)) / a),
+    否则换底色时软边会残留一圈白边.
     """
-    final_image = Image.open(inpainted_image_path).convert("RGB")
-    
-    return final_image
\ No newline at end of file
+    bundle = get_bundle(os.path.dirname(template_no_head_path))
+    if bundle is not None:
+        template_alpha = bundle.alpha
+    else:
+        template_alpha = np.array(Image.open(template_no_head_path).convert("RGBA"))[..., 3]
+    neck = get_compositor(template_no_head_path, long_neck_mask_path).neck
+    height, width = template_alpha.shape
+
+    inpainted = Image.open(inpainted_image_path).convert("RGB")
+    if inpainted.size != (width, height):
+        # SD 会把输出尺寸对齐到 8 的倍数, 这里还原到模板尺寸
+        inpainted = inpainted.resize((width, height), resample=Image.BICUBIC)
+    head_alpha = np.array(Image.open(aligned_head_path).convert("RGBA"))[..., 3]
+
+    # 人头叠在模板之上: 覆盖率 = 1 - (1 - a_t) * (1 - a_h)
+    coverage = 255.0 - (255.0 - template_alpha.astype(np.float32)) * (255.0 - head_alpha) * (1.0 / 255.0)
+    alpha = np.maximum(np.rint(coverage).astype(np.uint8), neck)
+
+    alpha_f = alpha[..., None].astype(np.float32)
+    rgb = (np.asarray(inpainted, np.float32) - (255.0 - alpha_f)) * 255.0 / np.maximum(alpha_f, 1.0)
+    person_layer = np.dstack([np.clip(rgb + 0.5, 0, 255).astype(np.uint8), alpha])
+
+    Image.fromarray(person_layer).save(output_path)
+    print(f"[+] Person layer (RGBA) saved to: {output_path}")
+    return person_layer
+
+def premultiply(person_layer):
+    """RGBA uint8 -> (预乘前景 float32 (H, W, 3), alpha float32 (H, W, 1)), alpha 归一化到 [0, 1]."""
+    alpha = person_layer[..., 3:4].astype(np.float32) * (1.0 / 255.0)
+    foreground = person_layer[..., :3].astype(np.float32) * alpha
+    return foreground, alpha
+
+def composite_premultiplied(foreground, alpha, bg_colors):
+    """
+    将预乘前景一次性合成到多种纯色背景上, 返回 (N, H, W, 3) uint8.
+    广播计算: out = rgb * a + (1 - a) * bg.
+    """
+    backgrounds = np.asarray(bg_colors, dtype=np.float32)[:, None, None, :]
+    composited = foreground[None] + (1.0 - alpha)[None] * backgrounds
+    return np.clip(composited + 0.5, 0, 255).astype(np.uint8)
+
+def post_process(person_layer, bg_color=(255, 255, 255)):
+    """
+    后处理: 将人物层合成到指定的纯色背景上.
+    """
+    final_image = Image.fromarray(composite_premultiplied(*premultiply(person_layer), [bg_color])[0])
+
+    return final_image
+
+def encode_jpeg(image, quality=75, progressive=False, optimize=False):
+    """将 PIL 图像编码为 JPEG 字节 (若 image.info 中带有 dpi, 一并写入)."""
+    buffered = BytesIO()
+    save_options = {"dpi": image.info["dpi"]} if "dpi" in image.info else {}
+    image.save(buffered, format="JPEG", quality=quality, progressive=progressive, optimize=optimize, **save_options)
+    return buffered.getvalue()
\ No newline at end of file
@@ -0,0 +1,129 @@
+# src/layout.py
+import cv2
+import numpy as np
+from PIL import Image
+
+# 冲印相纸尺寸 (宽, 高), 单位英寸; 排版时会自动选择能放下更多张的方向
+SHEET_SIZES = {
+    "5inch": (5.0, 3.5),
+    "6inch": (6.0, 4.0),
+    "a4": (8.27, 11.69),
+}
+
+# 证件照变体按 300 DPI 渲染 (见 src.variants.PRINT_SIZES)
+PHOTO_DPI = 300
+DEFAULT_DPI = 300
+GAP_MM = 2.0
+MARGIN_MM = 3.0
+GUIDE_COLOR = (180, 180, 180)
+
+
+def mm_to_px(mm, dpi):
+    return int(round(mm * dpi / 25.4))
+
+
+def _best_grid(photo_size, sheet, dpi, gap, margin):
+    """在横竖两个方向中选能放下最多张的一种, 返回 ((sheet_w, sheet_h), rows, cols)."""
+    w, h = photo_size
+    sheet_w, sheet_h = (int(round(side * dpi)) for side in SHEET_SIZES[sheet])
+    best = None
+    for size in ((sheet_w, sheet_h), (sheet_h, sheet_w)):
+        cols = (size[0] - 2 * margin + gap) // (w + gap)
+        rows = (size[1] - 2 * margin + gap) // (h + gap)
+        if best is None or rows * cols > best[1] * best[2]:
+            best = (size, rows, cols)
+    if best[1] * best[2] == 0:
+        raise ValueError(f"Photo of {w}x{h}px does not fit on a {sheet} sheet at {dpi} DPI.")
+    return best
+
+
+def layout_photos(photos, sheet="6inch", dpi=DEFAULT_DPI, cut_guides=True, bg_color=(255, 255, 255)):
+    """
+    将同尺寸照片 (N, h, w, 3) uint8 按顺序平铺到若干张相纸上, 返回 (S, H, W, 3) uint8.
+    整批照片通过一次 reshape/transpose 写入画布, 不逐张 paste; 裁切线画在照片间隙的中线上.
+    """
+    photos = np.asarray(photos)
+    count, h, w = photos.shape[:3]
+    gap, margin = mm_to_px(GAP_MM, dpi), mm_to_px(MARGIN_MM, dpi)
+    (sheet_w, sheet_h), rows, cols = _best_grid((w, h), sheet, dpi, gap, margin)
+
+    per_sheet = rows * cols
+    num_sheets = -(-count // per_sheet)
+    cell_h, cell_w = h + gap, w + gap
+
+    # 整张网格 (含最后一个间隙) 居中放置
+    grid_h, grid_w = rows * cell_h, cols * cell_w
+    y0, x0 = (sheet_h - grid_h + gap) // 2, (sheet_w - grid_w + gap) // 2
+
+    sheets = np.empty((num_sheets, sheet_h, sheet_w, 3), dtype=np.uint8)
+    sheets[:] = bg_color
+
+    if cut_guides:
+        # 裁切线位于相邻照片间隙的中线, 横竖各一次性写入; 照片随后覆盖在上面
+        ys = np.clip(y0 - (gap + 1) // 2 + np.arange(rows + 1) * cell_h, 0, sheet_h - 1)
+        xs = np.clip(x0 - (gap + 1) // 2 + np.arange(cols + 1) * cell_w, 0, sheet_w - 1)
+        sheets[:, ys, xs[0]:xs[-1] + 1] = GUIDE_COLOR
+        sheets[:, ys[0]:ys[-1] + 1, xs] = GUIDE_COLOR
+
+    # 不足一整张的位置留白
+    tiles = np.empty((num_sheets * per_sheet, h, w, 3), dtype=np.uint8)
+    tiles[:count] = photos
+    tiles[count:] = bg_color
+
+    grid = sheets[:, y0:y0 + grid_h, x0:x0 + grid_w].reshape(num_sheets, rows, cell_h, cols, cell_w, 3)
+    grid[:, :, :h, :, :w] = tiles.reshape(num_sheets, rows, cols, h, w, 3).transpose(0, 1, 3, 2, 4, 5)
+
+    return sheets
+
+
+def _scaled_size(size, dpi):
+    """按 PHOTO_DPI 渲染的照片 (宽, 高) 在排版 DPI 下的像素尺寸."""
+    w, h = size
+    return int(round(w * dpi / PHOTO_DPI)), int(round(h * dpi / PHOTO_DPI))
+
+
+def _to_dpi(image, dpi):
+    """把按 PHOTO_DPI 渲染的照片缩放到排版 DPI."""
+    array = np.asarray(image.convert("RGB"))
+    if dpi == PHOTO_DPI:
+        return array
+    size = _scaled_size(array.shape[1::-1], dpi)
+    return cv2.resize(array, size, interpolation=cv2.INTER_AREA if dpi < PHOTO_DPI else cv2.INTER_CUBIC)
+
+
+def check_fit(photo_sizes, sheet="6inch", dpi=DEFAULT_DPI):
+    """
+    检查按 PHOTO_DPI 渲染的各尺寸 (宽, 高) 照片能否排到相纸上, 放不下时抛出与 render_sheets 相同的 ValueError.
+    用于在运行流水线之前拒绝无效的排版参数.
+    """
+    gap, margin = mm_to_px(GAP_MM, dpi), mm_to_px(MARGIN_MM, dpi)
+    for size in photo_sizes:
+        _best_grid(_scaled_size(size, dpi), sheet, dpi, gap, margin)
+
+
+def render_sheets(images, sheet="6inch", copies=None, dpi=DEFAULT_DPI, cut_guides=True, name_prefix="print_sheet"):
+    """
+    将 {名称: PIL Image} 中每张照片各排 copies 份到相纸上, 返回 {相纸名: PIL Image} (带 DPI 信息).
+    copies 为空时自动铺满一张相纸 (各照片平分位置). 不同尺寸的照片分别排版.
+    """
+    by_size = {}
+    for name, image in images.items():
+        photo = _to_dpi(image, dpi)
+        by_size.setdefault(photo.shape[:2], []).append(photo)
+
+    sheets = {}
+    for (h, w), photos in by_size.items():
+        unique = np.stack(photos)
+        n_copies = copies
+        if not n_copies:
+            gap, margin = mm_to_px(GAP_MM, dpi), mm_to_px(MARGIN_MM, dpi)
+            _, rows, cols = _best_grid((w, h), sheet, dpi, gap, margin)
+            n_copies = max(rows * cols // len(unique), 1)
+        # 同一张照片的多份拷贝相邻排列
+        tiled = np.repeat(unique, n_copies, axis=0)
+        for sheet_array in layout_photos(tiled, sheet=sheet, dpi=dpi, cut_guides=cut_guides):
+            name = f"{name_prefix}_{sheet}" if not sheets else f"{name_prefix}_{sheet}_{len(sheets) + 1}"
+            sheet_image = Image.fromarray(sheet_array)
+            sheet_image.info["dpi"] = (dpi, dpi)
+            sheets[name] = sheet_image
+    return sheets
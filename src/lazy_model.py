@@ -0,0 +1,88 @@
+# src/lazy_model.py
+import threading
+import time
+
+
+class LazyModel:
+    """
+    线程安全的懒加载模型单例.
+
+    首次 get() 时才调用 loader 加载 (双重检查锁, 并发的首批请求只加载一次);
+    warm_up() 额外跑一次 dummy 推理, 使首个真实请求的延迟可预期;
+    loaded / ready 供服务的就绪探针 (/readyz) 使用: 预热完成或按需加载成功后 ready,
+    关闭预热时调用 load_on_first_use(), 就绪探针不等待加载.
+    """
+
+    def __init__(self, name, loader, warmup=None):
+        self.name = name
+        self._loader = loader
+        self._warmup = warmup
+        self._model = None
+        self._lock = threading.Lock()
+        self.ready = False
+        self.warmed_up = False
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def get(self):
+        model = self._load()
+        self.ready = True  # 按需加载成功后即可处理请求
+        return model
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    print(f"[*] Loading {self.name}...")
+                    t0 = time.time()
+                    model = self._loader()
+                    self.load_seconds = time.time() - t0
+                    self._model = model
+                    print(f"[+] {self.name} loaded in {self.load_seconds:.2f}s.")
+        return self._model
+
+    def warm_up(self):
+        """加载并预热 (dummy 推理); 重复调用只预热一次."""
+        model = self._load()
+        with self._lock:
+            if not self.warmed_up:
+                t0 = time.time()
+                if self._warmup is not None:
+                    self._warmup(model)
+                self.warmup_seconds = time.time() - t0
+                self.warmed_up = True
+                self.ready = True
+                print(f"[+] {self.name} warmed up in {self.warmup_seconds:.2f}s.")
+        return model
+
+    def load_on_first_use(self):
+        """关闭启动预热时调用: 模型在首个请求中加载, 就绪探针不再等待预热."""
+        self.ready = True
+
+    def warm_up_in_background(self):
+        """在后台线程中预热, 服务可先对外提供存活探针; 失败原因记录在 error 中."""
+        def target():
+            try:
+                self.warm_up()
+            except Exception as e:
+                self.error = str(e)
+                print(f"[!!!] {self.name} warm-up failed: {e}")
+
+        thread = threading.Thread(target=target, name=f"warmup-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        return {
+            "loaded": self.loaded,
+            "ready": self.ready,
+            "warmed_up": self.warmed_up,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+        }
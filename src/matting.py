@@ -0,0 +1,67 @@
+# src/matting.py
+import cv2
+import numpy as np
+
+
+def _boundary_band(mask, band):
+    """掩码边界两侧 band 像素内的窄带 (uint8, 255 表示在带内)."""
+    kernel = np.ones((2 * band + 1, 2 * band + 1), np.uint8)
+    return cv2.subtract(cv2.dilate(mask, kernel), cv2.erode(mask, kernel))
+
+
+def _fast_guided_filter(guide, src, radius, eps, subsample):
+    """
+    单通道快速导向滤波 (He et al., 2015): 在 1/subsample 分辨率上求线性系数 a, b,
+    再双线性放大回原分辨率, 输出 q = a * I + b.
+    guide, src 为 [0, 1] 的 float32.
+    """
+    h, w = guide.shape
+    small_size = (max(w // subsample, 1), max(h // subsample, 1))
+    guide_small = cv2.resize(guide, small_size, interpolation=cv2.INTER_AREA)
+    src_small = cv2.resize(src, small_size, interpolation=cv2.INTER_AREA)
+
+    ksize = (2 * max(radius // subsample, 1) + 1,) * 2
+    mean_i = cv2.boxFilter(guide_small, -1, ksize)
+    mean_p = cv2.boxFilter(src_small, -1, ksize)
+    corr_ip = cv2.boxFilter(guide_small * src_small, -1, ksize)
+    corr_ii = cv2.boxFilter(guide_small * guide_small, -1, ksize)
+
+    a = (corr_ip - mean_i * mean_p) / (corr_ii - mean_i * mean_i + eps)
+    b = mean_p - a * mean_i
+    mean_a = cv2.resize(cv2.boxFilter(a, -1, ksize), (w, h), interpolation=cv2.INTER_LINEAR)
+    mean_b = cv2.resize(cv2.boxFilter(b, -1, ksize), (w, h), interpolation=cv2.INTER_LINEAR)
+    return mean_a * guide + mean_b
+
+
+def refine_alpha(image, hard_mask, band=None, eps=1e-3, subsample=4):
+    """
+    将二值掩码细化为软边 alpha (uint8).
+    只在掩码边界附近的窄带内以原图灰度为导向做快速导向滤波, 带外保持原掩码;
+    计算范围限制在头部外接矩形内, 开销与头部大小而非整图大小相关.
+
+    image: RGB uint8 原图; hard_mask: 0/255 uint8 掩码 (与原图同尺寸).
+    band: 窄带半宽 (像素), 默认按 512 解析分辨率放大到原图后的块大小自动选取.
+    """
+    h, w = hard_mask.shape
+    if band is None:
+        band = max(4, int(round(2 * max(h, w) / 512)))
+
+    x, y, bw, bh = cv2.boundingRect(hard_mask)
+    if bw == 0 or bh == 0:
+        return hard_mask.copy()
+
+    # 所有计算都限制在掩码外接矩形 (向外扩展两倍带宽) 内, 保证带内像素的滤波邻域完整
+    x0, y0 = max(x - 2 * band, 0), max(y - 2 * band, 0)
+    x1, y1 = min(x + bw + 2 * band, w), min(y + bh + 2 * band, h)
+    roi_mask = hard_mask[y0:y1, x0:x1]
+    band_mask = _boundary_band(roi_mask, band)
+
+    guide = cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_RGB2GRAY).astype(np.float32) * (1.0 / 255.0)
+    src = roi_mask.astype(np.float32) * (1.0 / 255.0)
+    # 导向滤波在边缘两侧会有少量过冲/下冲, 截断到 [0, 255] (不能取绝对值, 否则下冲会变成正的 alpha)
+    q = _fast_guided_filter(guide, src, band, eps, subsample)
+    refined = np.clip(q * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+    alpha = hard_mask.copy()
+    np.copyto(alpha[y0:y1, x0:x1], refined, where=band_mask > 0)
+    return alpha
@@ -2,16 +2,64 @@
 import os
 import requests
 import base64
+import time  # 导入 time 模块
 from io import BytesIO
+
+import numpy as np
 from PIL import Image
-import time  # 导入 time 模块
 
-from src.image_utils import create_matted_head, create_inpainting_assets, post_process
-from src.alignment import align_head
+from src.image_utils import create_matted_head, create_inpainting_assets, build_person_layer
+from src.alignment import DETECTION_SIZE, align_head
+from src.cpu_pool import run_head_stages
+from src.image_io import open_image, read_gray
+from src.variants import DEFAULT_VARIANTS, render_variants, encode_variants
+from src.layout import render_sheets
 
-def main_pipeline(user_image_path: str, template_id: str):
+# 服务地址可用环境变量覆盖 (例如基准测试中指向本地 stub 服务)
+FACE_PARSING_SERVICE_URL = os.environ.get("FACE_PARSING_SERVICE_URL", "http://127.0.0.1:8001/parse")
+INPAINTING_SERVICE_URL = os.environ.get("INPAINTING_SERVICE_URL", "http://127.0.0.1:8000/inpaint")
+
+# 内部服务之间直接传输二进制图像, 不再经过 JSON + base64
+BINARY_IMAGE_HEADERS = {"Accept": "image/png"}
+
+def read_image_response(response, base64_key, service_name):
+    """读取内部服务返回的图像字节; 兼容旧版 JSON + base64 响应."""
+    if response.ok and response.headers.get("content-type", "").startswith("image/"):
+        return response.content
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        response.raise_for_status()
+    response_data = response.json()
+    if response_data.get('status') != 'success':
+        raise RuntimeError(f"{service_name} returned an error: {response_data.get('message', 'Unknown error')}")
+    return base64.b64decode(response_data[base64_key])
+
+def run_head_stages_in_pool(cpu_pool, user_image_path, mask_bytes, template_dir, matted_head_path,
+                            aligned_head_path, to_inpaint_path, inpaint_mask_path):
+    """在主进程中解码, 由进程池执行步骤 2~4, 再写出与串行版本相同的中间结果文件."""
+    original_image, _ = open_image(user_image_path, mode="RGB")
+    gray_user, scale = read_gray(user_image_path, reduce_to=DETECTION_SIZE)
+    mask_np = np.array(Image.open(BytesIO(mask_bytes)).convert("L"))
+
+    matted_head, aligned_head, to_inpaint, inpaint_mask = cpu_pool.run(
+        run_head_stages, np.asarray(original_image), mask_np, gray_user, scale, template_dir)
+
+    Image.fromarray(matted_head, "RGBA").save(matted_head_path)
+    Image.fromarray(aligned_head, "RGBA").save(aligned_head_path)
+    Image.fromarray(to_inpaint).save(to_inpaint_path)
+    Image.fromarray(inpaint_mask).save(inpaint_mask_path)
+    print(f"[+] Head stages done in CPU pool, saved to: {matted_head_path}, {aligned_head_path}, "
+          f"{to_inpaint_path}, {inpaint_mask_path}")
+
+def main_pipeline(user_image_path: str, template_id: str, variants=None, encode_options=None, layout=None,
+                  timings=None, cpu_pool=None, output_dir='outputs'):
     """
     完整的证件照生成流水线 (已添加详细计时)。
+    variants 为 [(底色, 尺寸), ...] (见 src.variants), 所有变体共用一次流水线结果。
+    layout 为 render_sheets 的参数 (sheet/copies/dpi/cut_guides), 给出时额外输出排版好的冲印相纸。
+    timings 传入 dict 时, 记录各步骤耗时 {步骤名: 秒} 及 "Total", 供基准测试统计.
+    cpu_pool 为 src.cpu_pool.CpuStagePool 时, 步骤 2~4 在其工作进程中执行 (图像经共享内存传递).
+    中间结果写入 output_dir; 并发调用时每个请求须使用各自的目录.
+    返回 {结果名: JPEG 字节}, encode_options 透传给 encode_jpeg (quality/progressive/optimize).
     """
     # --- 总计时开始 ---
     total_start_time = time.time()
@@ -21,17 +69,20 @@ def main_pipeline(user_image_path: str, template_id: str):
         nonlocal last_step_time
         current_time = time.time()
         print(f"    [TIMER] Step '{step_name}' took: {current_time - last_step_time:.4f} seconds.")
+        if timings is not None:
+            timings[step_name] = current_time - last_step_time
         last_step_time = current_time
 
     # --- 0. 定义路径 ---
     print("\n--- Step 0: Initializing paths ---")
     template_dir = f'assets/templates/{template_id}'
-    face_parsing_output_mask_path = 'outputs/0_face_parsing_mask.png'
-    matted_head_path = 'outputs/1_matted_head.png'
-    aligned_head_path = 'outputs/2_aligned_head.png'
-    to_inpaint_path = 'outputs/3_to_inpaint.png'
-    inpaint_mask_path = 'outputs/4_inpaint_mask.png'
-    inpainted_result_path = 'outputs/5_inpainted_result.png'
+    face_parsing_output_mask_path = os.path.join(output_dir, '0_face_parsing_mask.png')
+    matted_head_path = os.path.join(output_dir, '1_matted_head.png')
+    aligned_head_path = os.path.join(output_dir, '2_aligned_head.png')
+    to_inpaint_path = os.path.join(output_dir, '3_to_inpaint.png')
+    inpaint_mask_path = os.path.join(output_dir, '4_inpaint_mask.png')
+    inpainted_result_path = os.path.join(output_dir, '5_inpainted_result.png')
+    person_layer_path = os.path.join(output_dir, '6_person_layer.png')
     template_image_path = f'{template_dir}/template.png'
     landmark_template_path = f'{template_dir}/landmark_template.npy'
     template_no_head_path = f'{template_dir}/template_no_head.png'
@@ -40,61 +91,64 @@ def main_pipeline(user_image_path: str, template_id: str):
 
     # --- 1. 人像语义分割 (调用服务) ---
     print("\n--- Step 1: Face Parsing (via Service) ---")
-    face_parsing_service_url = "http://127.0.0.1:8001/parse"
     with open(user_image_path, "rb") as f:
         files = {'image': (os.path.basename(user_image_path), f)}
-        response = requests.post(face_parsing_service_url, files=files)
-    response.raise_for_status()
-    response_data = response.json()
-    if response_data['status'] != 'success':
-        raise RuntimeError(f"Face parsing service returned an error: {response_data.get('message', 'Unknown error')}")
-    mask_b64 = response_data['mask_base64']
-    mask_bytes = base64.b64decode(mask_b64)
+        response = requests.post(FACE_PARSING_SERVICE_URL, files=files, headers=BINARY_IMAGE_HEADERS)
+    mask_bytes = read_image_response(response, 'mask_base64', "Face parsing service")
     with open(face_parsing_output_mask_path, 'wb') as f:
         f.write(mask_bytes)
     print(f"[+] Face parsing mask saved to: {face_parsing_output_mask_path}")
     print_lap_time("Face Parsing Service Call")
 
-    # --- 2. 头部Matting ---
-    print("\n--- Step 2: Head Matting ---")
-    create_matted_head(user_image_path, face_parsing_output_mask_path, matted_head_path)
-    print_lap_time("Head Matting")
+    if cpu_pool is not None:
+        # --- 2~4. 抠头 / 对齐 / Inpainting素材 (进程池) ---
+        print("\n--- Steps 2-4: Head Matting, Alignment & Inpainting Assets (CPU pool) ---")
+        run_head_stages_in_pool(cpu_pool, user_image_path, mask_bytes, template_dir, matted_head_path,
+                                aligned_head_path, to_inpaint_path, inpaint_mask_path)
+        print_lap_time("Head Stages (CPU Pool)")
+    else:
+        # --- 2. 头部Matting ---
+        print("\n--- Step 2: Head Matting ---")
+        head_bbox = create_matted_head(user_image_path, face_parsing_output_mask_path, matted_head_path)
+        print_lap_time("Head Matting")
 
-    # --- 3. 面部对齐 ---
-    print("\n--- Step 3: Head Alignment ---")
-    align_head(matted_head_path, user_image_path, landmark_template_path, template_image_path, aligned_head_path)
-    print_lap_time("Head Alignment")
+        # --- 3. 面部对齐 ---
+        print("\n--- Step 3: Head Alignment ---")
+        align_head(matted_head_path, user_image_path, landmark_template_path, template_image_path, aligned_head_path,
+                   bbox=head_bbox)
+        print_lap_time("Head Alignment")
 
-    # --- 4. 创建Inpainting素材 ---
-    print("\n--- Step 4: Creating Inpainting Assets ---")
-    create_inpainting_assets(aligned_head_path, template_no_head_path, long_neck_mask_path, to_inpaint_path, inpaint_mask_path)
-    print_lap_time("Create Inpainting Assets")
+        # --- 4. 创建Inpainting素材 ---
+        print("\n--- Step 4: Creating Inpainting Assets ---")
+        create_inpainting_assets(aligned_head_path, template_no_head_path, long_neck_mask_path, to_inpaint_path, inpaint_mask_path)
+        print_lap_time("Create Inpainting Assets")
 
     # --- 5. 调用Inpainting服务 ---
     print("\n--- Step 5: Neck Inpainting ---")
     with open(to_inpaint_path, "rb") as f_init, open(inpaint_mask_path, "rb") as f_mask:
         files = {'init_image': f_init, 'mask_image': f_mask}
-        response = requests.post("http://127.0.0.1:8000/inpaint", files=files)
-    response.raise_for_status()
-    img_b64 = response.json()['image_base64']
-    img_bytes = base64.b64decode(img_b64)
+        response = requests.post(INPAINTING_SERVICE_URL, files=files, headers=BINARY_IMAGE_HEADERS)
+    img_bytes = read_image_response(response, 'image_base64', "Inpainting service")
     with open(inpainted_result_path, 'wb') as f:
         f.write(img_bytes)
     print(f"[+] Inpainted result saved to: {inpainted_result_path}")
     print_lap_time("Inpainting Service Call")
 
     # --- 6. 后处理 ---
-    print("\n--- Step 6: Post-processing with WHITE background ---")
-    final_image = post_process(inpainted_result_path, bg_color=(255, 255, 255))
-    buffered = BytesIO()
-    final_image.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    results = {"id_photo_white_background": "data:image/jpeg;base64," + img_str}
-    print(f"[+] Generated white background version.")
+    print("\n--- Step 6: Post-processing (background & size variants) ---")
+    person_layer = build_person_layer(inpainted_result_path, aligned_head_path, template_no_head_path,
+                                      long_neck_mask_path, person_layer_path)
+    variant_images = render_variants(person_layer, variants or DEFAULT_VARIANTS)
+    if layout:
+        variant_images.update(render_sheets(variant_images, **layout))
+    results = encode_variants(variant_images, encode_options)
+    print(f"[+] Generated {len(results)} variant(s): {', '.join(results)}")
     print_lap_time("Post-processing")
 
     # --- 总计时结束 ---
     total_end_time = time.time()
     print(f"\n[TOTAL TIME] Full pipeline took: {total_end_time - total_start_time:.4f} seconds.")
+    if timings is not None:
+        timings["Total"] = total_end_time - total_start_time
 
     return results
\ No newline at end of file
@@ -0,0 +1,185 @@
+# src/template_bundle.py
+"""
+预编译模板包 (由 prepare_template.py 生成), 服务启动时 memory-map, 请求中不再解码模板 PNG.
+
+assets/templates/<id>/template.bundle 的二进制布局 (小端, 各数组按 64 字节对齐):
+    头部  HEADER: magic, 格式版本, 宽, 高, 关键点数, 长脖掩码包围盒 (x, y, w, h),
+          修复区域边界 (x, y, w, h), 三个数组的偏移
+    数组  关键点 float32 (N, 2) | 无头模板的预乘 RGBA uint8 (H, W, 4) | 二值长脖掩码 uint8 (仅包围盒内, 0/255)
+
+预乘 RGB 按 PIL paste 的取整方式计算 (DIV255(rgb * a)), 因此白底合成 = 预乘 RGB + (255 - a), 与直接
+paste 逐像素一致. assets/templates/manifest.json 记录每个模板源文件与模板包的 sha256.
+"""
+import hashlib
+import json
+import os
+import struct
+from functools import lru_cache
+
+import numpy as np
+
+TEMPLATES_ROOT = 'assets/templates'
+BUNDLE_NAME = 'template.bundle'
+MANIFEST_NAME = 'manifest.json'
+SOURCE_FILES = ('template.png', 'template_no_head.png', 'long_neck_mask.png')
+
+MAGIC = b'IDTB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHIII4i4iQQQ')
+ALIGNMENT = 64
+
+# 启动校验 (load_bundles) 中与 manifest 不符的模板目录, 本进程内不再使用其模板包;
+# 进程池的工作进程不执行启动校验, 由主进程经 rejected_templates / reject_templates 传入
+_rejected = set()
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_bundle(path, landmarks, premultiplied, neck_bbox, neck_crop, inpaint_bounds):
+    """写出模板包 (先写临时文件再原子替换, 正在 memory-map 旧文件的进程不受影响)."""
+    arrays = [np.ascontiguousarray(landmarks, np.float32), np.ascontiguousarray(premultiplied, np.uint8),
+              np.ascontiguousarray(neck_crop, np.uint8)]
+    offsets, offset = [], _align(HEADER.size)
+    for array in arrays:
+        offsets.append(offset)
+        offset = _align(offset + array.nbytes)
+
+    height, width = premultiplied.shape[:2]
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, width, height, len(arrays[0]), *neck_bbox, *inpaint_bounds,
+                         *offsets)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for array_offset, array in zip(offsets, arrays):
+            f.seek(array_offset)
+            f.write(array.tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+
+
+class TemplateBundle:
+    """memory-map 的模板包; 数组均为只读视图, 页面在首次访问时才载入."""
+
+    def __init__(self, path):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        (magic, version, _, width, height, num_landmarks, nx, ny, nw, nh, ix, iy, iw, ih,
+         landmarks_offset, premultiplied_offset, neck_offset) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} template bundle.")
+
+        self.size = (width, height)
+        self.neck_bbox = (nx, ny, nw, nh)
+        self.inpaint_bounds = (ix, iy, iw, ih)
+        self.landmarks = np.frombuffer(self._map, np.float32, num_landmarks * 2, landmarks_offset).reshape(-1, 2)
+        self.premultiplied = np.frombuffer(self._map, np.uint8, height * width * 4,
+                                           premultiplied_offset).reshape(height, width, 4)
+        self.neck_crop = np.frombuffer(self._map, np.uint8, nw * nh, neck_offset).reshape(nh, nw)
+
+    @property
+    def alpha(self):
+        """无头模板的 alpha (H, W)."""
+        return self.premultiplied[..., 3]
+
+    def neck_mask(self):
+        """完整尺寸的二值长脖掩码 (新分配)."""
+        x, y, w, h = self.neck_bbox
+        mask = np.zeros(self.size[::-1], np.uint8)
+        mask[y:y + h, x:x + w] = self.neck_crop
+        return mask
+
+    def white_base(self):
+        """白底上叠加无头模板的 RGB (新分配), 与 PIL paste 到白色画布的结果一致."""
+        premultiplied = self.premultiplied
+        return premultiplied[..., :3] + (255 - premultiplied[..., 3:])
+
+
+def read_manifest(templates_root=TEMPLATES_ROOT):
+    path = os.path.join(templates_root, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"format_version": FORMAT_VERSION, "templates": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, templates_root=TEMPLATES_ROOT):
+    path = os.path.join(templates_root, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _mtimes(template_dir):
+    paths = [os.path.join(template_dir, name) for name in (BUNDLE_NAME,) + SOURCE_FILES]
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+
+@lru_cache(maxsize=32)
+def _open_bundle(template_dir, mtimes):
+    return TemplateBundle(os.path.join(template_dir, BUNDLE_NAME))
+
+
+def get_bundle(template_dir):
+    """
+    模板目录对应的模板包; 不存在、比任一源文件旧 (模板被修改后未重新编译) 或启动校验未通过时返回 None,
+    调用方回退到解码 PNG. 按 mtime 缓存, 重新编译后自动重新映射.
+    """
+    template_dir = os.path.normpath(template_dir)
+    if template_dir in _rejected:
+        return None
+    bundle_mtime, *source_mtimes = mtimes = _mtimes(template_dir)
+    if bundle_mtime is None or any(mtime is not None and mtime > bundle_mtime for mtime in source_mtimes):
+        return None
+    return _open_bundle(template_dir, mtimes)
+
+
+def rejected_templates():
+    """本进程中启动校验未通过的模板目录."""
+    return frozenset(_rejected)
+
+
+def reject_templates(template_dirs):
+    """在本进程中停用这些模板目录的模板包 (回退到 PNG), 用于把主进程的校验结果安装到工作进程."""
+    _rejected.update(os.path.normpath(template_dir) for template_dir in template_dirs)
+
+
+def load_bundles(templates_root=TEMPLATES_ROOT, verify=True):
+    """
+    启动时按 manifest 校验 (源文件与模板包的 sha256) 并 memory-map 全部模板包, 返回 {模板 ID: TemplateBundle}.
+    校验不通过的模板在本进程中回退到 PNG.
+    """
+    bundles = {}
+    for template_id, entry in sorted(read_manifest(templates_root).get("templates", {}).items()):
+        template_dir = os.path.normpath(os.path.join(templates_root, template_id))
+        bundle_path = os.path.join(template_dir, BUNDLE_NAME)
+        problem = None
+        if not os.path.exists(bundle_path):
+            problem = "bundle missing"
+        elif verify:
+            expected = dict(entry["sources"], **{BUNDLE_NAME: entry["bundle_sha256"]})
+            for name, checksum in expected.items():
+                path = os.path.join(template_dir, name)
+                if not os.path.exists(path) or sha256_file(path) != checksum:
+                    problem = f"{name} does not match the manifest"
+                    break
+        if problem:
+            _rejected.add(template_dir)
+            print(f"[!] Template {template_id}: {problem}, falling back to PNG assets "
+                  f"(rerun prepare_template.py).")
+            continue
+        _rejected.discard(template_dir)
+        bundle = get_bundle(template_dir)
+        if bundle is not None:
+            bundles[template_id] = bundle
+    print(f"[+] Memory-mapped {len(bundles)} template bundle(s) from {templates_root}.")
+    return bundles
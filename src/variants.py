@@ -0,0 +1,110 @@
+# src/variants.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.image_utils import premultiply, composite_premultiplied, encode_jpeg
+
+# 常用证件照底色 (RGB)
+BACKGROUND_COLORS = {
+    "white": (255, 255, 255),
+    "blue": (67, 142, 219),
+    "red": (255, 0, 0),
+}
+
+# 常用冲印尺寸 (宽, 高), 300 DPI 下的像素; "original" 表示保持模板尺寸
+PRINT_SIZES = {
+    "original": None,
+    "1inch": (295, 413),     # 25 x 35 mm
+    "2inch": (413, 579),     # 35 x 49 mm
+    "passport": (390, 567),  # 33 x 48 mm
+}
+
+DEFAULT_VARIANTS = [("white", "original")]
+
+
+def parse_variants(spec):
+    """
+    解析变体列表, 如 "white,blue:2inch,red:passport" -> [(color, size), ...].
+    未写尺寸时为 "original".
+    """
+    variants = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        color, _, size = item.partition(":")
+        color, size = color.strip(), size.strip() or "original"
+        if color not in BACKGROUND_COLORS:
+            raise ValueError(f"Unknown background color '{color}', available: {list(BACKGROUND_COLORS)}")
+        if size not in PRINT_SIZES:
+            raise ValueError(f"Unknown print size '{size}', available: {list(PRINT_SIZES)}")
+        if (color, size) not in variants:
+            variants.append((color, size))
+    if not variants:
+        raise ValueError("At least one variant must be requested.")
+    return variants
+
+
+def variant_name(color, size):
+    """结果名; 原尺寸沿用 id_photo_<color>_background 的命名."""
+    name = f"id_photo_{color}_background"
+    return name if size == "original" else f"{name}_{size}"
+
+
+def _fit_to_size(foreground, alpha, size):
+    """居中裁剪到目标宽高比后缩放 (预乘前景与 alpha 同步处理, 避免边缘色晕)."""
+    if size is None:
+        return foreground, alpha
+    height, width = alpha.shape[:2]
+    target_w, target_h = size
+    if width * target_h > height * target_w:
+        crop_w = round(height * target_w / target_h)
+        x0 = (width - crop_w) // 2
+        foreground, alpha = foreground[:, x0:x0 + crop_w], alpha[:, x0:x0 + crop_w]
+    else:
+        crop_h = round(width * target_h / target_w)
+        y0 = (height - crop_h) // 2
+        foreground, alpha = foreground[y0:y0 + crop_h], alpha[y0:y0 + crop_h]
+
+    interpolation = cv2.INTER_AREA if target_w < alpha.shape[1] else cv2.INTER_LINEAR
+    foreground = cv2.resize(np.ascontiguousarray(foreground), size, interpolation=interpolation)
+    alpha = cv2.resize(np.ascontiguousarray(alpha), size, interpolation=interpolation)[..., None]
+    return foreground, alpha
+
+
+def render_variants(person_layer, variants):
+    """
+    从同一人物层派生所有变体, 返回 {结果名: PIL Image}.
+    每种尺寸只缩放一次, 同尺寸的所有底色在一次广播运算中合成.
+    """
+    foreground, alpha = premultiply(person_layer)
+
+    colors_by_size = {}
+    for color, size in variants:
+        colors_by_size.setdefault(size, []).append(color)
+
+    images = {}
+    for size, colors in colors_by_size.items():
+        sized_foreground, sized_alpha = _fit_to_size(foreground, alpha, PRINT_SIZES[size])
+        composited = composite_premultiplied(sized_foreground, sized_alpha, [BACKGROUND_COLORS[c] for c in colors])
+        for color, image in zip(colors, composited):
+            images[variant_name(color, size)] = Image.fromarray(image)
+
+    # 保持请求中的顺序
+    return {variant_name(color, size): images[variant_name(color, size)] for color, size in variants}
+
+
+def encode_variants(images, encode_options=None, max_workers=None):
+    """并行 JPEG 编码 (PIL 编码时释放 GIL), 返回 {结果名: JPEG 字节}."""
+    encode_options = encode_options or {}
+    if len(images) == 1:
+        return {name: encode_jpeg(image, **encode_options) for name, image in images.items()}
+
+    max_workers = max_workers or min(len(images), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(encode_jpeg, image, **encode_options) for name, image in images.items()}
+        return {name: future.result() for name, future in futures.items()}